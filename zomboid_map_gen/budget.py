@@ -0,0 +1,281 @@
+# zomboid_map_gen/budget.py
+"""
+Memory budget (max_memory_mb) and the preflight report.
+Run with:
+    python -m zomboid_map_gen.budget --config conf.json [--max-memory-mb 2048]
+
+Peak memory of a render is modelled per stage as
+    base + fixed + transient B/px * canvas px + resident B/px * canvas px
+      + noise band temporaries (band rows * output width * NOISE_BYTES)
+      + for the streamed export, its bands (band rows * width * STREAM_BAND_BYTES)
+where "resident" is what earlier stages keep alive (plus the road cost
+colour tables, LUT_MB, from vegetation on): finished RGBA layers
+(4 B/px each), the river masks (2 B/px), the pan caches' full-canvas
+fields (4 B/px per field, up to pan_cache.MAX_PIXELS) and, with the
+streamed export (pipeline.py, export.stream), the road cost rows built
+from terrain and vegetation (1 B/px each). Byte and time figures were
+measured as peak RSS on the default config through pipeline.py (one
+core, so times assume one worker); from 1200x1200 to 2400x2400 px the
+predicted peak was within ~5% of the measured one.
+
+Under a budget the plan picks:
+- band_rows: noise is sampled in row bands; the band temporaries scale
+  with band rows * width, so wide canvases get shorter bands. The
+  pipeline hands its layers on in bands of the same height. Output does
+  not depend on the band height.
+- workers: noise sampling runs its bands on this many worker processes
+  (noise_utils.sample_field). One unless the config's workers (or
+  --workers) asks for more; capped by the CPUs and by how many fit next
+  to the peak
+- spill: if the peak still does not fit, the pan caches are switched off
+  for the run and finished layers go to disk: the streamed export moves
+  each layer to a raw file once no stage needs it whole (pipeline.py,
+  SpilledLayer), so roads and the preview run with only the cost rows and
+  river masks resident; the export after rendering (export.stream off)
+  composes the preview in row bands instead of full-canvas copies
+
+Tile sizes are not part of the plan: the postprocess tile stays at
+postprocess.TILE because its random draws follow the tiling, so changing
+it would change the map.
+"""
+
+import argparse
+import ctypes
+import ctypes.util
+import os
+from contextlib import contextmanager
+
+from . import config as cfg
+from .utils import jit, noise_utils, pan_cache
+from .terrain import terrain_generator
+
+# interpreter + numpy + PIL before anything is rendered
+BASE_MB = 40
+# numba, when the compiled kernels are on (utils/jit.py)
+JIT_MB = 115
+# peak bytes per sample while a noise band is evaluated (coords + octaves)
+NOISE_BYTES = 120
+
+# stage -> (fixed MB, transient B/px, fixed s, s per canvas Mpx), rendered
+# with the streamed export
+STAGES = {
+    "terrain": (25, 12, 0.0, 2.0),
+    "rivers": (0, 18, 0.0, 0.45),
+    "vegetation": (50, 23, 0.0, 1.6),
+    "roads": (36, 24, 1.5, 0.1),
+    "export": (41, 5, 0.0, 0.3),
+}
+# streamed export: bytes per pixel of a pipeline band (bands queued for the
+# consumers plus the PNG encoders' filter buffers)
+STREAM_BAND_BYTES = 150
+# export.stream off (writer.save_all after rendering): (fixed MB, transient B/px)
+SAVE_EXPORT = (60, 20)
+# ... and its transient when the preview is composed in bands
+SPILL_EXPORT_BYTES = 6
+# seconds per canvas Mpx to move one finished layer to disk (streamed spill)
+SPILL_S_PER_MPX = 0.05
+# road cost colour tables (two 2**24 LUTs), resident from vegetation on
+LUT_MB = 32
+
+# glibc mallopt: blocks above this many bytes are mmapped (see pin_mmap_threshold)
+_M_MMAP_THRESHOLD = -3
+_MMAP_THRESHOLD = 1 << 20
+
+# band rows tried, largest first, never above the default
+_DEFAULT_BAND_ROWS = noise_utils.BAND_ROWS
+_BAND_CHOICES = (1024, 512, 256, 128, 64, 32, 16)
+# share of the budget the band temporaries may take
+_BAND_SHARE = 0.1
+
+
+def _base_mb() -> int:
+    return BASE_MB + (JIT_MB if jit.numba is not None else 0)
+
+
+def canvas_size(conf: dict) -> tuple[int, int]:
+    c = conf.get("canvas", {})
+    size = c.get("cell_size", 300)
+    return size * c.get("cells_x", 1), size * c.get("cells_y", 1)
+
+
+def _enabled(conf: dict, section: str) -> bool:
+    return conf.get(section, {}).get("enabled", True)
+
+
+def estimate(conf: dict, band_rows: int | None = None, caches: bool = True,
+             spill: bool = False) -> dict:
+    """
+    {"stages": {stage: {"peak_mb", "seconds"}}, "peak_mb", "seconds"} for
+    a full render of conf with these settings, streamed or not as the
+    config's export.stream says. spill: finished layers go to disk (see
+    the module docstring).
+    """
+    w, h = canvas_size(conf)
+    px = w * h
+    band = (band_rows or _DEFAULT_BAND_ROWS) * w * NOISE_BYTES
+    cached = caches and px <= pan_cache.MAX_PIXELS
+    mb = 1 / (1 << 20)
+    stream = conf.get("export", {}).get("stream", True)
+
+    terrain = _enabled(conf, "terrain")
+    rivers = terrain and _enabled(conf, "rivers")
+    veg = _enabled(conf, "vegetation")
+    roads = _enabled(conf, "roads")
+    order = [("terrain", terrain, True), ("rivers", rivers, False),
+             ("vegetation", veg, True), ("roads", roads, False), ("export", True, False)]
+
+    # the streamed export holds no finished layer from roads on
+    spilled = spill and stream
+
+    stages = {}
+    resident = 0       # B/px, besides the finished layers
+    layers = 0         # B/px of finished layers in memory
+    resident_mb = 0    # fixed
+    for name, on, noisy in order:
+        if not on:
+            continue
+        if spilled and name in ("roads", "export"):
+            layers = 0
+        fixed, transient, fixed_s, s_per_mpx = STAGES[name]
+        extra = band * mb if noisy else 0
+        if name == "export":
+            if stream:
+                extra = (band_rows or _DEFAULT_BAND_ROWS) * w * STREAM_BAND_BYTES * mb
+            else:
+                fixed, transient = SAVE_EXPORT
+                if spill:
+                    transient = SPILL_EXPORT_BYTES
+        seconds = fixed_s + s_per_mpx * px / 1e6
+        if spilled and name in ("vegetation", "roads"):
+            # writing out vegetation + terrain / roads + lots
+            seconds += 2 * SPILL_S_PER_MPX * px / 1e6
+        peak = _base_mb() + resident_mb + fixed + (transient + resident + layers) * px * mb + extra
+        stages[name] = {"peak_mb": round(peak), "seconds": round(seconds, 1)}
+        if name in ("terrain", "vegetation"):
+            # the layer, the cached noise field, the streamed cost rows
+            layers += 4
+            resident += (4 if cached else 0) + (1 if stream else 0)
+            if name == "vegetation":
+                resident_mb += LUT_MB
+        elif name == "rivers":
+            resident += 2  # river and bridge masks
+        elif name == "roads":
+            layers += 8  # roads and lots layers
+    return {
+        "stages": stages,
+        "peak_mb": max(s["peak_mb"] for s in stages.values()),
+        "seconds": round(sum(s["seconds"] for s in stages.values()), 1),
+    }
+
+
+def plan(conf: dict, max_memory_mb: int | None = None) -> dict:
+    """
+    Settings for rendering conf within max_memory_mb (default: the config's
+    max_memory_mb; 0 = unlimited), with at most the config's workers
+    (default 1), and the predicted peak / time:
+    {"max_memory_mb", "band_rows", "workers", "spill", "peak_mb",
+     "seconds", "stages", "fits"}
+    """
+    if max_memory_mb is None:
+        max_memory_mb = int(conf.get("max_memory_mb", 0) or 0)
+    w, _ = canvas_size(conf)
+    cpus = os.cpu_count() or 1
+
+    band_rows = _DEFAULT_BAND_ROWS
+    if max_memory_mb:
+        allowed = max_memory_mb * _BAND_SHARE * (1 << 20)
+        band_rows = next((b for b in _BAND_CHOICES if b <= _DEFAULT_BAND_ROWS and b * w * NOISE_BYTES <= allowed),
+                         _BAND_CHOICES[-1])
+
+    spill = False
+    est = estimate(conf, band_rows)
+    if max_memory_mb and est["peak_mb"] > max_memory_mb:
+        spill = True
+        est = estimate(conf, band_rows, caches=False, spill=True)
+
+    # another worker costs an interpreter plus its own band buffers
+    per_worker = _base_mb() + band_rows * w * NOISE_BYTES / (1 << 20)
+    workers = max(1, min(cpus, int(conf.get("workers", 1) or 1)))
+    if max_memory_mb:
+        workers = max(1, min(workers, 1 + int((max_memory_mb - est["peak_mb"]) // per_worker)))
+
+    return {
+        "max_memory_mb": max_memory_mb,
+        "band_rows": band_rows,
+        "workers": workers,
+        "spill": spill,
+        "peak_mb": est["peak_mb"],
+        "seconds": est["seconds"],
+        "stages": est["stages"],
+        "fits": not max_memory_mb or est["peak_mb"] <= max_memory_mb,
+    }
+
+
+def preflight_report(conf: dict, p: dict) -> str:
+    """Human-readable plan: canvas, settings, per-stage peak / time."""
+    w, h = canvas_size(conf)
+    cap = f"{p['max_memory_mb']} MB" if p["max_memory_mb"] else "unlimited"
+    lines = [
+        f"[ZOMBOID-MAP-GEN] Preflight: {w}x{h} px ({w * h / 1e6:.1f} Mpx), memory cap {cap}",
+        f"[ZOMBOID-MAP-GEN]   band rows {p['band_rows']}, workers {p['workers']}, "
+        f"spill {'on' if p['spill'] else 'off'}",
+    ]
+    for name, s in p["stages"].items():
+        lines.append(f"[ZOMBOID-MAP-GEN]   {name:<10} peak ~{s['peak_mb']:>6} MB  ~{s['seconds']:>6} s")
+    lines.append(f"[ZOMBOID-MAP-GEN]   predicted peak ~{p['peak_mb']} MB, time ~{p['seconds']} s")
+    if not p["fits"]:
+        lines.append(f"[ZOMBOID-MAP-GEN]   WARNING: over the cap by ~{p['peak_mb'] - p['max_memory_mb']} MB "
+                     "even with spilling; use fewer cells or a larger max_memory_mb")
+    return "\n".join(lines)
+
+
+def pin_mmap_threshold():
+    """
+    Keep glibc from holding on to freed canvas arrays. Its mmap threshold
+    rises to the size of each large block freed (up to 32 MB), after which
+    band and layer arrays come from the heap and stay in RSS once freed;
+    a fixed threshold gives them back at once. No-op off glibc.
+
+    This changes malloc for the whole process for good, so only the
+    command-line entry points (cli.py, pipeline.py) call it; the GUI and
+    library callers keep the default.
+    """
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"))
+        libc.mallopt(_M_MMAP_THRESHOLD, _MMAP_THRESHOLD)
+    except (OSError, TypeError, AttributeError):
+        pass
+
+
+@contextmanager
+def applied(p: dict):
+    """Use the plan's settings inside the block; the old ones come back after."""
+    old = (noise_utils.BAND_ROWS, terrain_generator._BAND_ROWS, pan_cache.MAX_PIXELS, noise_utils.WORKERS)
+    noise_utils.BAND_ROWS = terrain_generator._BAND_ROWS = p["band_rows"]
+    noise_utils.WORKERS = p["workers"]
+    if p["spill"]:
+        pan_cache.MAX_PIXELS = 0
+        pan_cache.clear_all()
+    try:
+        yield p
+    finally:
+        noise_utils.BAND_ROWS, terrain_generator._BAND_ROWS, pan_cache.MAX_PIXELS, noise_utils.WORKERS = old
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict peak memory and time of a render")
+    parser.add_argument("--config", type=str, help="Path to config file (JSON).")
+    parser.add_argument("--max-memory-mb", type=int, default=None,
+                        help="Memory cap in MB (default: the config's max_memory_mb, 0 = unlimited).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for noise sampling (default: the config's workers, 1).")
+    args = parser.parse_args()
+
+    conf = cfg.load_config(args.config) if args.config else cfg.default_config()
+    if args.workers:
+        conf["workers"] = args.workers
+    print(preflight_report(conf, plan(conf, args.max_memory_mb)))
+
+
+if __name__ == "__main__":
+    main()
@@ -3,10 +3,19 @@
 Command-line entry point.
 Run with:
     python -m zomboid_map_gen.cli
+Browse the result as map tiles with:
+    python -m zomboid_map_gen.serve
+Grow an existing map by new cells with:
+    python -m zomboid_map_gen.extend --config conf.json --cells-x 1
+Re-roll part of an existing map with:
+    python -m zomboid_map_gen.regen --config conf.json --cell 2 1 --reroll
+Check predicted peak memory / time first with:
+    python -m zomboid_map_gen.budget --config conf.json --max-memory-mb 2048
 """
 
 import argparse
 import traceback
+from . import budget
 from . import config as cfg
 from . import core
 
@@ -16,6 +25,10 @@ def main():
 
     parser = argparse.ArgumentParser(description="Project Zomboid map generator")
     parser.add_argument("--config", type=str, help="Path to config file (JSON).")
+    parser.add_argument("--max-memory-mb", type=int, default=None,
+                        help="Memory cap in MB (default: the config's max_memory_mb, 0 = unlimited).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for noise sampling (default: the config's workers, 1).")
     args = parser.parse_args()
 
     try:
@@ -25,9 +38,12 @@ def main():
         else:
             print("[ZOMBOID-MAP-GEN] Using default config")
             conf = cfg.default_config()
+        if args.workers:
+            conf["workers"] = args.workers
 
+        budget.pin_mmap_threshold()
         print("[ZOMBOID-MAP-GEN] Calling core.generate_from_config(...)")
-        core.generate_from_config(conf)
+        core.generate_from_config(conf, args.max_memory_mb)
         print("[ZOMBOID-MAP-GEN] Generation complete.")
     except Exception as e:
         print("[ZOMBOID-MAP-GEN] ERROR during generation:")
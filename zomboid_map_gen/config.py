@@ -6,6 +6,10 @@ def default_config() -> dict:
     return {
         "seed": 12345,
         "output_dir": "output",
+        # memory cap (MB) for full renders, 0 = unlimited (see budget.py)
+        "max_memory_mb": 0,
+        # worker processes for noise sampling; more than 1 only if asked
+        "workers": 1,
         "canvas": {
             "cells_x": 1,
             "cells_y": 1,
@@ -20,12 +24,20 @@ def default_config() -> dict:
             "water_threshold": 0.25,
             "dark_threshold": 0.45,
             "medium_threshold": 0.70,
+            # optional "coverage": {"water": 0.2, "dark": 0.25, "medium": 0.3}
+            # replaces thresholds with map fractions. They hold for the raw
+            # classes, before postprocess and rivers (erosion, beaches and
+            # speckle move several points, e.g. water 0.20 -> ~0.15)
             "preset": "default",
             "postprocess": {
                 "edge_ragging": True,
                 "speckle": True,
                 "erosion": True,
+                "erosion_radius": 1,
                 "strength": 0.6,
+                "min_region_area": 16,
+                # sand this many px inland from water (0: erosion's 1 px shore)
+                "beach_width": 0,
             },
         },
         "vegetation": {
@@ -36,6 +48,15 @@ def default_config() -> dict:
             "persistence": 0.55,
             "lacunarity": 2.0,
             "respect_terrain": True,
+            "min_region_area": 16,
+        },
+        "rivers": {
+            "enabled": True,
+            "step": 4,
+            "min_catchment": 8000,
+            "min_width": 2,
+            "max_width": 9,
+            "bridge_max_width": 4,
         },
         "roads": {
             "enabled": True,
@@ -49,6 +70,22 @@ def default_config() -> dict:
             "pothole_density": 0.02,
             "ignore_water": False,
             "ignore_trees": False,
+            "dirt_paths": True,
+            "path_points_per_cell": 4,
+            "path_max_len": 220,
+            "min_component_len": 150,
+            "reconnect_dist": 60,
+            "connect_trunk": True,
+            # town blocks (canvas px²) enclosed by roads, split into lots
+            "town_blocks": True,
+            "block_min_area": 600,
+            "block_max_area": 90000,
+            "lot_area": 900,
+            "lot_min_frontage": 14,
+            # clearances (px) looked up in the distance fields
+            "water_buffer": 0,
+            "forest_buffer": 0,
+            "path_road_clearance": 0,
         },
         "export": {
             "terrain_png": "terrain.png",
@@ -56,6 +93,13 @@ def default_config() -> dict:
             "roads_png": "roads.png",
             "combined_png": "combined.png",
             "lots_png": "lots.png",
+            "metrics_json": "metrics.json",
+            "lots_json": "lots.json",
+            # 8-bit PNGs with the vanilla palettes; stray colors "snap" or "reject"
+            "indexed_png": False,
+            "off_palette": "snap",
+            # encode PNGs / count metrics in threads while later layers render (pipeline.py)
+            "stream": True,
         },
     }
 
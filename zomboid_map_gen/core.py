@@ -1,17 +1,55 @@
 # zomboid_map_gen/core.py
 from pathlib import Path
 from . import config as cfg
+from . import budget, pipeline
 from .terrain import terrain_generator
 from .vegetation import vegetation_generator
-from .roads import road_generator
-from .export import writer
+from .roads import road_generator, rivers as river_gen
+from .export import writer, metrics
+from .utils import render_context
+
+def render_layers(conf: dict, step: int = 1, stats: dict | None = None):
+    """
+    (terrain, vegetation, roads, lots) images without writing anything.
+    step > 1 renders a coarse preview with one pixel per step x step canvas block.
+    stats, if given, collects road lengths and lots (see road_generator.generate).
+    """
+    terrain_img = terrain_generator.generate(conf, step) if conf.get("terrain", {}).get("enabled", True) else None
+    # rivers are carved into the terrain before vegetation/roads look at it
+    rivers = river_gen.generate_rivers(conf, terrain_img, step) if terrain_img is not None else None
+    if rivers is not None:
+        terrain_img = rivers.carve(terrain_img)
+    veg_img = vegetation_generator.generate(conf, terrain_img, step) if conf.get("vegetation", {}).get("enabled", True) else None
+    roads_img, lots_img = road_generator.generate(conf, terrain_img, veg_img, rivers=rivers, step=step, stats=stats) if conf.get("roads", {}).get("enabled", True) else (None, None)
+    return terrain_img, veg_img, roads_img, lots_img
+
+
+def generate_from_config(conf: dict, max_memory_mb: int | None = None):
+    """
+    Render and write the map. The memory budget (max_memory_mb, else the
+    config's; 0 = unlimited) sets band sizes / spilling; see budget.py.
+    With export.stream (the default) layers are written as they finish,
+    see pipeline.py (a spilling plan returns them as pipeline.SpilledLayer);
+    otherwise everything is saved after rendering.
+    """
+    if conf.get("export", {}).get("stream", True):
+        return pipeline.run(conf, max_memory_mb)
 
-def generate_from_config(conf: dict):
     out_dir = Path(conf.get("output_dir", "output"))
     out_dir.mkdir(parents=True, exist_ok=True)
 
-    terrain_img = terrain_generator.generate(conf) if conf.get("terrain", {}).get("enabled", True) else None
-    veg_img = vegetation_generator.generate(conf, terrain_img) if conf.get("vegetation", {}).get("enabled", True) else None
-    roads_img, lots_img = road_generator.generate(conf, terrain_img, veg_img) if conf.get("roads", {}).get("enabled", True) else (None, None)
+    plan = budget.plan(conf, max_memory_mb)
+    print(budget.preflight_report(conf, plan))
 
-    writer.save_all(conf, terrain_img, veg_img, roads_img, lots_img)
+    stats = {}
+    with budget.applied(plan):
+        layers = render_layers(conf, stats=stats)
+    render_context.check()
+    palette_report = writer.save_all(conf, *layers, banded=plan["spill"])
+    report = metrics.compute(*layers, road_stats=stats)
+    if palette_report:
+        report["palette"] = palette_report
+    writer.save_metrics(conf, report)
+    if "town" in stats:
+        writer.save_lots(conf, stats["town"])
+    return layers
@@ -0,0 +1,114 @@
+# zomboid_map_gen/export/metrics.py
+"""
+Map metrics: per-class area of the terrain / vegetation rasters, road length
+by class, lot count and lot area.
+
+Class areas are one bulk pass per raster: each RGBA pixel is read as one
+uint32, its 24-bit RGB part indexes a 16 MB class lookup table (the
+export's, palette.palette_lut, built once per palette), and the class
+indices are bincounted, in row bands so the temporaries stay small.
+Anything off-palette (speckle jitter, ragged edges) is counted as "other". Road lengths come from the
+polylines the road generator recorded, not from the raster.
+"""
+
+import numpy as np
+
+from ..utils import colors as base_colors
+from .palette import palette_lut
+
+# rows per band when counting
+_BAND_ROWS = 1024
+# class slots of the shared table: off-palette, and one free below it for alpha 0
+_OTHER = 255
+_TRANSPARENT = 254
+
+
+class ClassAreas:
+    """class_areas accumulated over row bands of RGBA pixels (streamed export)."""
+
+    def __init__(self, palette: dict):
+        self.names = list(palette)
+        # indices 0..len - 1 < _TRANSPARENT (palette_lut caps the size)
+        self.lut = palette_lut(palette)
+        self.counts = np.zeros(256, dtype=np.int64)
+
+    def add(self, arr: np.ndarray):
+        # one little-endian uint32 per pixel: R | G << 8 | B << 16 | A << 24
+        packed = np.ascontiguousarray(arr).view("<u4")[..., 0]
+        for y0 in range(0, packed.shape[0], _BAND_ROWS):
+            band = packed[y0:y0 + _BAND_ROWS]
+            idx = self.lut[band & 0xFFFFFF]
+            idx[band < (1 << 24)] = _TRANSPARENT
+            self.counts += np.bincount(idx.ravel(), minlength=256)
+
+    def result(self) -> dict:
+        out = {name: int(self.counts[i]) for i, name in enumerate(self.names)}
+        out["other"] = int(self.counts[_OTHER])
+        out["transparent"] = int(self.counts[_TRANSPARENT])
+        return out
+
+
+def class_areas(img, palette: dict) -> dict:
+    """
+    {class: pixel count} for every palette entry plus "other" (off-palette)
+    and "transparent" (alpha 0).
+    """
+    areas = ClassAreas(palette)
+    areas.add(np.asarray(img if img.mode == "RGBA" else img.convert("RGBA")))
+    return areas.result()
+
+
+def _opaque(img) -> int:
+    return int(np.count_nonzero(np.asarray(img.getchannel("A"))))
+
+
+def _with_fractions(counts: dict, total: int) -> dict:
+    return {
+        name: {"pixels": n, "fraction": round(n / total, 6) if total else 0.0}
+        for name, n in counts.items() if n
+    }
+
+
+def compute(terrain_img=None, veg_img=None, roads_img=None, lots_img=None,
+            road_stats: dict | None = None, counted: dict | None = None) -> dict:
+    """
+    Metrics dict for a finished map. road_stats is what
+    road_generator.generate(..., stats=...) filled in. counted holds
+    results already taken while streaming, used instead of rescanning:
+    {"terrain" / "vegetation": class_areas, "roads" / "lots": opaque px}.
+    """
+    counted = counted or {}
+    report = {}
+    size = next((img.size for img in (terrain_img, veg_img, roads_img, lots_img) if img is not None), None)
+    if size is None:
+        return report
+    total = size[0] * size[1]
+    report["canvas"] = {"width": size[0], "height": size[1], "pixels": total}
+
+    if terrain_img is not None:
+        areas = counted.get("terrain") or class_areas(terrain_img, base_colors.VANILLA)
+        report["terrain"] = _with_fractions(areas, total)
+    if veg_img is not None:
+        areas = counted.get("vegetation") or class_areas(veg_img, base_colors.VEG)
+        report["vegetation"] = _with_fractions(areas, total)
+
+    stats = road_stats or {}
+    if roads_img is not None:
+        lengths = stats.get("road_length", {})
+        report["roads"] = {
+            "length_px": {name: round(v, 1) for name, v in lengths.items()},
+            "total_length_px": round(sum(lengths.values()), 1),
+            "pixels": counted["roads"] if "roads" in counted else _opaque(roads_img),
+        }
+        if "network" in stats:
+            report["roads"]["network"] = stats["network"]
+    if lots_img is not None:
+        report["lots"] = {
+            "count": len(stats.get("lots", ())),
+            # union area: overlapping lots are only counted once
+            "area_px": counted["lots"] if "lots" in counted else _opaque(lots_img),
+        }
+        if "town" in stats:
+            report["lots"]["town_blocks"] = stats["town"]["blocks"]
+            report["lots"]["town_lots"] = len(stats["town"]["lots"])
+    return report
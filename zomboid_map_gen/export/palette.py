@@ -0,0 +1,119 @@
+# zomboid_map_gen/export/palette.py
+"""
+Indexed (mode "P") export with the exact vanilla palettes.
+
+Terrain and roads only use colors.VANILLA, vegetation colors.VEG, so a
+layer fits an 8-bit palette: one byte per pixel instead of four, which
+makes the PNGs several times smaller and quicker to encode and load.
+
+Pixels whose RGB is not a palette entry (apply_speckle jitter, anything
+blended) are either snapped to the nearest entry or rejected, and counted
+in a report. Alpha 0 maps to one extra fully transparent entry; any other
+alpha is written opaque and counted as off-palette too.
+
+Same lookup (and the same cached table, palette_lut) as
+metrics.class_areas: each pixel read as one uint32, its RGB part indexing
+a 2**24 table, in row bands. Only the distinct off-palette
+colors go through the nearest-color search.
+"""
+
+import numpy as np
+from PIL import Image
+
+from ..utils import colors as base_colors
+
+PALETTES = {
+    "terrain": base_colors.VANILLA,
+    "vegetation": base_colors.VEG,
+    "roads": base_colors.VANILLA,
+}
+
+OFF_PALETTE_MODES = ("snap", "reject")
+
+_BAND_ROWS = 1024
+# table value for RGB keys that are not in the palette
+_OFF = 255
+
+_luts = {}
+
+
+def palette_lut(palette: dict) -> np.ndarray:
+    """
+    2**24 table: little-endian RGB key -> palette index, 255 if off-palette.
+    Built once per palette and shared (export here, metrics.ClassAreas);
+    don't write to it.
+    """
+    key = tuple(c[:3] for c in palette.values())
+    if len(key) >= _OFF:
+        raise ValueError("palette too large for 8-bit indices")
+    lut = _luts.get(key)
+    if lut is None:
+        lut = np.full(1 << 24, _OFF, dtype=np.uint8)
+        for i, (r, g, b) in enumerate(key):
+            lut[r | (g << 8) | (b << 16)] = i
+        _luts[key] = lut
+    return lut
+
+
+def _nearest(keys: np.ndarray, rgb: np.ndarray):
+    """(palette index, distance) of the closest entry for each packed RGB key."""
+    cols = np.stack([keys & 0xFF, (keys >> 8) & 0xFF, (keys >> 16) & 0xFF], axis=1).astype(np.int32)
+    d2 = ((cols[:, None, :] - rgb[None, :, :]) ** 2).sum(axis=2)
+    idx = d2.argmin(axis=1)
+    return idx.astype(np.uint8), np.sqrt(d2[np.arange(len(keys)), idx])
+
+
+def to_indexed(img: Image.Image, palette: dict, off_palette: str = "snap"):
+    """
+    (mode "P" image, report) for an RGBA layer. off_palette "snap" maps
+    stray colors to the nearest entry, "reject" raises ValueError if there
+    are any. report: {"off_palette_pixels", "off_palette_colors",
+    "max_distance", "snapped_to": {name: pixels}}.
+    """
+    if off_palette not in OFF_PALETTE_MODES:
+        raise ValueError(f"off_palette must be one of {OFF_PALETTE_MODES}, not {off_palette!r}")
+    names = list(palette)
+    if len(names) >= _OFF:
+        raise ValueError("palette too large for 8-bit indices")
+    transparent = len(names)
+    lut = palette_lut(palette)
+    rgb = np.array([palette[n][:3] for n in names], dtype=np.int32)
+
+    arr = np.ascontiguousarray(np.asarray(img if img.mode == "RGBA" else img.convert("RGBA")))
+    packed = arr.view("<u4")[..., 0]
+    out = np.empty(packed.shape, dtype=np.uint8)
+    off_keys, off_counts = [], []
+    for y0 in range(0, packed.shape[0], _BAND_ROWS):
+        band = packed[y0:y0 + _BAND_ROWS]
+        idx = lut[band & 0xFFFFFF]
+        alpha = band >> 24
+        off = (idx == _OFF) | ((alpha != 0) & (alpha != 255))
+        idx[alpha == 0] = transparent
+        off &= alpha != 0
+        if off.any():
+            keys, inverse, counts = np.unique(band[off] & 0xFFFFFF, return_inverse=True, return_counts=True)
+            if off_palette == "snap":
+                near, _ = _nearest(keys, rgb)
+                idx[off] = near[inverse]
+            off_keys.append(keys)
+            off_counts.append(counts)
+        out[y0:y0 + _BAND_ROWS] = idx
+
+    report = {"off_palette_pixels": 0, "off_palette_colors": 0, "max_distance": 0.0, "snapped_to": {}}
+    if off_keys:
+        keys, inverse = np.unique(np.concatenate(off_keys), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate(off_counts)).astype(np.int64)
+        near, dist = _nearest(keys, rgb)
+        report.update(off_palette_pixels=int(counts.sum()), off_palette_colors=int(keys.size),
+                      max_distance=round(float(dist.max()), 1))
+        per_entry = np.bincount(near, weights=counts, minlength=len(names))
+        report["snapped_to"] = {names[i]: int(n) for i, n in enumerate(per_entry) if n}
+        if off_palette == "reject":
+            raise ValueError(f"{report['off_palette_pixels']} off-palette pixels in "
+                             f"{report['off_palette_colors']} colors (max distance {report['max_distance']})")
+
+    indexed = Image.fromarray(out, "P")
+    indexed.putpalette([c for n in names for c in palette[n][:3]] + [0, 0, 0])
+    # tRNS: everything opaque except the extra entry
+    indexed.info["transparency"] = bytes([255] * transparent + [0])
+    return indexed, report
@@ -0,0 +1,282 @@
+# zomboid_map_gen/export/tiles.py
+"""
+Map layers as a zoom pyramid of fixed-size tiles, rendered on demand.
+
+Zoom 0 fits the whole map in one tile; every level doubles the resolution
+up to max_zoom, which is the canvas at 1:1. A tile at zoom z covers
+TILE_SIZE * step canvas pixels per side, step = 2 ** (max_zoom - z).
+
+Sources:
+- ImageTiles: cut from layer images (in memory, or saved PNGs cut once
+  into an on-disk pyramid)
+- GeneratorTiles: terrain / vegetation sampled straight from the generators
+  for just the tile's window; roads come from saved layers if given
+
+Tiles are TILE_SIZE x TILE_SIZE RGBA, transparent outside the map. Each
+source keeps a bounded LRU of rendered tiles, so looking around a huge map
+costs memory for what is on screen, not for the map.
+"""
+
+import copy
+import math
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+from PIL import Image
+
+from ..terrain import terrain_generator
+from ..vegetation import vegetation_generator
+from . import writer
+
+TILE_SIZE = 256
+LAYERS = ("terrain", "vegetation", "roads", "composite")
+
+# ~64 MB of RGBA tiles at the default size
+MAX_TILES = 1024
+
+
+class LRUCache:
+    """Thread-safe bounded mapping; the least recently used entry goes first."""
+
+    def __init__(self, max_items: int = MAX_TILES):
+        self.max_items = max_items
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._items
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is not None:
+                self._items.move_to_end(key)
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._items[key] = value
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class TileSource:
+    """
+    Base pyramid over a width x height canvas. Subclasses implement
+    _render_layer(layer, z, tx, ty) -> the tile's w x h part of the map
+    (see window), or None if the layer has nothing there.
+    """
+
+    def __init__(self, width: int, height: int, tile_size: int = TILE_SIZE,
+                 max_tiles: int = MAX_TILES):
+        self.width = width
+        self.height = height
+        self.tile_size = tile_size
+        self.max_zoom = max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+        self.cache = LRUCache(max_tiles)
+
+    def step(self, z: int) -> int:
+        """Canvas pixels per tile pixel at zoom z."""
+        return 2 ** (self.max_zoom - z)
+
+    def grid(self, z: int) -> tuple[int, int]:
+        """(columns, rows) of tiles at zoom z."""
+        span = self.tile_size * self.step(z)
+        return -(-self.width // span), -(-self.height // span)
+
+    def level_size(self, z: int) -> tuple[int, int]:
+        """Map size in pixels at zoom z."""
+        step = self.step(z)
+        return -(-self.width // step), -(-self.height // step)
+
+    def window(self, z: int, tx: int, ty: int):
+        """(x0, y0, w, h, step) of a tile: canvas origin + output size, or None."""
+        if not 0 <= z <= self.max_zoom:
+            return None
+        cols, rows = self.grid(z)
+        if not (0 <= tx < cols and 0 <= ty < rows):
+            return None
+        step = self.step(z)
+        lw, lh = self.level_size(z)
+        w = min(self.tile_size, lw - tx * self.tile_size)
+        h = min(self.tile_size, lh - ty * self.tile_size)
+        return tx * self.tile_size * step, ty * self.tile_size * step, w, h, step
+
+    def cached(self, layer: str, z: int, tx: int, ty: int):
+        return self.cache.get((layer, z, tx, ty))
+
+    def tile(self, layer: str, z: int, tx: int, ty: int):
+        """RGBA tile, rendered on a cache miss; None outside the pyramid."""
+        key = (layer, z, tx, ty)
+        img = self.cache.get(key)
+        if img is not None:
+            return img
+        if self.window(z, tx, ty) is None:
+            return None
+
+        if layer == "composite":
+            terrain = self.tile("terrain", z, tx, ty)
+            img = writer.compose_preview(terrain, self.tile("vegetation", z, tx, ty),
+                                         self.tile("roads", z, tx, ty))
+        else:
+            img = Image.new("RGBA", (self.tile_size, self.tile_size), (0, 0, 0, 0))
+            part = self._render_layer(layer, z, tx, ty)
+            if part is not None:
+                img.paste(part.convert("RGBA"), (0, 0))
+        self.cache.put(key, img)
+        return img
+
+    def _render_layer(self, layer, z, tx, ty):
+        raise NotImplementedError
+
+
+class ImageTiles(TileSource):
+    """
+    Tiles cut from finished layer images. layers maps layer name -> PIL image
+    or a path to a saved PNG. Downsampling is nearest neighbor straight from
+    the source box, so tiles keep exact palette colors and never need a
+    resized copy of the whole layer.
+
+    A saved PNG is decoded once, when its first tile is asked for, and cut
+    into the whole pyramid on disk (cut_dir, default tiles/cut next to the
+    PNG, one directory per file version); after that each tile is one small
+    file read, so the decoded layer is not kept and tiles render in
+    parallel. Only the cut itself is serialized, per layer. Cut tiles are
+    full tile_size PNGs, padded like tile() pads, so a server can send the
+    files as they are (see tile_file).
+    """
+
+    def __init__(self, layers: dict, tile_size: int = TILE_SIZE, max_tiles: int = MAX_TILES,
+                 cut_dir=None):
+        self._layers = {k: v for k, v in layers.items() if v is not None}
+        self._cut_dir = Path(cut_dir) if cut_dir else None
+        self._cuts = {}  # layer -> directory of its pyramid
+        self._cut_locks = {name: threading.Lock() for name in self._layers}
+        width, height = 0, 0
+        for img in self._layers.values():
+            if isinstance(img, Image.Image):
+                img.load()
+                size = img.size
+            else:
+                with Image.open(img) as f:  # header only
+                    size = f.size
+            width, height = max(width, size[0]), max(height, size[1])
+        super().__init__(max(1, width), max(1, height), tile_size, max_tiles)
+
+    def _cut_tile(self, img, z, tx, ty):
+        # the tile's part of a decoded layer, None if the layer ends before it
+        x0, y0, w, h, step = self.window(z, tx, ty)
+        if x0 >= img.width or y0 >= img.height:
+            return None
+        box = (x0, y0, min(img.width, x0 + w * step), min(img.height, y0 + h * step))
+        size = (-(-(box[2] - x0) // step), -(-(box[3] - y0) // step))
+        return img.resize(size, Image.NEAREST, box=box)
+
+    def _cut(self, layer) -> Path:
+        """Directory of the layer's pyramid (z/x/y.png), cut on first use."""
+        with self._cut_locks[layer]:
+            out = self._cuts.get(layer)
+            if out is not None:
+                return out
+            path = Path(self._layers[layer])
+            st = path.stat()
+            root = self._cut_dir or path.parent / "tiles" / "cut"
+            out = root / f"{path.stem}-{st.st_mtime_ns}-{st.st_size}-{self.tile_size}-{self.width}x{self.height}-full"
+            if not out.exists():
+                # cut next to it and rename, so a half-cut pyramid is never read
+                tmp = root / f"{out.name}.{os.getpid()}.{threading.get_ident()}.tmp"
+                try:
+                    with Image.open(path) as img:
+                        img.load()
+                        for z in range(self.max_zoom + 1):
+                            cols, rows = self.grid(z)
+                            for tx in range(cols):
+                                for ty in range(rows):
+                                    part = self._cut_tile(img, z, tx, ty)
+                                    if part is not None:
+                                        full = Image.new("RGBA", (self.tile_size, self.tile_size), (0, 0, 0, 0))
+                                        full.paste(part.convert("RGBA"), (0, 0))
+                                        dst = tmp / str(z) / str(tx) / f"{ty}.png"
+                                        dst.parent.mkdir(parents=True, exist_ok=True)
+                                        full.save(dst, compress_level=1)
+                except BaseException:
+                    # e.g. the PNG is still being written: no pyramid, try again next time
+                    shutil.rmtree(tmp, ignore_errors=True)
+                    raise
+                tmp.mkdir(parents=True, exist_ok=True)
+                try:
+                    os.replace(tmp, out)
+                except OSError:  # another process finished the same cut first
+                    shutil.rmtree(tmp, ignore_errors=True)
+                # older versions of this layer
+                for old in root.glob(f"{path.stem}-*"):
+                    if old != out and not old.name.endswith(".tmp"):
+                        shutil.rmtree(old, ignore_errors=True)
+            self._cuts[layer] = out
+            return out
+
+    def tile_file(self, layer: str, z: int, tx: int, ty: int) -> Path | None:
+        """
+        The cut PNG that is this tile of a saved layer (cut on first use),
+        None for in-memory layers, composites and tiles the layer doesn't reach.
+        """
+        src = self._layers.get(layer)
+        if src is None or isinstance(src, Image.Image) or self.window(z, tx, ty) is None:
+            return None
+        path = self._cut(layer) / str(z) / str(tx) / f"{ty}.png"
+        return path if path.exists() else None
+
+    def _render_layer(self, layer, z, tx, ty):
+        src = self._layers.get(layer)
+        if src is None:
+            return None
+        if isinstance(src, Image.Image):
+            return self._cut_tile(src, z, tx, ty)
+        path = self.tile_file(layer, z, tx, ty)
+        if path is None:
+            return None
+        img = Image.open(path)
+        img.load()
+        return img
+
+
+class GeneratorTiles(TileSource):
+    """
+    Terrain and vegetation rendered per tile from the generators (noise is
+    sampled for the tile window only). Rivers and roads come from the whole
+    map, so they are taken from `saved` (an ImageTiles) when given.
+    """
+
+    def __init__(self, conf: dict, saved: ImageTiles | None = None,
+                 tile_size: int = TILE_SIZE, max_tiles: int = MAX_TILES):
+        self.conf = copy.deepcopy(conf)
+        self.saved = saved
+        width, height = terrain_generator._get_canvas_size(self.conf)
+        super().__init__(width, height, tile_size, max_tiles)
+
+    def _render_layer(self, layer, z, tx, ty):
+        x0, y0, w, h, step = self.window(z, tx, ty)
+        terrain_on = self.conf.get("terrain", {}).get("enabled", True)
+        if layer == "terrain":
+            return terrain_generator.render_window(self.conf, x0, y0, w, h, step) if terrain_on else None
+        if layer == "vegetation":
+            if not self.conf.get("vegetation", {}).get("enabled", True):
+                return None
+            # respect_terrain looks at the (cached) terrain tile underneath
+            terrain = self.tile("terrain", z, tx, ty).crop((0, 0, w, h)) if terrain_on else None
+            return vegetation_generator.render_window(self.conf, x0, y0, w, h, step, terrain)
+        if self.saved is not None and (self.saved.width, self.saved.height) == (self.width, self.height):
+            return self.saved._render_layer(layer, z, tx, ty)
+        return None
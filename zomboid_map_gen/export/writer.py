@@ -1,21 +1,117 @@
 # zomboid_map_gen/export/writer.py
+import json
 from pathlib import Path
 
-def save_all(conf, terrain_img, veg_img, roads_img, lots_img):
-    out_dir = Path(conf.get("output_dir", "output"))
-    out_dir.mkdir(parents=True, exist_ok=True)
+from PIL import Image
 
-    if terrain_img:
-        terrain_img.save(out_dir / "terrain.png")
+from . import palette
+
+# preview band height when composing in bands
+PREVIEW_BAND_ROWS = 512
+
+
+def compose_preview(terrain_img, veg_img, roads_img, band_rows: int = 0):
+    """
+    Terrain with vegetation and roads on top (what preview.png shows).
+    band_rows > 0 composes it band by band, so apart from the result only
+    one band is held at a time (used when the memory budget spills).
+    """
+    if band_rows:
+        combo = Image.new("RGBA", terrain_img.size)
+        w, h = terrain_img.size
+        for y0 in range(0, h, band_rows):
+            box = (0, y0, w, min(h, y0 + band_rows))
+            combo.paste(compose_preview(*(img.crop(box) if img else None
+                                          for img in (terrain_img, veg_img, roads_img))), box)
+        return combo
+    combo = terrain_img.copy()
     if veg_img:
-        veg_img.save(out_dir / "vegetation.png")
+        combo.alpha_composite(veg_img)
     if roads_img:
-        roads_img.save(out_dir / "roads.png")
+        combo.alpha_composite(roads_img)
+    return combo
+
+
+def _save_layer(img, path, layer, exp, name: str | None = None) -> dict | None:
+    """
+    Write one layer; with export.indexed_png, palettized (returns its palette
+    report). name is the file name to report, if path is a temporary file.
+    """
+    if not exp.get("indexed_png", False) or layer not in palette.PALETTES:
+        img.save(path)
+        return None
+    indexed, report = palette.to_indexed(img, palette.PALETTES[layer], exp.get("off_palette", "snap"))
+    indexed.save(path, transparency=indexed.info["transparency"])
+    if report["off_palette_pixels"]:
+        print(f"[ZOMBOID-MAP-GEN] {name or path.name}: snapped {report['off_palette_pixels']} off-palette pixels "
+              f"({report['off_palette_colors']} colors, max distance {report['max_distance']})")
+    return report
+
+
+def save_all(conf, terrain_img, veg_img, roads_img, lots_img, banded: bool = False) -> dict:
+    """
+    Write the layer PNGs and preview. Returns {layer: palette report} for
+    layers written indexed (empty unless export.indexed_png). banded
+    composes the preview in row bands (see compose_preview).
+    """
+    out_dir = Path(conf.get("output_dir", "output"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    exp = conf.get("export", {})
+
+    reports = {}
+    for layer, img, name in (("terrain", terrain_img, "terrain.png"),
+                             ("vegetation", veg_img, "vegetation.png"),
+                             ("roads", roads_img, "roads.png")):
+        if img:
+            report = _save_layer(img, out_dir / name, layer, exp)
+            if report is not None:
+                reports[layer] = report
+    if lots_img:
+        lots_img.save(out_dir / "lots.png")
 
     if terrain_img:
-        combo = terrain_img.copy()
-        if veg_img:
-            combo.alpha_composite(veg_img)
-        if roads_img:
-            combo.alpha_composite(roads_img)
-        combo.save(out_dir / "preview.png")
+        band_rows = PREVIEW_BAND_ROWS if banded else 0
+        compose_preview(terrain_img, veg_img, roads_img, band_rows).save(out_dir / "preview.png")
+    return reports
+
+
+def save_metrics(conf, report: dict):
+    """Write the metrics report (export.metrics_json) next to the PNGs."""
+    name = conf.get("export", {}).get("metrics_json", "metrics.json")
+    if not name:
+        return
+    out_dir = Path(conf.get("output_dir", "output"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / name, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def save_lots(conf, town: dict):
+    """Write the town lot list (export.lots_json): blocks count and lot polygons."""
+    name = conf.get("export", {}).get("lots_json", "lots.json")
+    if not name:
+        return
+    out_dir = Path(conf.get("output_dir", "output"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    with open(out_dir / name, "w", encoding="utf-8") as f:
+        json.dump(town, f)
+
+
+def load_lots(conf) -> dict:
+    """The saved town lot list, empty if there is none."""
+    name = conf.get("export", {}).get("lots_json", "lots.json")
+    path = Path(conf.get("output_dir", "output")) / name if name else None
+    if path is None or not path.exists():
+        return {"blocks": 0, "lots": []}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_metrics(conf) -> dict:
+    """The saved metrics report, {} if there is none."""
+    name = conf.get("export", {}).get("metrics_json", "metrics.json")
+    path = Path(conf.get("output_dir", "output")) / name if name else None
+    if path is None or not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
@@ -0,0 +1,186 @@
+# zomboid_map_gen/extend.py
+"""
+Grow a generated map by whole cells without regenerating it.
+Run with:
+    python -m zomboid_map_gen.extend --config conf.json --cells-x 1 [--cells-y 1]
+
+New columns are added on the right, new rows at the bottom. Only the new
+cells are rendered; the old pixels are kept byte for byte:
+- terrain / vegetation come from the windowed renderers with the noise
+  normalization pinned to the original canvas (canvas.frame), so classes
+  continue seamlessly across the old border
+- roads that run out of the old edge are picked up there and walked on;
+  fresh roads come in from the outer edges at the config's road density
+  (num_* per original map area)
+
+Rivers need the whole map's drainage and are not extended. Loading and
+saving the layer PNGs still touches the whole map; everything else costs
+the new strip (the first extension also samples the old canvas once for
+its noise ranges). The grown config, with canvas.frame and those ranges,
+is written next to the map so the next extension stays in the same frame.
+"""
+
+import argparse
+import copy
+from pathlib import Path
+
+from PIL import Image
+
+from . import config as cfg
+from .utils import noise_utils
+from .terrain import terrain_generator
+from .vegetation import vegetation_generator
+from .roads import road_generator, blocks
+from .export import writer, metrics
+
+SAVED_LAYERS = ("terrain.png", "vegetation.png", "roads.png", "lots.png")
+EXTENDED_CONFIG = "config.json"
+
+def load_layers(conf: dict) -> list:
+    """The saved (terrain, vegetation, roads, lots) images, None where missing."""
+    out_dir = Path(conf.get("output_dir", "output"))
+    return [Image.open(out_dir / name).convert("RGBA") if (out_dir / name).exists() else None
+            for name in SAVED_LAYERS]
+
+
+def _render_strip(conf, x0, y0, w, h, starts, density, sides, stats):
+    """(terrain, vegetation, roads, lots) for the canvas window (x0, y0, w, h)."""
+    terrain = terrain_generator.render_window(conf, x0, y0, w, h)
+    veg = None
+    if conf.get("vegetation", {}).get("enabled", True):
+        veg = vegetation_generator.render_window(conf, x0, y0, w, h, terrain_img=terrain)
+    roads = lots = None
+    if conf.get("roads", {}).get("enabled", True):
+        roads, lots = road_generator.generate(conf, terrain, veg, starts=starts,
+                                              density=density, sides=sides, stats=stats)
+    return terrain, veg, roads, lots
+
+
+def _grow(img, size):
+    if img is None:
+        return None
+    out = Image.new("RGBA", size, (0, 0, 0, 0))
+    out.paste(img, (0, 0))
+    return out
+
+
+def extend(conf: dict, add_x: int = 0, add_y: int = 0, layers=None):
+    """
+    Grow the map of `conf` by add_x cell columns (right) and add_y cell rows
+    (bottom). layers: the existing (terrain, vegetation, roads, lots) images,
+    loaded from the output dir if not given. Returns (grown config, grown
+    layers, road stats of the new cells).
+    """
+    if add_x < 0 or add_y < 0:
+        raise ValueError("extend only adds cells (add_x, add_y >= 0)")
+    terrain, veg, roads, lots = layers if layers is not None else load_layers(conf)
+    if terrain is None:
+        raise ValueError("extend needs the existing terrain layer")
+
+    old_w, old_h = terrain_generator._get_canvas_size(conf)
+    if terrain.size != (old_w, old_h):
+        raise ValueError(f"saved terrain is {terrain.size[0]}x{terrain.size[1]}, "
+                         f"config says {old_w}x{old_h}")
+
+    new_conf = copy.deepcopy(conf)
+    canvas = new_conf.setdefault("canvas", {})
+    canvas["cells_x"] = canvas.get("cells_x", 1) + add_x
+    canvas["cells_y"] = canvas.get("cells_y", 1) + add_y
+    # keep normalizing over the original canvas; its noise ranges travel
+    # with the config so the next extension doesn't resample the frame
+    frame = terrain_generator._frame_size(conf)
+    canvas["frame"] = list(frame)
+    noise_utils.remember_ranges(canvas.get("frame_ranges", ()))
+    new_w, new_h = terrain_generator._get_canvas_size(new_conf)
+
+    terrain, veg, roads, lots = (_grow(img, (new_w, new_h)) for img in (terrain, veg, roads, lots))
+    if new_conf.get("roads", {}).get("enabled", True):
+        roads = roads or Image.new("RGBA", (new_w, new_h), (0, 0, 0, 0))
+        lots = lots or Image.new("RGBA", (new_w, new_h), (0, 0, 0, 0))
+    stats = {"road_length": {}, "lots": [], "town": {"blocks": 0, "lots": []}}
+
+    # bottom strip under the old map first, then the right strip over the
+    # full new height, so it also continues roads leaving the bottom strip
+    strips = []
+    if add_y:
+        strips.append(((0, old_h, old_w, new_h - old_h), "bottom", ("left", "bottom")))
+    if add_x:
+        strips.append(((old_w, 0, new_w - old_w, new_h), "right", ("top", "bottom", "right")))
+
+    for (x0, y0, w, h), side, sides in strips:
+        starts = []
+        if roads is not None:
+            # only the few px inside the edge are scanned
+            depth = road_generator.EXIT_PROBE + 1
+            if side == "bottom":
+                edge = roads.crop((0, old_h - depth, old_w, old_h))
+                starts = [(pos, 0, ang, t) for pos, ang, t in road_generator.road_exits(edge, "bottom")]
+            else:
+                edge = roads.crop((old_w - depth, 0, old_w, new_h))
+                starts = [(0, pos, ang, t) for pos, ang, t in road_generator.road_exits(edge, "right")]
+        strip_stats = {}
+        layers = _render_strip(new_conf, x0, y0, w, h, starts,
+                               w * h / float(old_w * old_h), sides, strip_stats)
+        for dst, src in zip((terrain, veg, roads, lots), layers):
+            if dst is not None and src is not None:
+                dst.paste(src, (x0, y0))
+        for name, length in strip_stats.get("road_length", {}).items():
+            stats["road_length"][name] = stats["road_length"].get(name, 0.0) + length
+        stats["lots"].extend((x + x0, y + y0, lw, lh) for x, y, lw, lh in strip_stats.get("lots", ()))
+        if "town" in strip_stats:
+            stats["town"] = blocks.merge_towns(stats["town"], blocks.offset_town(strip_stats["town"], x0, y0))
+
+    canvas["frame_ranges"] = noise_utils.known_ranges(*frame)
+    return new_conf, (terrain, veg, roads, lots), stats
+
+
+def save(conf: dict, new_conf: dict, layers, stats: dict, config_path=None) -> Path:
+    """
+    Write the grown layers, metrics (road lengths and lot counts of the old
+    map carried over from its metrics.json) and config. Returns the config path.
+    """
+    palette_report = writer.save_all(new_conf, *layers)
+
+    report = metrics.compute(*layers, road_stats=stats)
+    if palette_report:
+        report["palette"] = palette_report
+    old = writer.load_metrics(conf)
+    old_roads = old.get("roads", {})
+    if "roads" in report:
+        lengths = report["roads"]["length_px"]
+        for name, length in old_roads.get("length_px", {}).items():
+            lengths[name] = round(lengths.get(name, 0.0) + length, 1)
+        report["roads"]["total_length_px"] = round(sum(lengths.values()), 1)
+    town = blocks.merge_towns(writer.load_lots(conf), stats["town"])
+    if "lots" in report:
+        report["lots"]["count"] += old.get("lots", {}).get("count", 0)
+        report["lots"].update(town_blocks=town["blocks"], town_lots=len(town["lots"]))
+    writer.save_metrics(new_conf, report)
+    writer.save_lots(new_conf, town)
+
+    path = Path(config_path or Path(new_conf.get("output_dir", "output")) / EXTENDED_CONFIG)
+    cfg.save_config(new_conf, str(path))
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grow a generated map by new cells")
+    parser.add_argument("--config", type=str, help="Config the map was generated with (JSON).")
+    parser.add_argument("--cells-x", type=int, default=0, help="Cell columns to add on the right.")
+    parser.add_argument("--cells-y", type=int, default=0, help="Cell rows to add at the bottom.")
+    parser.add_argument("--save-config", type=str, default=None,
+                        help=f"Where the grown config goes (default: <output_dir>/{EXTENDED_CONFIG}).")
+    args = parser.parse_args()
+
+    conf = cfg.load_config(args.config) if args.config else cfg.default_config()
+    if not (args.cells_x or args.cells_y):
+        parser.error("nothing to add: pass --cells-x and/or --cells-y")
+
+    new_conf, layers, stats = extend(conf, args.cells_x, args.cells_y)
+    path = save(conf, new_conf, layers, stats, args.save_config)
+    w, h = layers[0].size
+    print(f"[ZOMBOID-MAP-GEN] Extended map to {w}x{h}; config written to {path}")
+
+
+if __name__ == "__main__":
+    main()
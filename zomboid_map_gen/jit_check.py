@@ -0,0 +1,157 @@
+# zomboid_map_gen/jit_check.py
+"""
+Parity check between the compiled kernels (utils/jit.py) and the
+reference numpy / Python code.
+Run with:
+    python -m zomboid_map_gen.jit_check [--seeds 1 2 3] [--cells 2]
+
+For every seed the map is rendered twice, kernels off and on, and the
+layers (and town lots) must match byte for byte; each kernel is also
+compared on its own against the code it replaces (Perlin noise, road
+segment costs, erosion, darkest-neighbor erosion, potholes). Without numba the kernels
+run as plain Python, so keep --cells small there. Exits 1 on a mismatch.
+"""
+
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from . import config as cfg
+from . import core
+from .roads import road_costs, road_post, rivers as river_gen
+from .terrain import postprocess, terrain_generator
+from .vegetation import vegetation_generator
+from .utils import colors as base_colors, jit, noise_utils, pan_cache
+
+
+def _both(fn):
+    """(reference result, kernel result, reference s, kernel s) of fn()."""
+    old = jit.ENABLED
+    out = []
+    try:
+        for on in (False, True):
+            jit.ENABLED = on
+            t = time.perf_counter()
+            out.append(fn())
+            out.append(time.perf_counter() - t)
+    finally:
+        jit.ENABLED = old
+    return out[0], out[2], out[1], out[3]
+
+
+def _render(conf, seed):
+    def run():
+        pan_cache.clear_all()
+        random.seed(seed)
+        stats = {}
+        layers = core.render_layers(conf, stats=stats)
+        return [img.tobytes() if img else None for img in layers], stats.get("town")
+    return run
+
+
+def check_render(seed: int, cells: int) -> tuple[bool, str]:
+    conf = cfg.default_config()
+    conf["seed"] = seed
+    conf["canvas"].update(cells_x=cells, cells_y=cells)
+    conf["terrain"]["postprocess"]["erosion_radius"] = 2
+    conf["roads"].update(water_buffer=3, forest_buffer=2)
+    ref, new, t_ref, t_new = _both(_render(conf, seed))
+    return ref == new, f"render seed {seed}: {t_ref:.2f} s reference, {t_new:.2f} s kernels"
+
+
+def check_noise(seed: int, cells: int) -> tuple[bool, str]:
+    rng = np.random.default_rng(seed)
+    xs, ys = rng.uniform(-5000, 5000, (2, 20000 * cells))
+    cases = [(60, 6, 0.5, 2.0), (37.5, 4, 0.63, 2.13), (200, 1, 0.5, 2.0), (80, 8, 0.41, 1.9)]
+
+    def run():
+        return [noise_utils.perlin2_array(xs, ys, scale, octaves, pers, lac, seed=s).tobytes()
+                for scale, octaves, pers, lac in cases for s in (seed, seed + 700)]
+    ref, new, t_ref, t_new = _both(run)
+    return ref == new, f"noise: {t_ref:.3f} s reference, {t_new:.3f} s kernels"
+
+
+def check_segments(seed: int, cells: int) -> tuple[bool, str]:
+    conf = cfg.default_config()
+    conf["seed"] = seed
+    conf["canvas"].update(cells_x=cells, cells_y=cells)
+    random.seed(seed)
+    terrain = terrain_generator.generate(conf)
+    rivers = river_gen.generate_rivers(conf, terrain)
+    if rivers is not None:
+        terrain = rivers.carve(terrain)
+    veg = vegetation_generator.generate(conf, terrain)
+    fields = road_costs.CostFields(terrain, veg, rivers)
+    rnd = random.Random(seed)
+    w, h = terrain.size
+    segs = []
+    for _ in range(5000):
+        x, y = rnd.uniform(-10, w + 10), rnd.uniform(-10, h + 10)
+        length, a = rnd.choice([0, 0.5, 5, 60]), rnd.uniform(0, 2 * np.pi)
+        segs.append((x, y, x + length * np.cos(a), y + length * np.sin(a),
+                     rnd.random() < 0.2, rnd.random() < 0.2, rnd.choice([0, 3.0]), rnd.choice([0, 2.0])))
+
+    def run():
+        return [road_costs.segment_avg_cost(x1, y1, x2, y2, terrain, veg, ignore_water=iw, ignore_trees=it,
+                                            rivers=rivers, fields=fields, water_buffer=wb, forest_buffer=fb)
+                for x1, y1, x2, y2, iw, it, wb, fb in segs]
+    ref, new, t_ref, t_new = _both(run)
+    return ref == new, f"segment costs: {t_ref:.3f} s reference, {t_new:.3f} s kernels"
+
+
+def check_erosion(seed: int, cells: int) -> tuple[bool, str]:
+    arr = np.random.default_rng(seed).integers(0, 256, (200, 231, 4), dtype=np.uint8)
+    arr[40:90, 50:120, :3] = postprocess.WATER
+    band = postprocess.boundary_band(arr)
+
+    def run():
+        eroded = postprocess._erosion_arr(arr.copy(), band, 0.6, np.random.default_rng(seed))
+        # radii past the block size and past the raster, too
+        return eroded.tobytes() + b"".join(postprocess._darkest_arr(arr, r).tobytes() for r in (0, 1, 2, 9, 150))
+    ref, new, t_ref, t_new = _both(run)
+    return ref == new, f"erosion: {t_ref:.3f} s reference, {t_new:.3f} s kernels"
+
+
+def check_potholes(seed: int, cells: int) -> tuple[bool, str]:
+    base = Image.new("RGBA", (400, 300), (0, 0, 0, 0))
+    d = ImageDraw.Draw(base)
+    rnd = random.Random(seed)
+    names = ["dark_asphalt", "medium_asphalt", "light_asphalt", "dirt"]
+    for _ in range(60):
+        x, y = rnd.randint(0, 400), rnd.randint(0, 300)
+        d.line([(x, y), (x + rnd.randint(-150, 150), y + rnd.randint(-150, 150))],
+               fill=base_colors.VANILLA[rnd.choice(names)][:3] + (255,), width=rnd.randint(3, 10))
+
+    def run():
+        # the global generator, as in road_generator: its state afterwards must match too
+        img = base.copy()
+        random.seed(seed)
+        road_post.apply_potholes_noise_jagged(img, density=0.3)
+        return img.tobytes(), random.random()
+    ref, new, t_ref, t_new = _both(run)
+    return ref == new, f"potholes: {t_ref:.3f} s reference, {t_new:.3f} s kernels"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the compiled kernels with the reference code")
+    parser.add_argument("--seeds", type=int, nargs="+", default=[1, 2, 3])
+    parser.add_argument("--cells", type=int, default=2, help="Cells per side of the rendered maps.")
+    args = parser.parse_args()
+
+    if jit.numba is None:
+        print("[ZOMBOID-MAP-GEN] numba not installed or disabled: kernels run as plain Python")
+    ok = True
+    for seed in args.seeds:
+        for check in (check_noise, check_segments, check_erosion, check_potholes, check_render):
+            same, msg = check(seed, args.cells)
+            ok &= same
+            print(f"[ZOMBOID-MAP-GEN] {'ok  ' if same else 'DIFF'} {msg}")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,367 @@
+# zomboid_map_gen/pipeline.py
+"""
+Streaming render + export: what core.generate_from_config runs.
+Run with:
+    python -m zomboid_map_gen.pipeline --config conf.json [--max-memory-mb N]
+
+Each layer is handed on the moment it is final, cut into row bands that
+flow through bounded queues into consumer threads:
+
+    terrain     -> terrain.png, terrain class areas, road cost rows
+    vegetation  -> vegetation.png, vegetation class areas, dense-forest rows
+    roads, lots -> roads.png / lots.png, opaque pixel counts
+    preview     -> bands composed on demand -> preview.png
+
+so PNG compression (png_stream; zlib releases the GIL), metrics and the
+road cost rasters run while the next layer renders, and the roads stage
+starts from ready-made CostFields. The preview is never held whole.
+
+A full queue blocks its feeder (backpressure): at most QUEUE_BANDS bands
+per consumer are in flight. Feeders cut each band from the finished layer
+as it is needed (one band copied at a time, never the whole layer), and
+the preview feeder composes its bands the same way.
+
+The layers themselves render exactly as before and in the same order
+(rivers need the whole terrain, roads need everything), so pixels and
+metrics match the serial path; only the work around them overlaps.
+With export.indexed_png the layer encoders run PIL's palette export in
+their thread instead of streaming.
+
+When the memory budget spills (budget.py), every layer moves to a raw
+file in the output dir (SpilledLayer) once no stage needs it whole:
+terrain after vegetation, the others as soon as they are rendered. Its
+bands are then read back from disk, so the roads stage and the preview
+run without finished layers in memory.
+
+Files are written as <name>.part.png and renamed once the whole run is
+through, so a failed or cancelled render (render_context) leaves the
+previous map in place instead of a mix of old and half-written layers.
+"""
+
+import argparse
+import os
+import queue
+import tempfile
+import threading
+import weakref
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from . import budget, config as cfg
+from .export import metrics, writer
+from .export.png_stream import PngStream
+from .roads import road_costs, road_generator, rivers as river_gen
+from .terrain import terrain_generator
+from .utils import colors as base_colors, render_context
+from .vegetation import vegetation_generator
+
+# rows per band handed to consumers (run() uses the budget plan's band rows)
+BAND_ROWS = 256
+# bands queued per consumer before its feeder waits
+QUEUE_BANDS = 4
+# seconds between cancel checks while waiting for the consumers
+JOIN_POLL_S = 0.1
+
+_DONE = object()
+
+
+class Consumer(threading.Thread):
+    """
+    Runs on_band(y0, band) for every band put in, then finish() once; once
+    `aborted` is set it only drains its queue and calls discard() instead.
+    """
+
+    def __init__(self, name: str, on_band=None, finish=None, discard=None, aborted=None):
+        super().__init__(name=name, daemon=True)
+        self.queue = queue.Queue(QUEUE_BANDS)
+        self.on_band, self.finish, self.discard = on_band, finish, discard
+        self.aborted = aborted or threading.Event()
+        self.result = None
+        self.error = None
+        self.start()
+
+    def run(self):
+        try:
+            while (item := self.queue.get()) is not _DONE:
+                if self.on_band is not None and not self.aborted.is_set():
+                    self.on_band(*item)
+            if not self.aborted.is_set():
+                self.result = self.finish() if self.finish is not None else None
+            elif self.discard is not None:
+                self.discard()
+        except BaseException as e:  # re-raised in wait()
+            self.error = e
+            if self.discard is not None:
+                self.discard()
+            # keep taking bands so a feeder never blocks on a dead consumer
+            while self.queue.get() is not _DONE:
+                pass
+
+    def wait(self):
+        self.join()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class Pipeline:
+    def __init__(self, band_rows: int = BAND_ROWS):
+        self.band_rows = band_rows
+        self.threads = []
+        self.consumers = []
+        self.staged = []  # (part file, final path), see stage()
+        self.aborted = threading.Event()
+
+    def consumer(self, name: str, on_band=None, finish=None, discard=None) -> Consumer:
+        c = Consumer(name, on_band, finish, discard, self.aborted)
+        c.fed = False
+        self.consumers.append(c)
+        return c
+
+    def stage(self, path) -> Path:
+        """File to write path's content to; it becomes path on commit()."""
+        path = Path(path)
+        part = path.with_name(f"{path.stem}.part{path.suffix}")
+        self.staged.append((part, path))
+        return part
+
+    def commit(self):
+        for part, path in self.staged:
+            os.replace(part, path)
+
+    def feed(self, height: int, band, consumers):
+        """
+        Put band(y0, y1) for every row band into each consumer, from a
+        feeder thread, then close them. band may be a finished array.
+        """
+        if isinstance(band, np.ndarray):
+            arr = band
+            band = lambda y0, y1: arr[y0:y1]
+
+        def run():
+            try:
+                for y0 in range(0, height, self.band_rows):
+                    if self.aborted.is_set():
+                        break
+                    rows = band(y0, min(height, y0 + self.band_rows))
+                    for c in consumers:
+                        c.queue.put((y0, rows))
+            finally:
+                for c in consumers:
+                    c.queue.put(_DONE)
+
+        for c in consumers:
+            c.fed = True
+        t = threading.Thread(target=run, daemon=True)
+        t.start()
+        self.threads.append(t)
+
+    def join(self):
+        """Wait for every feeder and consumer; a cancelled render stops waiting."""
+        for t in self.threads + self.consumers:
+            while t.is_alive():
+                render_context.check()
+                t.join(JOIN_POLL_S)
+        for c in self.consumers:
+            c.wait()
+
+    def abort(self):
+        """
+        After a failed or cancelled render: stop the feeders, release
+        consumers no feeder will ever close, and remove the staged files.
+        """
+        self.aborted.set()
+        for c in self.consumers:
+            if not c.fed:
+                c.fed = True
+                c.queue.put(_DONE)
+        for t in self.threads + self.consumers:
+            t.join()
+        for part, _ in self.staged:
+            part.unlink(missing_ok=True)
+
+
+class SpilledLayer:
+    """
+    A finished layer moved to a raw RGBA file in out_dir. It holds no
+    pixels; crop() reads the rows of a box back like the image's crop
+    (all the pipeline needs after a spill) and image() the whole layer.
+    The file is removed with the object.
+    """
+
+    def __init__(self, img, out_dir: Path, name: str, band_rows: int = BAND_ROWS):
+        self.width, self.height = self.size = img.size
+        fd, path = tempfile.mkstemp(prefix=f".{name}-", suffix=".rgba", dir=out_dir)
+        self.path = Path(path)
+        weakref.finalize(self, self.path.unlink, missing_ok=True)
+        band = _bands(img)
+        with os.fdopen(fd, "wb") as f:
+            for y0 in range(0, self.height, band_rows):
+                f.write(band(y0, min(self.height, y0 + band_rows)).tobytes())
+
+    def crop(self, box) -> Image.Image:
+        x0, y0, x1, y1 = box
+        row = self.width * 4
+        rows = np.fromfile(self.path, np.uint8, (y1 - y0) * row, offset=y0 * row)
+        rows = rows.reshape(y1 - y0, self.width, 4)[:, x0:x1]
+        return Image.fromarray(np.ascontiguousarray(rows), "RGBA")
+
+    def image(self) -> Image.Image:
+        return self.crop((0, 0, self.width, self.height))
+
+
+def _bands(img):
+    """band(y0, y1) of img as RGBA rows, copied out of the layer per band."""
+    w = img.width
+
+    def band(y0, y1):
+        rows = img.crop((0, y0, w, y1))
+        return np.asarray(rows if rows.mode == "RGBA" else rows.convert("RGBA"))
+    return band
+
+
+def _encoder(pipe, img, path, layer, exp):
+    """Consumer writing img to path: streamed, or PIL's palette export in the thread."""
+    part = pipe.stage(path)
+    if exp.get("indexed_png", False) and layer in writer.palette.PALETTES:
+        whole = img.image if isinstance(img, SpilledLayer) else lambda: img
+        return pipe.consumer(f"{layer} png", finish=lambda: writer._save_layer(whole(), part, layer, exp, path.name))
+    w, h = img.size
+    png = PngStream(part, w, h)
+    return pipe.consumer(f"{layer} png", lambda y0, rows: png.write(rows), png.close, png.discard)
+
+
+def _areas(pipe, layer, palette):
+    areas = metrics.ClassAreas(palette)
+    return pipe.consumer(f"{layer} areas", lambda y0, rows: areas.add(rows), areas.result)
+
+
+def _opaque(pipe, layer):
+    total = [0]
+
+    def add(y0, rows):
+        total[0] += int(np.count_nonzero(rows[..., 3]))
+    return pipe.consumer(f"{layer} pixels", add, lambda: total[0])
+
+
+def _rows_into(pipe, name, out, fn):
+    def add(y0, rows):
+        out[y0:y0 + rows.shape[0]] = fn(rows)
+    return pipe.consumer(name, add, lambda: out)
+
+
+def run(conf: dict, max_memory_mb: int | None = None):
+    """
+    Render and write the map; returns (terrain, vegetation, roads, lots),
+    as SpilledLayers if the plan spilled.
+    """
+    out_dir = Path(conf.get("output_dir", "output"))
+    out_dir.mkdir(parents=True, exist_ok=True)
+    exp = conf.get("export", {})
+
+    plan = budget.plan(conf, max_memory_mb)
+    print(budget.preflight_report(conf, plan))
+
+    # consumer bands as high as the plan's noise bands (budget.py counts them)
+    pipe = Pipeline(plan["band_rows"])
+
+    def spilled(img, name):
+        # the layer's pixels move to disk; feeders still holding it drop it when done
+        return SpilledLayer(img, out_dir, name, pipe.band_rows) if plan["spill"] and img is not None else img
+
+    stats = {}
+    counted = {}
+    reports = {}
+    terrain_img = veg_img = roads_img = lots_img = rivers = None
+    cost_rows = dense = None
+    try:
+        with budget.applied(plan):
+            if conf.get("terrain", {}).get("enabled", True):
+                terrain_img = terrain_generator.generate(conf)
+                rivers = river_gen.generate_rivers(conf, terrain_img)
+                if rivers is not None:
+                    terrain_img = rivers.carve(terrain_img)
+                cost_rows = np.empty(terrain_img.size[::-1], dtype=np.uint8)
+                t_png = _encoder(pipe, terrain_img, out_dir / "terrain.png", "terrain", exp)
+                t_areas = _areas(pipe, "terrain", base_colors.VANILLA)
+                t_costs = _rows_into(pipe, "terrain costs", cost_rows, road_costs.terrain_rows)
+                pipe.feed(terrain_img.height, _bands(terrain_img), [t_png, t_areas, t_costs])
+
+            if conf.get("vegetation", {}).get("enabled", True):
+                veg_img = spilled(vegetation_generator.generate(conf, terrain_img), "vegetation")
+                dense = np.empty(veg_img.size[::-1], dtype=bool)
+                v_png = _encoder(pipe, veg_img, out_dir / "vegetation.png", "vegetation", exp)
+                v_areas = _areas(pipe, "vegetation", base_colors.VEG)
+                v_dense = _rows_into(pipe, "dense forest", dense, road_costs.dense_rows)
+                pipe.feed(veg_img.height, _bands(veg_img), [v_png, v_areas, v_dense])
+            # roads only look at the cost rows, so no stage needs the terrain whole any more
+            terrain_img = spilled(terrain_img, "terrain")
+
+            if conf.get("roads", {}).get("enabled", True):
+                fields = None
+                if terrain_img is not None:
+                    t_costs.wait()
+                    if veg_img is not None:
+                        v_dense.wait()
+                    fields = road_costs.CostFields.from_arrays(cost_rows, dense if veg_img is not None else None,
+                                                               rivers)
+                roads_img, lots_img = road_generator.generate(conf, terrain_img, veg_img, rivers=rivers,
+                                                              stats=stats, fields=fields)
+                roads_img, lots_img = spilled(roads_img, "roads"), spilled(lots_img, "lots")
+                for layer, img, name in (("roads", roads_img, "roads.png"), ("lots", lots_img, "lots.png")):
+                    consumers = [_encoder(pipe, img, out_dir / name, layer, exp), _opaque(pipe, layer)]
+                    pipe.feed(img.height, _bands(img), consumers)
+
+            if terrain_img is not None:
+                w, h = terrain_img.size
+                layers = (terrain_img, veg_img, roads_img)
+                preview = PngStream(pipe.stage(out_dir / "preview.png"), w, h)
+
+                def compose(y0, y1):
+                    box = (0, y0, w, y1)
+                    return np.asarray(writer.compose_preview(*(img.crop(box) if img else None for img in layers)))
+                pipe.feed(h, compose, [pipe.consumer("preview png", lambda y0, rows: preview.write(rows),
+                                                     preview.close, preview.discard)])
+        pipe.join()
+    except BaseException:
+        pipe.abort()
+        raise
+    pipe.commit()
+
+    for c in pipe.consumers:
+        layer, _, kind = c.name.partition(" ")
+        if kind in ("areas", "pixels"):
+            counted[layer] = c.result
+        elif kind == "png" and isinstance(c.result, dict):
+            reports[layer] = c.result
+
+    report = metrics.compute(terrain_img, veg_img, roads_img, lots_img, road_stats=stats, counted=counted)
+    if reports:
+        report["palette"] = reports
+    writer.save_metrics(conf, report)
+    if "town" in stats:
+        writer.save_lots(conf, stats["town"])
+    return terrain_img, veg_img, roads_img, lots_img
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render a map with streamed export")
+    parser.add_argument("--config", type=str, help="Path to config file (JSON).")
+    parser.add_argument("--max-memory-mb", type=int, default=None,
+                        help="Memory cap in MB (default: the config's max_memory_mb, 0 = unlimited).")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Worker processes for noise sampling (default: the config's workers, 1).")
+    args = parser.parse_args()
+
+    conf = cfg.load_config(args.config) if args.config else cfg.default_config()
+    if args.workers:
+        conf["workers"] = args.workers
+    budget.pin_mmap_threshold()
+    run(conf, args.max_memory_mb)
+    print("[ZOMBOID-MAP-GEN] Generation complete.")
+
+
+if __name__ == "__main__":
+    main()
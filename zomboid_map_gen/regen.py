@@ -0,0 +1,326 @@
+# zomboid_map_gen/regen.py
+"""
+Regenerate part of a saved map: a rectangle, one cell, or a mask image.
+Run with:
+    python -m zomboid_map_gen.regen --config conf.json --cell 2 1 --reroll
+    python -m zomboid_map_gen.regen --config conf.json --rect 300 0 450 300 --set terrain.scale=80
+    python -m zomboid_map_gen.regen --config conf.json --mask fix.png --layers terrain
+
+The region is rendered again with a re-rolled seed and/or changed params
+(the noise frame stays the map's, see canvas.frame) and written over the
+saved layers; pixels outside the region are untouched. Work is bounded by
+the region's bounding box: the windowed renderers, one box-blur for the
+feathering and a road walk inside the box.
+
+Seams: terrain / vegetation fade from old to new over `blend` px inside
+the region. The fade is a smooth noise dither (new where the distance
+weight beats the noise), so the palettes stay exact and the transition
+follows blobs instead of a straight line. Roads (rectangles only) are
+replaced outright; old roads crossing the border are walked on inside.
+
+Terrain is re-rendered like a map tile (terrain_generator.render_window):
+rivers need the whole map's drainage and whole-canvas postprocess passes
+the whole canvas, so neither is redone. A river crossing a regenerated
+terrain region is cut at the region (the fade only softens the ends);
+regenerate the full map, or leave terrain out of the layers, to keep it.
+"""
+
+import argparse
+import copy
+import json
+import random
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+from . import config as cfg
+from .terrain import terrain_generator
+from .vegetation import vegetation_generator
+from .roads import road_generator, blocks
+from .utils import noise_utils, seeds as seed_utils
+from .export import writer, metrics
+from . import extend
+
+LAYERS = ("terrain", "vegetation", "roads")
+DEFAULT_LAYERS = ("terrain", "vegetation")
+DEFAULT_BLEND = 16
+
+
+def apply_overrides(conf: dict, overrides: dict) -> dict:
+    """Copy of conf with {"dotted.key": value} overrides set."""
+    out = copy.deepcopy(conf)
+    for key, value in overrides.items():
+        node = out
+        *path, last = key.split(".")
+        for part in path:
+            node = node.setdefault(part, {})
+        node[last] = value
+    return out
+
+
+def cell_rect(conf: dict, cx: int, cy: int) -> tuple[int, int, int, int]:
+    """(x, y, w, h) canvas px of cell (cx, cy)."""
+    size = conf.get("canvas", {}).get("cell_size", 300)
+    return cx * size, cy * size, size, size
+
+
+def _box_blur(a: np.ndarray, r: int) -> np.ndarray:
+    """Mean over a (2r+1)^2 box, edges clamped; two cumulative sums."""
+    if r <= 0:
+        return a.astype(np.float32)
+    out = a.astype(np.float32)
+    for axis in (0, 1):
+        pad = [(0, 0), (0, 0)]
+        pad[axis] = (r + 1, r)
+        c = np.cumsum(np.pad(out, pad, mode="edge"), axis=axis, dtype=np.float64)
+        n = out.shape[axis]
+        hi = np.take(c, np.arange(2 * r + 1, 2 * r + 1 + n), axis=axis)
+        lo = np.take(c, np.arange(0, n), axis=axis)
+        out = ((hi - lo) / (2 * r + 1)).astype(np.float32)
+    return out
+
+
+def blend_selection(mask: np.ndarray, blend: int, origin=(0, 0), seed: int = 0) -> np.ndarray:
+    """
+    Where the new render replaces the old one: inside `mask`, with a dithered
+    fade over `blend` px from its border. origin = canvas px of mask[0, 0],
+    so the dither noise lines up between calls.
+    """
+    if blend <= 0:
+        return mask.copy()
+    # outside the mask counts as old: pad so the box edges see it
+    m = np.pad(mask, blend + 1).astype(np.float32)
+    w = _box_blur(m, blend)[blend + 1:-blend - 1, blend + 1:-blend - 1]
+    # 0.5 on the border -> 0, fully inside -> 1
+    w = np.clip(w * 2.0 - 1.0, 0.0, 1.0)
+    h, wd = mask.shape
+    params = {"scale": max(2.0, blend / 2.0), "octaves": 2, "persistence": 0.5,
+              "lacunarity": 2.0, "seed": seed}
+    n = noise_utils.sample_field(origin[0], origin[1], wd, h, params, -0.7, 1.4)
+    return mask & (w > np.clip(n, 0.02, 0.98))
+
+
+def region(conf: dict, size, rect=None, cell=None, mask_img=None):
+    """
+    (x0, y0, mask) for the region: mask is a bool array over its bounding
+    box, whose top-left is canvas px (x0, y0).
+    """
+    w, h = size
+    if mask_img is not None:
+        full = np.asarray(mask_img.convert("L")) > 0
+        if full.shape != (h, w):
+            raise ValueError(f"mask is {full.shape[1]}x{full.shape[0]}, map is {w}x{h}")
+        ys = np.flatnonzero(full.any(axis=1))
+        xs = np.flatnonzero(full.any(axis=0))
+        if not ys.size:
+            raise ValueError("mask selects nothing")
+        return int(xs[0]), int(ys[0]), full[ys[0]:ys[-1] + 1, xs[0]:xs[-1] + 1]
+    if cell is not None:
+        rect = cell_rect(conf, *cell)
+    if rect is None:
+        raise ValueError("give a rect, a cell or a mask")
+    x, y, rw, rh = rect
+    x0, y0 = max(0, x), max(0, y)
+    x1, y1 = min(w, x + rw), min(h, y + rh)
+    if x1 <= x0 or y1 <= y0:
+        raise ValueError("region is outside the map")
+    return x0, y0, np.ones((y1 - y0, x1 - x0), dtype=bool)
+
+
+def _border_starts(roads, x0, y0, w, h) -> list:
+    """Road walk starts (region px) for old roads running into the box."""
+    depth = road_generator.EXIT_PROBE + 1
+    W, H = roads.size
+    starts = []
+    if x0 > 0:
+        edge = roads.crop((max(0, x0 - depth), y0, x0, y0 + h))
+        starts += [(0, p, a, t) for p, a, t in road_generator.road_exits(edge, "right")]
+    if x0 + w < W:
+        edge = roads.crop((x0 + w, y0, min(W, x0 + w + depth), y0 + h))
+        starts += [(w - 1, p, a, t) for p, a, t in road_generator.road_exits(edge, "left")]
+    if y0 > 0:
+        edge = roads.crop((x0, max(0, y0 - depth), x0 + w, y0))
+        starts += [(p, 0, a, t) for p, a, t in road_generator.road_exits(edge, "bottom")]
+    if y0 + h < H:
+        edge = roads.crop((x0, y0 + h, x0 + w, min(H, y0 + h + depth)))
+        starts += [(p, h - 1, a, t) for p, a, t in road_generator.road_exits(edge, "top")]
+    return starts
+
+
+def _paste_where(dst, src, sel, x0, y0):
+    """Write src into dst at (x0, y0) only where sel is set."""
+    h, w = sel.shape
+    box = (x0, y0, x0 + w, y0 + h)
+    merged = np.array(dst.crop(box))
+    merged[sel] = np.asarray(src)[sel]
+    dst.paste(Image.fromarray(merged, "RGBA"), box)
+
+
+def regenerate(conf: dict, overrides: dict | None = None, rect=None, cell=None, mask_img=None,
+               layers=DEFAULT_LAYERS, blend: int = DEFAULT_BLEND, saved=None, stats=None):
+    """
+    Re-render a region of the map of `conf` with `overrides` applied
+    ({"seed": ...}, {"terrain.scale": ...}), in place on the saved layers
+    (terrain, vegetation, roads, lots; loaded from the output dir if not
+    given). Returns the layers. stats, if given, gets the road stats of
+    the region, its town lots in canvas px, "region" (x0, y0, x1, y1) and
+    "replaced" ({"roads" / "lots": share of the old layer's pixels that
+    were inside the region}, for save()).
+    """
+    saved = list(saved) if saved is not None else extend.load_layers(conf)
+    if saved[0] is None:
+        raise ValueError("regenerate needs the saved terrain layer")
+    unknown = set(layers) - set(LAYERS)
+    if unknown:
+        raise ValueError(f"unknown layers: {sorted(unknown)}")
+    if "roads" in layers and mask_img is not None:
+        raise ValueError("roads can only be regenerated for a rect or cell")
+
+    x0, y0, mask = region(conf, saved[0].size, rect, cell, mask_img)
+    h, w = mask.shape
+    new_conf = apply_overrides(conf, overrides or {})
+    # same noise frame (and saved ranges) as the map, so untouched params line up
+    new_conf.setdefault("canvas", {})["frame"] = list(terrain_generator._frame_size(conf))
+    noise_utils.remember_ranges(conf.get("canvas", {}).get("frame_ranges", ()))
+
+    terrain, veg, roads, lots = saved
+    sel = blend_selection(mask, blend, (x0, y0), seed_utils.derive_seed(new_conf.get("seed", 0), "regen"))
+    box = (x0, y0, x0 + w, y0 + h)
+
+    if "terrain" in layers:
+        _paste_where(terrain, terrain_generator.render_window(new_conf, x0, y0, w, h), sel, x0, y0)
+    terrain_box = terrain.crop(box)
+    veg_box = veg.crop(box) if veg is not None else None
+    if "vegetation" in layers and veg is not None:
+        veg_box = vegetation_generator.render_window(new_conf, x0, y0, w, h, terrain_img=terrain_box)
+        _paste_where(veg, veg_box, sel, x0, y0)
+        veg_box = veg.crop(box)
+    if "roads" in layers and roads is not None:
+        starts = _border_starts(roads, x0, y0, w, h)
+        road_stats = stats if stats is not None else {}
+        # only roads coming in from outside: fresh ones would dead-end at the box
+        new_roads, new_lots = road_generator.generate(
+            new_conf, terrain_box, veg_box, starts=starts, density=0, stats=road_stats)
+        road_stats["replaced"] = {"roads": _share_inside(roads, box)}
+        roads.paste(new_roads, box)
+        if lots is not None:
+            road_stats["replaced"]["lots"] = _share_inside(lots, box)
+            lots.paste(new_lots, box)
+        if "town" in road_stats:
+            road_stats["town"] = blocks.offset_town(road_stats["town"], x0, y0)
+        road_stats["region"] = box
+    return terrain, veg, roads, lots
+
+
+def _share_inside(img, box) -> float:
+    """Share of img's opaque pixels that lie inside box."""
+    alpha = np.asarray(img.getchannel("A"))
+    total = np.count_nonzero(alpha)
+    return float(np.count_nonzero(alpha[box[1]:box[3], box[0]:box[2]]) / total) if total else 0.0
+
+
+def _regen_figures(old: dict, stats: dict) -> dict:
+    """
+    Road / lot figures of the whole map after its roads were regenerated in
+    a region: the old map's, less the share of the old layer that lay in
+    the region (road lengths and lot counts only exist as totals, so the
+    pixel share stands in for them), plus what the region generated. The
+    network section stays the map's: the region only rewires its inside.
+    """
+    keep = {name: 1.0 - share for name, share in stats.get("replaced", {}).items()}
+    old_roads, old_lots = old.get("roads", {}), old.get("lots", {})
+    lengths = {name: v * keep.get("roads", 1.0) for name, v in old_roads.get("length_px", {}).items()}
+    for name, v in stats.get("road_length", {}).items():
+        lengths[name] = lengths.get(name, 0.0) + v
+    roads = {"length_px": {name: round(v, 1) for name, v in lengths.items()},
+             "total_length_px": round(sum(lengths.values()), 1)}
+    if "network" in old_roads:
+        roads["network"] = old_roads["network"]
+    lots = {}
+    if "count" in old_lots:
+        lots["count"] = round(old_lots["count"] * keep.get("lots", 1.0)) + len(stats.get("lots", ()))
+    return {"roads": roads, "lots": lots}
+
+
+def _outside(lot, box) -> bool:
+    xs = [p[0] for p in lot["polygon"]]
+    ys = [p[1] for p in lot["polygon"]]
+    return max(xs) <= box[0] or min(xs) >= box[2] or max(ys) <= box[1] or min(ys) >= box[3]
+
+
+def save(conf: dict, layers, roads_changed: bool = False, stats: dict | None = None):
+    """
+    Write the layers back and refresh metrics. Road lengths and lot counts
+    come from the polylines at generation time, so they are carried over
+    from the old metrics; if the roads were regenerated, updated with the
+    region's stats (see _regen_figures). With the stats regenerate() filled
+    in, the saved town lots inside the region are replaced by the new ones.
+    """
+    old = writer.load_metrics(conf)
+    palette_report = writer.save_all(conf, *layers)
+    report = metrics.compute(*layers)
+    if palette_report:
+        report["palette"] = palette_report
+    carried = _regen_figures(old, stats or {}) if roads_changed else old
+    for section, keys in (("roads", ("length_px", "total_length_px", "network")),
+                          ("lots", ("count",))):
+        if section in report:
+            report[section].update({k: v for k, v in carried.get(section, {}).items() if k in keys})
+    if roads_changed and stats and "town" in stats:
+        old_town = writer.load_lots(conf)
+        kept = [lot for lot in old_town["lots"] if _outside(lot, stats["region"])]
+        town = blocks.merge_towns({"blocks": old_town["blocks"], "lots": kept}, stats["town"])
+        if "lots" in report:
+            report["lots"].update(town_blocks=town["blocks"], town_lots=len(town["lots"]))
+        writer.save_lots(conf, town)
+    writer.save_metrics(conf, report)
+
+
+def _parse_overrides(pairs) -> dict:
+    out = {}
+    for pair in pairs or ():
+        key, _, raw = pair.partition("=")
+        try:
+            out[key] = json.loads(raw)
+        except ValueError:
+            out[key] = raw
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate a region of a saved map")
+    parser.add_argument("--config", type=str, help="Config the map was generated with (JSON).")
+    where = parser.add_mutually_exclusive_group(required=True)
+    where.add_argument("--rect", type=int, nargs=4, metavar=("X", "Y", "W", "H"))
+    where.add_argument("--cell", type=int, nargs=2, metavar=("CX", "CY"))
+    where.add_argument("--mask", type=str, help="Image the size of the map, non-black = regenerate.")
+    parser.add_argument("--reroll", action="store_true", help="Pick a new random seed for the region.")
+    parser.add_argument("--seed", type=int, default=None, help="Seed for the region.")
+    parser.add_argument("--set", action="append", metavar="KEY=VALUE",
+                        help="Param override, e.g. terrain.scale=80 (repeatable).")
+    parser.add_argument("--layers", nargs="+", choices=LAYERS, default=list(DEFAULT_LAYERS),
+                        help="Layers to regenerate. Terrain is re-rendered without rivers or "
+                             "whole-canvas postprocess passes, so rivers through the region are cut.")
+    parser.add_argument("--blend", type=int, default=DEFAULT_BLEND, help="Seam fade width (px).")
+    args = parser.parse_args()
+
+    conf = cfg.load_config(args.config) if args.config else cfg.default_config()
+    overrides = _parse_overrides(args.set)
+    if args.seed is not None:
+        overrides["seed"] = args.seed
+    elif args.reroll:
+        overrides["seed"] = random.randrange(1 << 31)
+    mask_img = Image.open(args.mask) if args.mask else None
+
+    stats = {}
+    layers = regenerate(conf, overrides, rect=args.rect, cell=args.cell, mask_img=mask_img,
+                        layers=args.layers, blend=args.blend, stats=stats)
+    save(conf, layers, roads_changed="roads" in args.layers, stats=stats)
+    seed = f" with seed {overrides['seed']}" if "seed" in overrides else ""
+    print(f"[ZOMBOID-MAP-GEN] Regenerated {', '.join(args.layers)}{seed} in "
+          f"{Path(conf.get('output_dir', 'output'))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,278 @@
+# zomboid_map_gen/roads/blocks.py
+"""
+Town blocks and lots from the road network.
+
+1. Planar graph: road polylines are split wherever they cross or a road
+   end touches another road (segment pairs come from a uniform grid, so
+   this is near-linear in the number of segments), and endpoints closer
+   than `snap` px become one vertex. Dangling roads are peeled off.
+2. Faces: every half-edge u->v continues with the next edge clockwise
+   around v, so walking half-edges traces each face once (O(E log degree)).
+   Bounded faces come out with positive area; the outer face of every
+   connected piece is negative and skipped. Faces between block_min_area
+   and block_max_area are town blocks.
+3. Lots: each block is split recursively across the long side of its
+   (approximate) minimum bounding rectangle until the pieces reach the
+   target lot area. A split is only kept if both halves still touch a road
+   (frontage), so every lot faces a street. Work per block is its vertex
+   count times the number of lots.
+
+Polygons are lists of (x, y) in image px.
+"""
+
+import math
+from collections import defaultdict
+
+from PIL import ImageDraw
+
+from .network import GRID
+
+LOT_COLOR = (255, 0, 0, 255)
+
+# tries per piece before giving up on a frontage-keeping split
+_SPLIT_TRIES = 4
+_MAX_DEPTH = 24
+
+
+def _seg_splits(a, b, c, d, tol):
+    """
+    Where segments ab and cd meet, as (t, point) splits of ab and (u, point)
+    splits of cd: an endpoint of one within tol of the other (the endpoint
+    itself becomes the shared vertex), else a proper crossing.
+    """
+    out_t, out_u = [], []
+    for p, (e0, e1), out in ((c, (a, b), out_t), (d, (a, b), out_t), (a, (c, d), out_u), (b, (c, d), out_u)):
+        ex, ey = e1[0] - e0[0], e1[1] - e0[1]
+        len2 = ex * ex + ey * ey
+        if len2 == 0:
+            continue
+        t = max(0.0, min(1.0, ((p[0] - e0[0]) * ex + (p[1] - e0[1]) * ey) / len2))
+        if math.hypot(e0[0] + t * ex - p[0], e0[1] + t * ey - p[1]) <= tol:
+            out.append((t, p))
+    if out_t or out_u:
+        return out_t, out_u
+    rx, ry = b[0] - a[0], b[1] - a[1]
+    sx, sy = d[0] - c[0], d[1] - c[1]
+    den = rx * sy - ry * sx
+    if den != 0:
+        t = ((c[0] - a[0]) * sy - (c[1] - a[1]) * sx) / den
+        u = ((c[0] - a[0]) * ry - (c[1] - a[1]) * rx) / den
+        if 0.0 <= t <= 1.0 and 0.0 <= u <= 1.0:
+            x = (a[0] + rx * t, a[1] + ry * t)
+            out_t.append((t, x))
+            out_u.append((u, x))
+    return out_t, out_u
+
+
+def planar_graph(roads, snap: float = 2.0):
+    """
+    (points, adjacency) of the road network: points[i] = (x, y),
+    adjacency[i] = set of neighbor ids. roads: [(road_type, points)].
+    """
+    segs = [(a, b) for _, pts in roads for a, b in zip(pts, pts[1:]) if a != b]
+    splits = [[(0.0, a), (1.0, b)] for a, b in segs]
+
+    grid = defaultdict(list)
+    for i, (a, b) in enumerate(segs):
+        gx0, gx1 = int((min(a[0], b[0]) - snap) // GRID), int((max(a[0], b[0]) + snap) // GRID)
+        gy0, gy1 = int((min(a[1], b[1]) - snap) // GRID), int((max(a[1], b[1]) + snap) // GRID)
+        for gy in range(gy0, gy1 + 1):
+            for gx in range(gx0, gx1 + 1):
+                grid[gx, gy].append(i)
+    seen = set()
+    for bucket in grid.values():
+        for k, i in enumerate(bucket):
+            for j in bucket[k + 1:]:
+                if (i, j) in seen:
+                    continue
+                seen.add((i, j))
+                ts, us = _seg_splits(*segs[i], *segs[j], snap)
+                splits[i] += ts
+                splits[j] += us
+
+    ids = {}
+    points = []
+    adjacency = defaultdict(set)
+
+    def vertex(x, y):
+        key = (round(x / snap), round(y / snap))
+        v = ids.get(key)
+        if v is None:
+            v = ids[key] = len(points)
+            points.append((x, y))
+        return v
+
+    for ts in splits:
+        prev = None
+        for _, p in sorted(ts):
+            v = vertex(*p)
+            if prev is not None and v != prev:
+                adjacency[prev].add(v)
+                adjacency[v].add(prev)
+            prev = v
+
+    # dangling ends never bound a face
+    stack = [v for v, nbrs in adjacency.items() if len(nbrs) < 2]
+    while stack:
+        v = stack.pop()
+        for n in adjacency.pop(v, ()):
+            nbrs = adjacency.get(n)
+            if nbrs is not None:
+                nbrs.discard(v)
+                if len(nbrs) == 1:
+                    stack.append(n)
+    return points, adjacency
+
+
+def polygon_area(poly) -> float:
+    """Signed shoelace area."""
+    return 0.5 * sum(x0 * y1 - x1 * y0 for (x0, y0), (x1, y1) in zip(poly, poly[1:] + poly[:1]))
+
+
+def faces(points, adjacency) -> list:
+    """Bounded faces of the planar graph as polygons (positive area)."""
+    order = {}
+    for v, nbrs in adjacency.items():
+        x, y = points[v]
+        ring = sorted(nbrs, key=lambda n: math.atan2(points[n][1] - y, points[n][0] - x))
+        order[v] = ring
+    pos = {(v, n): i for v, ring in order.items() for i, n in enumerate(ring)}
+
+    out = []
+    used = set()
+    for start in pos:
+        if start in used:
+            continue
+        poly = []
+        u, v = start
+        while (u, v) not in used:
+            used.add((u, v))
+            poly.append(points[u])
+            ring = order[v]
+            w = ring[(pos[v, u] - 1) % len(ring)]
+            u, v = v, w
+        if len(poly) >= 3 and polygon_area(poly) > 0:
+            out.append(poly)
+    return out
+
+
+def _clip(poly, front, nx, ny, c, keep_above):
+    """
+    Half of (poly, front flags) on one side of the line n.p = c. front[i]
+    flags edge i (poly[i] -> poly[i+1]) as road frontage; the new edge along
+    the cut is not.
+    """
+    out, out_front = [], []
+    n = len(poly)
+    for i in range(n):
+        p, q = poly[i], poly[(i + 1) % n]
+        dp = (p[0] * nx + p[1] * ny - c) * (1 if keep_above else -1)
+        dq = (q[0] * nx + q[1] * ny - c) * (1 if keep_above else -1)
+        if dp >= 0:
+            out.append(p)
+            out_front.append(front[i])
+        if (dp >= 0) != (dq >= 0):
+            t = dp / (dp - dq)
+            out.append((p[0] + (q[0] - p[0]) * t, p[1] + (q[1] - p[1]) * t))
+            # leaving: the cut edge follows; entering: the rest of edge i follows
+            out_front.append(False if dp >= 0 else front[i])
+    return out, out_front
+
+
+def _frontage(poly, front) -> float:
+    n = len(poly)
+    return sum(math.dist(poly[i], poly[(i + 1) % n]) for i in range(n) if front[i])
+
+
+def _long_axis(poly):
+    """
+    Unit direction of the long side of the smallest-area bounding box among
+    boxes aligned to the polygon's edges, and the box's (long, short) extents.
+    """
+    n = len(poly)
+    edges = sorted(range(n), key=lambda i: -math.dist(poly[i], poly[(i + 1) % n]))[:16]
+    best = None
+    for i in edges:
+        (x0, y0), (x1, y1) = poly[i], poly[(i + 1) % n]
+        length = math.hypot(x1 - x0, y1 - y0)
+        if length == 0:
+            continue
+        ux, uy = (x1 - x0) / length, (y1 - y0) / length
+        along = [x * ux + y * uy for x, y in poly]
+        across = [-x * uy + y * ux for x, y in poly]
+        a, b = max(along) - min(along), max(across) - min(across)
+        if best is None or a * b < best[0]:
+            best = (a * b, (ux, uy), a, b) if a >= b else (a * b, (-uy, ux), b, a)
+    if best is None:
+        return (1.0, 0.0), 0.0, 0.0
+    return best[1], best[2], best[3]
+
+
+def subdivide(poly, lot_area: float, min_width: float, rnd, front=None, depth=0) -> list:
+    """
+    Lots [(polygon, frontage px)] of a block: recursive cuts across the
+    long side of the bounding box, near the middle, keeping frontage.
+    """
+    front = front if front is not None else [True] * len(poly)
+    if depth >= _MAX_DEPTH or len(poly) < 3:
+        return [(poly, _frontage(poly, front))]
+    area = abs(polygon_area(poly))
+    (ux, uy), long, short = _long_axis(poly)
+    if area <= lot_area * 1.5 or long < 2 * min_width:
+        return [(poly, _frontage(poly, front))]
+
+    along = [x * ux + y * uy for x, y in poly]
+    lo, hi = min(along), max(along)
+    for _ in range(_SPLIT_TRIES):
+        cut = lo + (hi - lo) * rnd.uniform(0.4, 0.6)
+        halves = [_clip(poly, front, ux, uy, cut, side) for side in (True, False)]
+        if all(len(p) >= 3 and _frontage(p, f) >= min_width for p, f in halves):
+            return [lot for p, f in halves for lot in subdivide(p, lot_area, min_width, rnd, f, depth + 1)]
+    return [(poly, _frontage(poly, front))]
+
+
+def town_lots(roads, rnd, block_min_area: float, block_max_area: float,
+              lot_area: float, min_width: float, snap: float = 2.0):
+    """
+    (blocks, lots) for the road network: blocks are face polygons within the
+    area limits, lots are (block index, polygon, frontage px).
+    """
+    points, adjacency = planar_graph(roads, snap)
+    blocks = [f for f in faces(points, adjacency) if block_min_area <= polygon_area(f) <= block_max_area]
+    lots = []
+    for b, poly in enumerate(blocks):
+        for lot, frontage in subdivide(poly, lot_area, min_width, rnd):
+            if abs(polygon_area(lot)) >= 1:
+                lots.append((b, lot, frontage))
+    return blocks, lots
+
+
+def draw_lots(lots_img, lots, roads_img=None):
+    """Fill lots with a transparent outline each; road pixels are cleared."""
+    d = ImageDraw.Draw(lots_img)
+    for _, poly, _ in lots:
+        d.polygon(poly, fill=LOT_COLOR, outline=(0, 0, 0, 0))
+    if roads_img is not None:
+        clear = roads_img.getchannel("A").point(lambda a: 255 if a else 0)
+        lots_img.paste((0, 0, 0, 0), (0, 0), clear)
+    return lots_img
+
+
+def offset_town(town: dict, dx: float, dy: float, first_block: int = 0) -> dict:
+    """A stats["town"] dict moved by (dx, dy), block ids numbered from first_block."""
+    return {
+        "blocks": town.get("blocks", 0),
+        "lots": [{**lot, "block": lot["block"] + first_block,
+                  "polygon": [[x + dx, y + dy] for x, y in lot["polygon"]]}
+                 for lot in town.get("lots", ())],
+    }
+
+
+def merge_towns(*towns) -> dict:
+    """One town list from several, block ids renumbered to stay distinct."""
+    out = {"blocks": 0, "lots": []}
+    for town in towns:
+        moved = offset_town(town, 0, 0, out["blocks"])
+        out["blocks"] += moved["blocks"]
+        out["lots"] += moved["lots"]
+    return out
@@ -1,10 +1,156 @@
 # zomboid_map_gen/roads/dirt_paths.py
 """
-Optional dirt path generation.
+Dirt path network.
+
+Endpoints are parking lots, dead-end roads and random rural points. They are
+linked by a minimum spanning tree over a sparse k-nearest-neighbor graph
+(uniform bucket grid, no all-pairs distances), so thousands of endpoints
+stay cheap. Each tree edge is routed as the cheapest of a straight or
+L-shaped path over the road cost field and drawn in dirt / gravel dirt.
 """
 
-from PIL import Image
+import math
+from collections import defaultdict
+
+from PIL import Image, ImageDraw
+
+from ..utils import colors as base_colors, render_context
+from ..utils.disjoint_set import DisjointSet
+from . import road_costs
+
+PATH_COLORS = [
+    base_colors.VANILLA["dirt"],
+    base_colors.VANILLA["gravel_dirt"],
+]
+
+
+def _knn_edges(points, k):
+    """
+    (dist², i, j) edges from every point to its k nearest neighbors.
+    Points are bucketed on a grid sized for a few points per bucket, and
+    rings of buckets are scanned outward only until the k-th neighbor is
+    provably closer than anything in the next ring.
+    """
+    n = len(points)
+    minx = min(p[0] for p in points)
+    miny = min(p[1] for p in points)
+    maxx = max(p[0] for p in points)
+    maxy = max(p[1] for p in points)
+    area = max(1.0, (maxx - minx) * (maxy - miny))
+    cell = max(1.0, math.sqrt(area / n) * 1.5)
+
+    buckets = defaultdict(list)
+    keys = []
+    for i, (x, y) in enumerate(points):
+        key = (int((x - minx) // cell), int((y - miny) // cell))
+        buckets[key].append(i)
+        keys.append(key)
+    max_ring = max(int((maxx - minx) // cell), int((maxy - miny) // cell)) + 1
+
+    edges = set()
+    for i, (x, y) in enumerate(points):
+        bx, by = keys[i]
+        found = []
+        r = 0
+        while r <= max_ring:
+            for dy in range(-r, r + 1):
+                for dx in range(-r, r + 1):
+                    if max(abs(dx), abs(dy)) != r:
+                        continue
+                    for j in buckets.get((bx + dx, by + dy), ()):
+                        if j != i:
+                            px, py = points[j]
+                            found.append(((px - x) ** 2 + (py - y) ** 2, j))
+            if len(found) >= k:
+                found.sort()
+                # anything beyond ring r is at least r * cell away
+                if found[k - 1][0] <= (r * cell) ** 2:
+                    break
+            r += 1
+        found.sort()
+        for d2, j in found[:k]:
+            edges.add((d2, min(i, j), max(i, j)))
+    return edges
+
+
+def _spanning_tree(points, k):
+    """Kruskal over the kNN graph (a forest if the graph is disconnected)."""
+    ds = DisjointSet(len(points))
+    tree = []
+    for d2, i, j in sorted(_knn_edges(points, k)):
+        if ds.union(i, j):
+            tree.append((i, j, d2))
+    return tree
+
+
+def _route(a, b, terrain_img, veg_img, rivers, fields=None):
+    """Cheapest of straight / L-shaped routes between a and b: (cost, points)."""
+    (ax, ay), (bx, by) = a, b
+    options = [
+        [a, b],
+        [a, (bx, ay), b],
+        [a, (ax, by), b],
+    ]
+    best = None
+    for pts in options:
+        cost = 0.0
+        for (x1, y1), (x2, y2) in zip(pts, pts[1:]):
+            cost = max(cost, road_costs.segment_avg_cost(
+                x1, y1, x2, y2, terrain_img, veg_img, rivers=rivers, fields=fields))
+        if best is None or cost < best[0]:
+            best = (cost, pts)
+    return best
+
+
+def generate_paths(width, height, conf: dict, anchors=(), terrain_img=None,
+                   veg_img=None, rivers=None, step=1, stats=None, fields=None):
+    """
+    Transparent overlay with dirt paths linking `anchors` (lots, dead ends)
+    and random rural points. conf is the roads section of the config.
+    step > 1 scales the pixel lengths down for a coarse preview.
+    fields: road_costs.CostFields to share; with its roads set, rural points
+    closer than path_road_clearance to a road are skipped.
+    stats, if given, gets the drawn length (canvas px) as road_length["path"].
+    """
+    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    if not conf.get("dirt_paths", True):
+        return img
+
+    cell_size = max(1, conf.get("path_cell_size", 300) / step)
+    cells = max(1, round(width * height / (cell_size * cell_size)))
+    num_rural = int(conf.get("path_points_per_cell", 4) * cells)
+    max_len = conf.get("path_max_len", 220) / step
+    max_cost = conf.get("path_max_cost", 3.0)
+    k = conf.get("path_neighbors", 6)
+    path_width = max(1, round(conf.get("path_width", 2) / step))
+    clearance = conf.get("path_road_clearance", 0) / step
+    if fields is None and terrain_img is not None:
+        fields = road_costs.CostFields(terrain_img, veg_img, rivers)
+
+    margin = 4
+    points = [(int(x), int(y)) for x, y in anchors
+              if margin <= x < width - margin and margin <= y < height - margin]
+    road_dist = fields.distance("road") if fields is not None and clearance > 0 else None
+    rnd = render_context.rng()
+    for _ in range(num_rural):
+        x = rnd.randint(margin, width - 1 - margin)
+        y = rnd.randint(margin, height - 1 - margin)
+        if road_dist is None or road_dist[y, x] >= clearance:
+            points.append((x, y))
+    if len(points) < 2:
+        return img
+
+    draw = ImageDraw.Draw(img)
+    length = 0.0
+    for i, j, d2 in _spanning_tree(points, k):
+        if d2 > max_len * max_len:
+            continue
+        cost, pts = _route(points[i], points[j], terrain_img, veg_img, rivers, fields)
+        if cost > max_cost:
+            continue
+        draw.line(pts, fill=rnd.choice(PATH_COLORS), width=path_width, joint="curve")
+        length += step * sum(math.dist(p, q) for p, q in zip(pts, pts[1:]))
 
-def generate_paths(width, height, conf: dict):
-    # placeholder: return empty transparent image
-    return Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    if stats is not None:
+        stats.setdefault("road_length", {})["path"] = length
+    return img
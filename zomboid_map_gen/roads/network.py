@@ -0,0 +1,283 @@
+# zomboid_map_gen/roads/network.py
+"""
+Road network connectivity.
+
+Roads are polylines. Two roads are joined when any of their segments come
+within half their summed widths of each other (crossings, T-junctions,
+branch starts). Candidate segment pairs come from a uniform grid, and a
+pair is skipped as soon as its roads already share a union-find set, so
+building the components is near-linear in the number of segments.
+
+On top of that:
+- components(): size / length / classes of every connected component
+- reconnect_or_prune(): components shorter than a threshold get a short
+  connector to the nearest other road (if the route is affordable) or are
+  dropped, together with whatever already linked into them
+- join_trunk(): highways and majors end up in one component, linked by
+  major-class connectors between nearest points (Borůvka rounds); a
+  connector the cost check refuses is left out
+"""
+
+import math
+from collections import defaultdict
+
+from ..utils.disjoint_set import DisjointSet
+
+# grid cell edge (px) for segment lookups
+GRID = 64
+
+TRUNK = ("highway", "major")
+
+
+def _point_seg(px, py, ax, ay, bx, by):
+    """(distance, closest x, closest y) from point p to segment ab."""
+    dx, dy = bx - ax, by - ay
+    len2 = dx * dx + dy * dy
+    t = 0.0 if len2 == 0 else max(0.0, min(1.0, ((px - ax) * dx + (py - ay) * dy) / len2))
+    cx, cy = ax + t * dx, ay + t * dy
+    return math.hypot(px - cx, py - cy), cx, cy
+
+
+def _orient(ax, ay, bx, by, cx, cy):
+    v = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    return (v > 0) - (v < 0)
+
+
+def _seg_dist(a, b, c, d) -> float:
+    """Distance between segments ab and cd (0 if they cross)."""
+    o1 = _orient(*a, *b, *c)
+    o2 = _orient(*a, *b, *d)
+    o3 = _orient(*c, *d, *a)
+    o4 = _orient(*c, *d, *b)
+    if o1 != o2 and o3 != o4:
+        return 0.0
+    return min(_point_seg(*a, *c, *d)[0], _point_seg(*b, *c, *d)[0],
+               _point_seg(*c, *a, *b)[0], _point_seg(*d, *a, *b)[0])
+
+
+def _ring(gx, gy, ring):
+    """Grid cells at Chebyshev distance `ring` from (gx, gy)."""
+    if ring == 0:
+        yield gx, gy
+        return
+    for cx in range(gx - ring, gx + ring + 1):
+        yield cx, gy - ring
+        yield cx, gy + ring
+    for cy in range(gy - ring + 1, gy + ring):
+        yield gx - ring, cy
+        yield gx + ring, cy
+
+
+class RoadNetwork:
+    """
+    roads: list of (road_type, points); widths: {road_type: px}.
+    Roads can be added later (connectors) and dropped (alive flags).
+    """
+
+    def __init__(self, roads, widths: dict):
+        self.roads = []
+        self.widths = widths
+        self.alive = []
+        self.ds = DisjointSet()
+        self._grid = defaultdict(list)  # cell -> [(road, segment index)]
+        self._extent = None             # (min gx, min gy, max gx, max gy) of used cells
+        for road_type, points in roads:
+            self.add(road_type, points)
+
+    def __len__(self):
+        return len(self.roads)
+
+    def length(self, r: int) -> float:
+        pts = self.roads[r][1]
+        return sum(math.dist(p, q) for p, q in zip(pts, pts[1:]))
+
+    def _cells(self, a, b, pad):
+        x0, x1 = sorted((a[0], b[0]))
+        y0, y1 = sorted((a[1], b[1]))
+        gx0, gx1 = int((x0 - pad) // GRID), int((x1 + pad) // GRID)
+        gy0, gy1 = int((y0 - pad) // GRID), int((y1 + pad) // GRID)
+        e = self._extent
+        self._extent = (gx0, gy0, gx1, gy1) if e is None else \
+            (min(e[0], gx0), min(e[1], gy0), max(e[2], gx1), max(e[3], gy1))
+        for gy in range(gy0, gy1 + 1):
+            for gx in range(gx0, gx1 + 1):
+                yield gx, gy
+
+    def add(self, road_type, points) -> int:
+        """Add a road, joining it to every live road it touches."""
+        r = self.ds.add()
+        self.roads.append((road_type, list(points)))
+        self.alive.append(True)
+        half = self.widths.get(road_type, 1) / 2.0
+        pad = half + max(self.widths.values(), default=1) / 2.0
+        for i, (a, b) in enumerate(zip(points, points[1:])):
+            for cell in self._cells(a, b, pad):
+                bucket = self._grid[cell]
+                for r2, j in bucket:
+                    if r2 == r or not self.alive[r2] or self.ds.find(r) == self.ds.find(r2):
+                        continue
+                    c, d = self.roads[r2][1][j], self.roads[r2][1][j + 1]
+                    tol = half + self.widths.get(self.roads[r2][0], 1) / 2.0
+                    if _seg_dist(a, b, c, d) <= tol:
+                        self.ds.union(r, r2)
+                bucket.append((r, i))
+        return r
+
+    def components(self) -> dict:
+        """root -> {"roads": [ids], "length": px, "classes": set} for live roads."""
+        comps = {}
+        for r in range(len(self.roads)):
+            if not self.alive[r]:
+                continue
+            c = comps.setdefault(self.ds.find(r), {"roads": [], "length": 0.0, "classes": set()})
+            c["roads"].append(r)
+            c["length"] += self.length(r)
+            c["classes"].add(self.roads[r][0])
+        return comps
+
+    def members(self, root) -> list:
+        """Live roads of the component `root` as it is now."""
+        return [r for r in range(len(self.roads)) if self.alive[r] and self.ds.find(r) == root]
+
+    def _samples(self, roads, spacing):
+        for r in roads:
+            pts = self.roads[r][1]
+            for a, b in zip(pts, pts[1:]):
+                n = max(1, int(math.dist(a, b) // spacing))
+                for k in range(n + 1):
+                    t = k / n
+                    yield r, a[0] + (b[0] - a[0]) * t, a[1] + (b[1] - a[1]) * t
+
+    def nearest(self, x, y, accept, max_dist=math.inf):
+        """
+        (distance, (cx, cy), road) of the closest live road r with accept(r),
+        searched ring by ring over the grid; None if nothing within max_dist.
+        """
+        if self._extent is None:
+            return None
+        gx, gy = int(x // GRID), int(y // GRID)
+        ex0, ey0, ex1, ey1 = self._extent
+        max_ring = max(gx - ex0, ex1 - gx, gy - ey0, ey1 - gy, 0)
+        if max_dist != math.inf:
+            max_ring = min(max_ring, int(max_dist // GRID) + 1)
+        best = None
+        seen = set()
+        for ring in range(max_ring + 1):
+            # everything in this ring is at least (ring - 1) cells away
+            if best is not None and best[0] <= (ring - 1) * GRID:
+                break
+            for cell in _ring(gx, gy, ring):
+                for r2, j in self._grid.get(cell, ()):
+                    if (r2, j) in seen or not self.alive[r2] or not accept(r2):
+                        continue
+                    seen.add((r2, j))
+                    a, b = self.roads[r2][1][j], self.roads[r2][1][j + 1]
+                    d, px, py = _point_seg(x, y, *a, *b)
+                    if d <= max_dist and (best is None or d < best[0]):
+                        best = (d, (px, py), r2)
+        return best
+
+    def _closest_link(self, roads, accept, max_dist=math.inf):
+        """
+        Shortest link from `roads` to any accepted road:
+        (distance, from point, to point, from road, to road) or None.
+        """
+        best = None
+        for r, x, y in self._samples(roads, GRID / 2):
+            hit = self.nearest(x, y, accept, best[0] if best else max_dist)
+            if hit is not None and (best is None or hit[0] < best[0]):
+                best = (hit[0], (x, y), hit[1], r, hit[2])
+        return best
+
+    def reconnect_or_prune(self, min_length, reconnect_dist, cost_fn=None, max_cost=math.inf,
+                           keep=()):
+        """
+        Components shorter than min_length: link to the nearest other road
+        within reconnect_dist if cost_fn(x1, y1, x2, y2) allows, else drop.
+        Components holding a road in `keep` stay as they are.
+
+        Components are visited short-first and judged as they are by then:
+        one that an earlier component linked into counts with it, and is
+        dropped with it. So no component shorter than min_length survives
+        outside `keep`. Returns (reconnected, pruned) counts.
+        """
+        reconnected = pruned = 0
+        for comp in sorted(self.components().values(), key=lambda c: c["length"]):
+            first = comp["roads"][0]
+            if not self.alive[first]:
+                continue  # dropped with a component it was linked into
+            root = self.ds.find(first)
+            if any(self.ds.find(k) == root for k in keep):
+                continue
+            roads = self.members(root)
+            if sum(self.length(r) for r in roads) >= min_length:
+                continue
+            link = self._closest_link(roads, lambda r2: self.ds.find(r2) != root, reconnect_dist)
+            if link is not None:
+                _, p, q, r, r2 = link
+                if cost_fn is None or cost_fn(p[0], p[1], q[0], q[1]) <= max_cost:
+                    road_type = self.roads[first][0]
+                    self.ds.union(self.add(road_type, [p, q]), r2)
+                    reconnected += 1
+                    continue
+            for r in roads:
+                self.alive[r] = False
+            pruned += 1
+
+        kept = {self.ds.find(k) for k in keep if self.alive[k]}
+        short = [root for root, c in self.components().items()
+                 if c["length"] < min_length and root not in kept]
+        assert not short, f"{len(short)} components under {min_length} px survived pruning"
+        return reconnected, pruned
+
+    def join_trunk(self, trunk=TRUNK, cost_fn=None, max_cost=math.inf) -> int:
+        """
+        Make every road of a trunk class part of one component, adding
+        major connectors between nearest points. Borůvka-style rounds: each
+        trunk component links to its nearest other trunk road, shortest links
+        first, so the component count at least halves per round and every
+        search stays local. A connector costing more than max_cost under
+        cost_fn(x1, y1, x2, y2) (across water, say) is skipped, so trunk
+        components may stay apart. Returns connectors added.
+        """
+        trunk = set(trunk)
+        added = 0
+        while True:
+            comps = [c for c in self.components().values() if c["classes"] & trunk]
+            if len(comps) < 2:
+                break
+            # the largest component never has to search: all others reach it
+            comps.sort(key=lambda c: len(c["roads"]))
+            # roots are fixed while searching: links are only added after
+            roots = [self.ds.find(r) if t in trunk else -1 for r, (t, _) in enumerate(self.roads)]
+            links = []
+            for comp in comps[:-1]:
+                root = self.ds.find(comp["roads"][0])
+                link = self._closest_link(
+                    [r for r in comp["roads"] if roots[r] >= 0],
+                    lambda r2: roots[r2] not in (-1, root))
+                if link is not None:
+                    links.append(link)
+            before = added
+            for _, p, q, r, r2 in sorted(links, key=lambda l: l[0]):
+                if self.ds.find(r) == self.ds.find(r2):
+                    continue
+                if cost_fn is not None and cost_fn(p[0], p[1], q[0], q[1]) > max_cost:
+                    continue
+                c = self.add("major", [p, q])
+                self.ds.union(c, r)
+                self.ds.union(c, r2)
+                added += 1
+            if added == before:
+                break  # the nearest links left are all refused
+        return added
+
+    def report(self) -> dict:
+        comps = sorted(self.components().values(), key=lambda c: c["length"], reverse=True)
+        trunk_roots = {self.ds.find(c["roads"][0]) for c in comps if c["classes"] & set(TRUNK)}
+        return {
+            "components": len(comps),
+            "component_lengths_px": [round(c["length"], 1) for c in comps],
+            "trunk_components": len(trunk_roots),
+            "roads": sum(self.alive),
+        }
@@ -1,8 +1,194 @@
+# zomboid_map_gen/roads/rivers.py
 """
-Optional river generation under roads.
-Later: domain-warp a line from high-y to low-y.
+River generation from the terrain field.
+
+Hydrology runs on a coarse grid (one cell per rivers.step x rivers.step canvas pixels):
+1. the terrain noise field is the height map; map edges and existing water
+   are outlets
+2. priority-flood fills depressions and hands every cell a D8 receiver on the
+   way (heap for the rising front, plain queue inside pits -> O(n log n))
+3. flow accumulation walks cells in reverse flood order (O(n))
+4. cells whose upstream area passes `min_catchment` become river, drawn as
+   lines to their receiver and wider downstream
+
+Rivers are carved into the terrain as water, so roads already treat them as
+a barrier; narrow stretches are kept as bridge candidates roads may cross.
 """
 
-def generate_rivers(width, height, conf: dict):
-    # return transparent image (for now)
-    return None
+import heapq
+import math
+from collections import deque
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from ..utils import colors as base_colors
+from ..terrain import terrain_generator
+
+WATER = base_colors.VANILLA["water"]
+
+# keep the hydrology grid around this many cells at most (bigger step on huge maps)
+MAX_CELLS = 1_000_000
+
+# D8 neighbor offsets (dy, dx)
+_D8 = [(-1, -1), (-1, 0), (-1, 1), (0, -1), (0, 1), (1, -1), (1, 0), (1, 1)]
+
+
+class RiverNetwork:
+    """
+    Boolean masks at canvas (or preview) resolution:
+    - river:  pixels carved as river water
+    - bridge: river pixels narrow enough for a road to bridge
+    """
+
+    def __init__(self, river: np.ndarray, bridge: np.ndarray):
+        self.river = river
+        self.bridge = bridge
+
+    def carve(self, terrain_img: Image.Image) -> Image.Image:
+        """Paint the rivers into a copy of the terrain as vanilla water."""
+        arr = np.array(terrain_img.convert("RGBA"))
+        arr[self.river] = WATER
+        return Image.fromarray(arr, "RGBA")
+
+    def crosses(self, xs, ys) -> tuple[bool, bool]:
+        """
+        (touches_river, only_at_bridges) for a set of sample points.
+        Out-of-canvas points are ignored.
+        """
+        h, w = self.river.shape
+        xs = np.asarray(xs, dtype=np.int64)
+        ys = np.asarray(ys, dtype=np.int64)
+        ok = (xs >= 0) & (ys >= 0) & (xs < w) & (ys < h)
+        xs, ys = xs[ok], ys[ok]
+        hit = self.river[ys, xs]
+        if not hit.any():
+            return False, True
+        return True, bool(self.bridge[ys[hit], xs[hit]].all())
+
+
+def _priority_flood(elev: np.ndarray, seeds: np.ndarray):
+    """
+    Priority-flood with D8 receivers.
+    Returns (receiver, order): receiver[i] = cell i drains into (-1 = outlet),
+    order = cells in the order they were reached (downstream first).
+    """
+    gh, gw = elev.shape
+    n = gh * gw
+    z = elev.ravel().astype(np.float64).tolist()
+    closed = bytearray(n)
+    receiver = [-1] * n
+    order = []
+
+    heap = []
+    for i in seeds.tolist():
+        closed[i] = 1
+        heap.append((z[i], i))
+    heapq.heapify(heap)
+    pit = deque()
+
+    while heap or pit:
+        if pit:
+            c = pit.popleft()
+        else:
+            c = heapq.heappop(heap)[1]
+        zc = z[c]
+        order.append(c)
+
+        cy, cx = divmod(c, gw)
+        for dy, dx in _D8:
+            ny = cy + dy
+            nx = cx + dx
+            if ny < 0 or nx < 0 or ny >= gh or nx >= gw:
+                continue
+            nb = ny * gw + nx
+            if closed[nb]:
+                continue
+            closed[nb] = 1
+            receiver[nb] = c
+            if z[nb] <= zc:
+                # inside a depression: fill to the spill height, no heap needed
+                z[nb] = zc
+                pit.append(nb)
+            else:
+                heapq.heappush(heap, (z[nb], nb))
+
+    return receiver, order
+
+
+def _flow_accumulation(receiver, order) -> list[int]:
+    acc = [1] * len(receiver)
+    for c in reversed(order):
+        r = receiver[c]
+        if r >= 0:
+            acc[r] += acc[c]
+    return acc
+
+
+def generate_rivers(conf: dict, terrain_img: Image.Image, step: int = 1):
+    """
+    Build rivers for the canvas from the terrain field.
+    terrain_img may be a coarse preview (one pixel per step x step canvas
+    block); masks come back at its resolution.
+    Returns a RiverNetwork, or None when disabled / nothing passes the threshold.
+    """
+    river_conf = conf.get("rivers", {})
+    if not river_conf.get("enabled", True) or terrain_img is None:
+        return None
+
+    width, height = terrain_img.size
+    canvas_w, canvas_h = width * step, height * step
+    # previews route on a grid two preview pixels per cell
+    cell = max(int(river_conf.get("step", 4)), 2 * step if step > 1 else 1,
+               math.ceil(math.sqrt(canvas_w * canvas_h / MAX_CELLS)))
+    min_catchment = float(river_conf.get("min_catchment", 8000))
+    min_width = int(river_conf.get("min_width", 2))
+    max_width = int(river_conf.get("max_width", 9))
+    bridge_max_width = int(river_conf.get("bridge_max_width", 4))
+
+    elev = terrain_generator.elevation(conf, cell)
+    gh, gw = elev.shape
+
+    # outlets: map border + water already in the terrain (sampled at cell centers)
+    rgb = np.asarray(terrain_img.convert("RGBA"))[..., :3]
+    cy = np.minimum((np.arange(gh) * cell + cell // 2) // step, height - 1)
+    cx = np.minimum((np.arange(gw) * cell + cell // 2) // step, width - 1)
+    water = np.all(rgb[np.ix_(cy, cx)] == WATER[:3], axis=-1)
+    outlet = water.copy()
+    outlet[0, :] = outlet[-1, :] = True
+    outlet[:, 0] = outlet[:, -1] = True
+
+    receiver, order = _priority_flood(elev, np.flatnonzero(outlet))
+    acc = _flow_accumulation(receiver, order)
+
+    cell_area = cell * cell
+    min_cells = min_catchment / cell_area
+    water_flat = water.ravel()
+
+    river_img = Image.new("L", (width, height), 0)
+    wide_img = Image.new("L", (width, height), 0)
+    river_draw = ImageDraw.Draw(river_img)
+    wide_draw = ImageDraw.Draw(wide_img)
+
+    drawn = 0
+    for c in order:
+        a = acc[c]
+        r = receiver[c]
+        if a < min_cells or r < 0 or water_flat[c]:
+            continue
+        w = int(round(min(max_width, min_width * math.sqrt(a / min_cells))))
+        y0, x0 = divmod(c, gw)
+        y1, x1 = divmod(r, gw)
+        seg = [((x0 * cell + cell // 2) / step, (y0 * cell + cell // 2) / step),
+               ((x1 * cell + cell // 2) / step, (y1 * cell + cell // 2) / step)]
+        river_draw.line(seg, fill=255, width=max(1, round(w / step)))
+        if w > bridge_max_width:
+            wide_draw.line(seg, fill=255, width=max(1, round(w / step)))
+        drawn += 1
+
+    if not drawn:
+        return None
+
+    river = np.asarray(river_img) > 0
+    bridge = river & ~(np.asarray(wide_img) > 0)
+    return RiverNetwork(river, bridge)
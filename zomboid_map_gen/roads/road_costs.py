@@ -2,14 +2,24 @@
 """
 Sample terrain/vegetation and return a "cost" for putting a road there.
 Higher cost = worse place to put a road.
+
+CostFields holds the same costs as per-pixel rasters for one render, plus
+distance fields (to water, forest and drawn roads; see utils.distance),
+so every query from the road walker, network links and dirt paths is an
+array lookup. Buffers ("keep N px from water") are then one comparison.
 """
 
-from ..utils import colors as base_colors
+import numpy as np
+
+from ..utils import colors as base_colors, jit
+from ..utils.distance import edt
+
+WATER_COST = 9999
 
 # build a table using the user's actual base map colours
 # (color, tolerance, cost)
 TERRAIN_COST_TABLE = [
-    (base_colors.VANILLA["water"][:3],        12, 9999),  # water: basically no
+    (base_colors.VANILLA["water"][:3],        12, WATER_COST),  # water: basically no
     (base_colors.VANILLA["dark_grass"][:3],   12, 2.5),
     (base_colors.VANILLA["med_grass"][:3],    12, 2.0),
     (base_colors.VANILLA["light_grass"][:3],  12, 1.7),
@@ -21,6 +31,9 @@ TERRAIN_COST_TABLE = [
     (base_colors.VANILLA["dark_asphalt"][:3], 10, 1.0),
 ]
 
+# crossing a river at a bridge candidate (added once per segment)
+BRIDGE_COST = 0.8
+
 # vegetation colors we consider "thick" and should cost extra
 DENSE_VEG = [
     base_colors.VEG["dense_forest"][:3],
@@ -34,6 +47,153 @@ def _color_distance(c1, c2):
     return abs(c1[0] - c2[0]) + abs(c1[1] - c2[1]) + abs(c1[2] - c2[2])
 
 
+# rows per band when building rasters
+_BAND_ROWS = 1024
+
+_luts = {}
+
+
+def _color_lut(colors, tol, strict=False) -> np.ndarray:
+    """
+    2**24 table over little-endian RGB keys: index of the first color within
+    L1 distance tol (< tol if strict), len(colors) if none.
+    """
+    key = (tuple(colors), tol, strict)
+    lut = _luts.get(key)
+    if lut is not None:
+        return lut
+    lut = np.full(1 << 24, len(colors), dtype=np.uint8)
+    # later entries first so earlier ones win where tolerances overlap
+    for i in range(len(colors) - 1, -1, -1):
+        (r, g, b), t = colors[i], tol[i] if isinstance(tol, tuple) else tol
+        d = np.arange(-t, t + 1)
+        dg, db = (a.ravel() for a in np.meshgrid(d, d, indexing="ij"))
+        gg, bb = g + dg, b + db
+        l1_gb = np.abs(dg) + np.abs(db)
+        # one red offset at a time: the full (2t+1)^3 cube would be the peak
+        for rr in range(max(0, r - t), min(255, r + t) + 1):
+            l1 = l1_gb + abs(rr - r)
+            ok = ((l1 < t) if strict else (l1 <= t)) & (gg >= 0) & (gg < 256) & (bb >= 0) & (bb < 256)
+            lut[rr | (gg[ok] << 8) | (bb[ok] << 16)] = i
+    _luts[key] = lut
+    return lut
+
+
+def _rgba(img) -> np.ndarray:
+    return np.asarray(img if img.mode == "RGBA" else img.convert("RGBA"))
+
+
+def _lookup_rows(arr: np.ndarray, lut) -> np.ndarray:
+    """lut[RGB key] for every pixel of an RGBA array, in row bands."""
+    packed = np.ascontiguousarray(arr).view("<u4")[..., 0]
+    out = np.empty(packed.shape, dtype=lut.dtype)
+    for y0 in range(0, packed.shape[0], _BAND_ROWS):
+        out[y0:y0 + _BAND_ROWS] = lut[packed[y0:y0 + _BAND_ROWS] & 0xFFFFFF]
+    return out
+
+
+def terrain_rows(arr: np.ndarray) -> np.ndarray:
+    """CostFields.terrain for a band of RGBA terrain rows (streamed builds)."""
+    colors = [c for c, _, _ in TERRAIN_COST_TABLE]
+    tols = tuple(t for _, t, _ in TERRAIN_COST_TABLE)
+    return _lookup_rows(arr, _color_lut(colors, tols))
+
+
+def dense_rows(arr: np.ndarray) -> np.ndarray:
+    """CostFields.dense for a band of RGBA vegetation rows."""
+    return _lookup_rows(arr, _color_lut(DENSE_VEG, 60, strict=True)) < len(DENSE_VEG)
+
+
+class CostFields:
+    """
+    Road cost rasters for one render (same tolerances as terrain_cost_at /
+    veg_cost_at), and distance fields built on first use:
+    - "water": lakes and sea (rivers are priced by river_crossing_cost)
+    - "forest": dense vegetation
+    - "road": drawn roads, once set_roads() has been called
+    """
+
+    def __init__(self, terrain_img, veg_img=None, rivers=None):
+        # one byte per pixel: row of TERRAIN_COST_TABLE, len(table) = no match
+        terrain = terrain_rows(_rgba(terrain_img))
+        dense = dense_rows(_rgba(veg_img)) if veg_img is not None else None
+        self._setup(terrain, dense, rivers)
+
+    @classmethod
+    def from_arrays(cls, terrain: np.ndarray, dense: np.ndarray | None = None, rivers=None):
+        """From terrain_rows / dense_rows output built elsewhere (pipeline.py)."""
+        fields = cls.__new__(cls)
+        fields._setup(terrain, dense, rivers)
+        return fields
+
+    def _setup(self, terrain, dense, rivers):
+        self.size = (terrain.shape[1], terrain.shape[0])
+        self.terrain = terrain
+        self._costs = [c for _, _, c in TERRAIN_COST_TABLE] + [2.0]
+        self.dense = dense
+        wet = [i for i, c in enumerate(self._costs) if c >= WATER_COST]
+        self._masks = {"water": np.isin(self.terrain, wet)}
+        if rivers is not None:
+            self._masks["water"] &= ~rivers.river
+        if self.dense is not None:
+            self._masks["forest"] = self.dense
+        self._fields = {}
+        self._kernel_args = None
+
+    def kernel_args(self, rivers, water_buffer: float, forest_buffer: float) -> tuple:
+        """Arrays for _segment_cost_kernel (empty stand-ins for what is unused)."""
+        key = (id(rivers), water_buffer > 0, forest_buffer > 0)
+        if self._kernel_args is None or self._kernel_args[0] != key:
+            none2d = np.zeros((0, 0), dtype=bool)
+            far = np.zeros((0, 0), dtype=np.float32)
+            self._kernel_args = (key, (
+                self.terrain, np.array(self._costs, dtype=np.float64),
+                self.dense if self.dense is not None else none2d,
+                self.distance("water") if water_buffer > 0 else far,
+                self.distance("forest") if forest_buffer > 0 and self.dense is not None else far,
+                rivers.river if rivers is not None else none2d,
+                rivers.bridge if rivers is not None else none2d,
+            ))
+        return self._kernel_args[1]
+
+    def set_roads(self, roads_img):
+        self._masks["road"] = np.asarray(roads_img.getchannel("A")) > 0
+        self._fields.pop("road", None)
+
+    def distance(self, name: str) -> np.ndarray:
+        """Distance (px) from every pixel to the nearest `name` pixel (inf if none)."""
+        field = self._fields.get(name)
+        if field is None:
+            mask = self._masks.get(name)
+            if mask is None:
+                h, w = self.size[1], self.size[0]
+                field = np.full((h, w), np.inf, dtype=np.float32)
+            else:
+                field = edt(mask)
+            self._fields[name] = field
+        return field
+
+    def terrain_cost_at(self, x, y, ignore_water=False, water_buffer=0.0) -> float:
+        w, h = self.size
+        if x < 0 or y < 0 or x >= w or y >= h:
+            return WATER_COST
+        c = self._costs[self.terrain[y, x]]
+        if c >= WATER_COST:
+            # pretend water is grass if ignoring water
+            return 2.0 if ignore_water else c
+        if water_buffer > 0 and not ignore_water and self.distance("water")[y, x] <= water_buffer:
+            return WATER_COST
+        return c
+
+    def veg_cost_at(self, x, y, ignore_trees=False, forest_buffer=0.0) -> float:
+        w, h = self.size
+        if self.dense is None or ignore_trees or x < 0 or y < 0 or x >= w or y >= h:
+            return 0.0
+        if self.dense[y, x] or (forest_buffer > 0 and self.distance("forest")[y, x] <= forest_buffer):
+            return 1.2
+        return 0.0
+
+
 def terrain_cost_at(x, y, terrain_img, ignore_water=False):
     if terrain_img is None:
         return 1.5
@@ -65,14 +225,126 @@ def veg_cost_at(x, y, veg_img, ignore_trees=False):
     return 0.0
 
 
+def river_crossing_cost(x1, y1, x2, y2, rivers, ignore_water=False):
+    """
+    Rivers are thin, so the point samples in segment_avg_cost can step right
+    over them. Walk the segment pixel by pixel instead: crossing only at
+    bridge candidates costs BRIDGE_COST, anything else is a barrier.
+    """
+    if rivers is None or ignore_water:
+        return 0.0
+    n = int(max(abs(x2 - x1), abs(y2 - y1))) + 1
+    xs = np.rint(np.linspace(x1, x2, n))
+    ys = np.rint(np.linspace(y1, y2, n))
+    touches, bridged = rivers.crosses(xs, ys)
+    if not touches:
+        return 0.0
+    return BRIDGE_COST if bridged else 9999
+
+
 def segment_avg_cost(x1, y1, x2, y2, terrain_img, veg_img,
-                     ignore_water=False, ignore_trees=False, samples=6):
+                     ignore_water=False, ignore_trees=False, samples=6, rivers=None,
+                     fields=None, water_buffer=0.0, forest_buffer=0.0):
+    """
+    Mean cost over `samples` points of the segment plus its river crossing.
+    With fields (a CostFields for these images) the samples are raster
+    lookups, and water_buffer / forest_buffer (px) make anything that close
+    to lake water a barrier / as costly as the forest.
+    """
+    if fields is not None and jit.ENABLED:
+        return _segment_cost_kernel(float(x1), float(y1), float(x2), float(y2),
+                                    *fields.kernel_args(rivers, water_buffer, forest_buffer),
+                                    ignore_water, ignore_trees, samples,
+                                    float(water_buffer), float(forest_buffer))
     total = 0.0
     for i in range(samples):
         t = i / max(1, samples - 1)
         sx = int(x1 + (x2 - x1) * t)
         sy = int(y1 + (y2 - y1) * t)
-        c = terrain_cost_at(sx, sy, terrain_img, ignore_water=ignore_water)
-        c += veg_cost_at(sx, sy, veg_img, ignore_trees=ignore_trees)
+        if rivers is not None and _on_bridge(sx, sy, rivers):
+            # river water a bridge can span; the crossing is priced below
+            c = 0.0
+        elif fields is not None:
+            c = fields.terrain_cost_at(sx, sy, ignore_water, water_buffer)
+        else:
+            c = terrain_cost_at(sx, sy, terrain_img, ignore_water=ignore_water)
+        if fields is not None:
+            c += fields.veg_cost_at(sx, sy, ignore_trees, forest_buffer)
+        else:
+            c += veg_cost_at(sx, sy, veg_img, ignore_trees=ignore_trees)
         total += c
-    return total / samples
+    total /= samples
+    return total + river_crossing_cost(x1, y1, x2, y2, rivers, ignore_water=ignore_water)
+
+
+def _on_bridge(x, y, rivers):
+    h, w = rivers.bridge.shape
+    return 0 <= x < w and 0 <= y < h and bool(rivers.bridge[y, x])
+
+
+@jit.kernel
+def _segment_cost_kernel(x1, y1, x2, y2, terrain, costs, dense, water_dist, forest_dist,
+                         river, bridge, ignore_water, ignore_trees, samples,
+                         water_buffer, forest_buffer):
+    """
+    segment_avg_cost with CostFields, in one loop: same samples, same sums
+    in the same order. Empty arrays stand for "no such layer".
+    """
+    h, w = terrain.shape
+    has_rivers = river.shape[0] > 0
+    total = 0.0
+    for i in range(samples):
+        t = i / max(1, samples - 1)
+        sx = int(x1 + (x2 - x1) * t)
+        sy = int(y1 + (y2 - y1) * t)
+        inside = 0 <= sx < w and 0 <= sy < h
+        if has_rivers and inside and bridge[sy, sx]:
+            c = 0.0
+        elif not inside:
+            c = float(WATER_COST)
+        else:
+            c = costs[terrain[sy, sx]]
+            if c >= WATER_COST:
+                if ignore_water:
+                    c = 2.0
+            elif water_buffer > 0 and not ignore_water and water_dist[sy, sx] <= water_buffer:
+                c = float(WATER_COST)
+        if dense.shape[0] > 0 and not ignore_trees and inside:
+            if dense[sy, sx] or (forest_buffer > 0 and forest_dist[sy, sx] <= forest_buffer):
+                c += 1.2
+        total += c
+    total /= samples
+    if not has_rivers or ignore_water:
+        return total
+
+    # river_crossing_cost: np.rint(np.linspace(...)) over the segment
+    n = int(max(abs(x2 - x1), abs(y2 - y1))) + 1
+    div = n - 1
+    dx, dy = x2 - x1, y2 - y1
+    touches = False
+    bridged = True
+    for i in range(n):
+        if div == 0:
+            px, py = x1, y1
+        elif i == div:
+            px, py = x2, y2
+        else:
+            px = _linspace_at(x1, dx, div, i)
+            py = _linspace_at(y1, dy, div, i)
+        ix, iy = int(np.rint(px)), int(np.rint(py))
+        if 0 <= ix < w and 0 <= iy < h and river[iy, ix]:
+            touches = True
+            if not bridge[iy, ix]:
+                bridged = False
+    if not touches:
+        return total
+    return total + (BRIDGE_COST if bridged else 9999)
+
+
+@jit.kernel
+def _linspace_at(start, delta, div, i):
+    # element i of np.linspace(start, start + delta, div + 1), numpy's formula
+    step = delta / div
+    if step == 0:
+        return i / div * delta + start
+    return i * step + start
@@ -3,19 +3,27 @@
 Road overlay generator.
 Supports modes: ortho, ortho45, free.
 Generates:
-- transparent road overlay (roads_img)
-- simple lots mask (lots_img)
+- transparent road overlay (roads_img), dirt paths included
+- lots mask (lots_img): town lots subdivided from the blocks the roads
+  enclose (blocks.py), plus parking lots along roads outside them
+
+Roads are walked first and drawn afterwards: in between, the network pass
+(network.py) prunes or reconnects short isolated stubs and links highways
+and majors into one component wherever a connector passes the same cost
+check as the roads (not across water).
 """
 
-import random
 import math
+import numpy as np
 from PIL import Image, ImageDraw
 
-from ..utils import colors as base_colors
+from ..utils import colors as base_colors, render_context
 from . import patterns
 from . import road_costs
 from . import road_post
 from . import dirt_paths
+from . import network
+from . import blocks
 
 
 # pick colors straight from user palette
@@ -32,31 +40,123 @@ ROAD_STYLES = {
 }
 
 
+# params measured in canvas pixels; scaled down for coarse previews
+_LENGTH_PARAMS = (
+    "highway_min_len", "highway_max_len", "major_min_len", "major_max_len",
+    "main_min_len", "main_max_len", "side_min_len", "side_max_len",
+    "lot_min_w", "lot_max_w", "lot_min_h", "lot_max_h",
+    "min_component_len", "reconnect_dist", "lot_min_frontage",
+)
+
+
+# how far inside the edge (px) road_exits measures a road's heading
+EXIT_PROBE = 8
+
+
+def _runs(line: np.ndarray, types: dict):
+    """(start, end, road_type) of every run of road pixels along a 1-px line (N x 4)."""
+    on = line[:, 3] > 0
+    edges = np.flatnonzero(np.diff(np.r_[0, on.astype(np.int8), 0]))
+    for a, b in zip(edges[::2], edges[1::2]):
+        # potholes speckle the asphalt: the most common road color names the run
+        names = [types.get(tuple(int(c) for c in px[:3])) for px in line[a:b]]
+        names = [n for n in names if n]
+        if names:
+            yield a, b, max(set(names), key=names.count)
+
+
+def road_exits(roads_img, side: str) -> list:
+    """
+    [(pos, angle, road_type)] for roads crossing the `side` edge (right,
+    bottom, left or top) of roads_img: pos along that edge, angle (degrees)
+    of the road heading out through it. Runs much wider than a road are
+    roads running along the edge, skipped.
+    """
+    arr = np.asarray(roads_img.convert("RGBA"))
+    # turn every side into the right edge: flip / transpose, scan, map back
+    if side == "left":
+        arr = arr[:, ::-1]
+    elif side == "bottom":
+        arr = arr.transpose(1, 0, 2)
+    elif side == "top":
+        arr = arr[::-1].transpose(1, 0, 2)
+    h, w = arr.shape[:2]
+    types = {style["color"]: name for name, style in ROAD_STYLES.items()}
+    max_run = 2 * max(s["width"] for s in ROAD_STYLES.values())
+    probe = max(0, w - 1 - EXIT_PROBE)
+    inner = [(float(a + b - 1) / 2, t) for a, b, t in _runs(arr[:, probe], types)]
+
+    exits = []
+    for a, b, road_type in _runs(arr[:, w - 1], types):
+        if b - a > max_run:
+            continue
+        pos = float(a + b - 1) / 2
+        # where the same road was a few px further in gives its heading
+        near = [p for p, t in inner if t == road_type and abs(p - pos) <= 2 * EXIT_PROBE]
+        dy = pos - min(near, key=lambda p: abs(p - pos)) if near else 0.0
+        angle = math.degrees(math.atan2(dy, w - 1 - probe)) if w - 1 > probe else 0.0
+        angle = {"right": angle, "left": 180 - angle,
+                 "bottom": 90 - angle, "top": angle - 90}[side]
+        exits.append((pos, angle, road_type))
+    return exits
+
+
 def _in_bounds(x, y, w, h, margin=0):
     return margin <= x < (w - margin) and margin <= y < (h - margin)
 
 
+def _clip_to_edge(x, y, nx, ny, w, h):
+    """Last point inside the image on the segment (x, y) -> (nx, ny)."""
+    t = 1.0
+    for p, q, hi in ((x, nx, w - 1), (y, ny, h - 1)):
+        if q < 0:
+            t = min(t, p / (p - q))
+        elif q > hi:
+            t = min(t, (hi - p) / (q - p))
+    return x + (nx - x) * t, y + (ny - y) * t
+
+
 def _step_from(x, y, angle_deg, length):
     rad = math.radians(angle_deg)
     return x + math.cos(rad) * length, y + math.sin(rad) * length
 
 
-def _pick_edge_start(w, h):
-    side = random.choice(["top", "bottom", "left", "right"])
+SIDES = ("top", "bottom", "left", "right")
+
+
+def _pick_edge_start(w, h, sides=SIDES, rnd=None):
+    rnd = rnd or render_context.rng()
+    side = rnd.choice(sides)
     if side == "top":
-        return random.randint(0, w - 1), 1, 90
+        return rnd.randint(0, w - 1), 1, 90
     if side == "bottom":
-        return random.randint(0, w - 1), h - 2, -90
+        return rnd.randint(0, w - 1), h - 2, -90
     if side == "left":
-        return 1, random.randint(0, h - 1), 0
-    return w - 2, random.randint(0, h - 1), 180
-
-
-def generate(conf: dict, terrain_img=None, vegetation_img=None):
+        return 1, rnd.randint(0, h - 1), 0
+    return w - 2, rnd.randint(0, h - 1), 180
+
+
+def generate(conf: dict, terrain_img=None, vegetation_img=None, rivers=None, step: int = 1,
+             stats: dict | None = None, starts=(), density: float = 1.0, sides=SIDES,
+             fields=None):
+    """
+    step > 1 means terrain_img is a coarse preview (one pixel per step x step
+    canvas block); lengths and widths are scaled down to match.
+    starts: [(x, y, angle, road_type)] roads that continue a network beyond
+    the image (extend.py); they are walked first, count as connected to each
+    other and are never pruned. density scales the num_* road counts and
+    sides limits the edges new roads come in from.
+    stats, if given, is filled with "road_length" ({class: canvas px}, dirt
+    paths as "path"), "lots" ([(x, y, w, h)] bounding boxes in canvas px),
+    "town" ({"blocks": count, "lots": [{"block", "polygon", "area_px",
+    "frontage_px"}]}, canvas px) and "network" (connectivity report of the
+    final road graph).
+    """
     if terrain_img is None:
         raise ValueError("road_generator.generate needs terrain_img for sizing")
 
     width, height = terrain_img.size
+    rnd = render_context.rng()
 
     road_conf = conf.get("roads", {})
     angle_mode = road_conf.get("mode", "ortho45")
@@ -95,13 +195,49 @@ def generate(conf: dict, terrain_img=None, vegetation_img=None):
 
         "ignore_water": road_conf.get("ignore_water", False),
         "ignore_trees": road_conf.get("ignore_trees", False),
+
+        "min_component_len": road_conf.get("min_component_len", 150),
+        "reconnect_dist": road_conf.get("reconnect_dist", 60),
+        "connect_trunk": road_conf.get("connect_trunk", True),
+
+        "town_blocks": road_conf.get("town_blocks", True),
+        "block_min_area": road_conf.get("block_min_area", 600),
+        "block_max_area": road_conf.get("block_max_area", 90000),
+        "lot_area": road_conf.get("lot_area", 900),
+        "lot_min_frontage": road_conf.get("lot_min_frontage", 14),
+
+        # keep roads this far (canvas px) from lakes / out of forest edges
+        "water_buffer": road_conf.get("water_buffer", 0),
+        "forest_buffer": road_conf.get("forest_buffer", 0),
     }
+    if step > 1:
+        for key in _LENGTH_PARAMS:
+            params[key] = max(1, round(params[key] / step))
+        for key in ("water_buffer", "forest_buffer"):
+            params[key] = params[key] / step
+        for key in ("block_min_area", "block_max_area", "lot_area"):
+            params[key] = params[key] / (step * step)
+
+    # cost rasters + distance fields, shared by every cost query below
+    # (fields: a CostFields for these images built ahead, see pipeline.py)
+    if fields is None:
+        fields = road_costs.CostFields(terrain_img, vegetation_img, rivers)
 
     roads_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
     road_draw = ImageDraw.Draw(roads_img)
+    widths = {name: max(1, round(s["width"] / step)) for name, s in ROAD_STYLES.items()}
 
     lots_img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
 
+    # lot centers + dead ends, linked up later by dirt paths
+    path_anchors = []
+
+    road_length = {name: 0.0 for name in ROAD_STYLES}
+    lots = []
+    # walked roads [(type, points)] and the lots they spawned [(road, rect)]
+    walked = []
+    pending_lots = []
+
     next_down = {
         "highway": "major",
         "major": "main",
@@ -113,49 +249,59 @@ def generate(conf: dict, terrain_img=None, vegetation_img=None):
         if depth > params["max_branch_depth"]:
             return
 
-        style = ROAD_STYLES[road_type]
         min_len = params[f"{road_type}_min_len"]
         max_len = params[f"{road_type}_max_len"]
 
         angle = patterns.snap_angle(start_angle, angle_mode)
         x, y = start_x, start_y
         points = [(x, y)]
+        road_idx = len(walked)
+        walked.append((road_type, points))
 
         for _ in range(600):
-            seg_len = random.randint(min_len, max_len)
+            seg_len = rnd.randint(min_len, max_len)
             nx, ny = _step_from(x, y, angle, seg_len)
 
-            if not _in_bounds(nx, ny, width, height, margin=3):
-                break
+            leaving = not _in_bounds(nx, ny, width, height, margin=3)
+            if leaving:
+                # run out to the edge, so the road visibly exits the map
+                # (extend.py picks it up there)
+                nx, ny = _clip_to_edge(x, y, nx, ny, width, height)
+                if math.dist((x, y), (nx, ny)) < 1:
+                    break
 
             avg_cost = road_costs.segment_avg_cost(
                 x, y, nx, ny,
                 terrain_img, vegetation_img,
                 ignore_water=params["ignore_water"],
                 ignore_trees=params["ignore_trees"],
+                rivers=rivers, fields=fields,
+                water_buffer=params["water_buffer"], forest_buffer=params["forest_buffer"],
             )
             if avg_cost > params["max_segment_cost"]:
                 break
 
             # commit the segment
             points.append((nx, ny))
+            if leaving:
+                break
 
             # maybe spawn a lot
-            if random.random() < params["lot_spawn_chance"]:
-                lw = random.randint(params["lot_min_w"], params["lot_max_w"])
-                lh = random.randint(params["lot_min_h"], params["lot_max_h"])
+            if rnd.random() < params["lot_spawn_chance"]:
+                lw = rnd.randint(params["lot_min_w"], params["lot_max_w"])
+                lh = rnd.randint(params["lot_min_h"], params["lot_max_h"])
                 # simple: put lot to the right of segment start
                 lx = int(nx + 5)
                 ly = int(ny + 5)
                 if _in_bounds(lx, ly, width, height, margin=5):
-                    road_post.add_parking_lot_rect(lots_img, lx, ly, lw, lh)
+                    pending_lots.append((road_idx, (lx, ly, lw, lh)))
 
             # maybe branch
-            if depth < params["max_branch_depth"] and random.random() < params["branch_prob"]:
+            if depth < params["max_branch_depth"] and rnd.random() < params["branch_prob"]:
                 if angle_mode == "free":
-                    branch_ang = (angle + random.choice([-90, 90])) % 360
+                    branch_ang = (angle + rnd.choice([-90, 90])) % 360
                 else:
-                    branch_ang = patterns.snap_angle(angle + random.choice([-90, 90]), angle_mode)
+                    branch_ang = patterns.snap_angle(angle + rnd.choice([-90, 90]), angle_mode)
                 child_type = next_down[road_type]
                 make_road(nx, ny, branch_ang, child_type, depth + 1)
 
@@ -164,46 +310,122 @@ def generate(conf: dict, terrain_img=None, vegetation_img=None):
 
             # maybe turn a bit
             if angle_mode == "free":
-                jitter = random.uniform(params["min_turn"], params["max_turn"])
-                if random.random() < 0.5:
+                jitter = rnd.uniform(params["min_turn"], params["max_turn"])
+                if rnd.random() < 0.5:
                     jitter = -jitter
                 angle = patterns.snap_angle(angle + jitter, angle_mode)
             else:
                 # ortho/ortho45: sometimes straight, sometimes right/left
-                if random.random() < 0.3:
+                if rnd.random() < 0.3:
                     pass
                 else:
                     if angle_mode == "ortho":
-                        angle = patterns.snap_angle(angle + random.choice([-90, 90]), angle_mode)
+                        angle = patterns.snap_angle(angle + rnd.choice([-90, 90]), angle_mode)
                     else:
-                        angle = patterns.snap_angle(angle + random.choice([-90, -45, 45, 90]), angle_mode)
-
-        # draw it
-        if len(points) > 1:
-            road_draw.line(points, fill=style["color"] + (255,), width=style["width"], joint="curve")
-
-    # highways from edges
-    for _ in range(params["num_highways"]):
-        sx, sy, ang = _pick_edge_start(width, height)
-        make_road(sx, sy, ang, "highway", depth=0)
-
-    # extra majors/mains/sides
-    for _ in range(params["num_majors"]):
-        sx, sy, ang = _pick_edge_start(width, height)
-        make_road(sx, sy, ang, "major", depth=0)
-    for _ in range(params["num_mains"]):
-        sx, sy, ang = _pick_edge_start(width, height)
-        make_road(sx, sy, ang, "main", depth=0)
-    for _ in range(params["num_sides"]):
-        sx, sy, ang = _pick_edge_start(width, height)
-        make_road(sx, sy, ang, "side", depth=0)
+                        angle = patterns.snap_angle(angle + rnd.choice([-90, -45, 45, 90]), angle_mode)
+
+
+    # continued roads first, then highways / majors / mains / sides from edges
+    for sx, sy, ang, road_type in starts:
+        render_context.check()
+        make_road(sx, sy, ang, road_type, depth=0)
+    anchored = len(walked)
+    for road_type in ROAD_STYLES:
+        for _ in range(round(params[f"num_{road_type}s"] * density)):
+            render_context.check()
+            sx, sy, ang = _pick_edge_start(width, height, sides, rnd)
+            make_road(sx, sy, ang, road_type, depth=0)
+
+    # connectivity: drop / reconnect isolated stubs, join the trunk roads
+    net = network.RoadNetwork([r for r in walked if len(r[1]) > 1], widths)
+    road_ids = [i for i, r in enumerate(walked) if len(r[1]) > 1]
+    # continued roads (and their branches) meet beyond the image
+    keep = [r for r, i in enumerate(road_ids) if i < anchored]
+    for r in keep[1:]:
+        net.ds.union(keep[0], r)
+
+    def link_cost(x1, y1, x2, y2):
+        return road_costs.segment_avg_cost(
+            x1, y1, x2, y2, terrain_img, vegetation_img,
+            ignore_water=params["ignore_water"],
+            ignore_trees=params["ignore_trees"],
+            rivers=rivers, fields=fields,
+            water_buffer=params["water_buffer"], forest_buffer=params["forest_buffer"],
+        )
+
+    reconnected, pruned = net.reconnect_or_prune(
+        params["min_component_len"], params["reconnect_dist"],
+        cost_fn=link_cost, max_cost=params["max_segment_cost"], keep=keep,
+    )
+    connectors = net.join_trunk(cost_fn=link_cost, max_cost=params["max_segment_cost"]) \
+        if params["connect_trunk"] else 0
+
+    # draw what survived, connectors included
+    for road_type, points in (net.roads[r] for r in range(len(net)) if net.alive[r]):
+        road_draw.line(points, fill=ROAD_STYLES[road_type]["color"] + (255,),
+                       width=widths[road_type], joint="curve")
+        road_length[road_type] += step * sum(
+            math.dist(a, b) for a, b in zip(points, points[1:]))
+    for r, (road_type, points) in enumerate(net.roads[:len(road_ids)]):
+        # stopped short of the map edge -> dead end
+        x, y = points[-1]
+        if net.alive[r] and _in_bounds(x, y, width, height, margin=12):
+            path_anchors.append((x, y))
+
+    # town lots fill the blocks the final network encloses
+    town_blocks, town_lots = [], []
+    if params["town_blocks"]:
+        town_blocks, town_lots = blocks.town_lots(
+            [net.roads[r] for r in range(len(net)) if net.alive[r]], rnd,
+            params["block_min_area"], params["block_max_area"],
+            params["lot_area"], params["lot_min_frontage"])
+        blocks.draw_lots(lots_img, town_lots, roads_img)
+    for b, poly, frontage in town_lots:
+        xs, ys = [p[0] for p in poly], [p[1] for p in poly]
+        lots.append((min(xs) * step, min(ys) * step, (max(xs) - min(xs)) * step, (max(ys) - min(ys)) * step))
+
+    alive = {i for r, i in enumerate(road_ids) if net.alive[r]}
+    lots_alpha = lots_img.getchannel("A")
+    for i, (lx, ly, lw, lh) in pending_lots:
+        if i not in alive:
+            continue
+        # inside a town block: the subdivision already covers it
+        if town_lots and lots_alpha.getpixel((min(width - 1, lx + lw // 2), min(height - 1, ly + lh // 2))):
+            continue
+        road_post.add_parking_lot_rect(lots_img, lx, ly, lw, lh)
+        lots.append((lx * step, ly * step, lw * step, lh * step))
+        path_anchors.append((lx + lw // 2, ly + lh // 2))
+
+    # dirt paths go under the roads
+    fields.set_roads(roads_img)
+    paths_img = dirt_paths.generate_paths(
+        width, height, road_conf, path_anchors,
+        terrain_img, vegetation_img, rivers, step, stats=stats, fields=fields,
+    )
+    paths_img.alpha_composite(roads_img)
+    roads_img = paths_img
 
     # post-process: potholes (on asphalt only)
     pothole_density = params["pothole_density"]
     if pothole_density > 0:
         road_post.apply_potholes_noise_jagged(roads_img, density=pothole_density)
 
-    # optional: dirt paths overlay (right now empty)
-    _ = dirt_paths.generate_paths(width, height, road_conf)
-
+    if stats is not None:
+        # road classes first, then the dirt paths generate_paths recorded
+        stats["road_length"] = {**road_length, **stats.get("road_length", {})}
+        stats["lots"] = lots
+        stats["town"] = {
+            "blocks": len(town_blocks),
+            "lots": [{"block": b,
+                      "polygon": [[round(x * step, 1), round(y * step, 1)] for x, y in poly],
+                      "area_px": round(abs(blocks.polygon_area(poly)) * step * step, 1),
+                      "frontage_px": round(frontage * step, 1)}
+                     for b, poly, frontage in town_lots],
+        }
+        stats["network"] = {
+            **net.report(),
+            "reconnected": reconnected,
+            "pruned": pruned,
+            "trunk_connectors": connectors,
+        }
     return roads_img, lots_img
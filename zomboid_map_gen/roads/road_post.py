@@ -6,8 +6,11 @@ Post-process passes for roads:
 """
 
 import random
+
+import numpy as np
 from PIL import Image, ImageDraw
-from ..utils import colors as base_colors
+
+from ..utils import colors as base_colors, jit, render_context
 
 # road-ish colors we allow potholes on
 ASPHALTS = {
@@ -37,9 +40,12 @@ def apply_potholes_noise_jagged(road_img: Image.Image, density=0.02, seed=None):
 
     w, h = road_img.size
     d = ImageDraw.Draw(road_img)
-    rnd = random.Random(seed) if seed is not None else random
+    rnd = random.Random(seed) if seed is not None else render_context.rng()
 
     num_attempts = int(w * h * density * 0.15)
+    if jit.ENABLED:
+        _potholes_kernel_loop(road_img, d, num_attempts, rnd)
+        return road_img
 
     for _ in range(num_attempts):
         x = rnd.randint(0, w - 1)
@@ -70,6 +76,96 @@ def apply_potholes_noise_jagged(road_img: Image.Image, density=0.02, seed=None):
     return road_img
 
 
+# asphalt class per pixel for the kernel: 0 none, 1 dark pothole, 2 light pothole
+_POTHOLE_COLORS = (None, DARK_POTHOLE, LIGHT_POTHOLE)
+# polygons collected per kernel call before they are drawn
+_POLY_BATCH = 4096
+
+
+_ASPHALT_KIND = {col: 2 if col == base_colors.VANILLA["light_asphalt"][:3] else 1 for col in ASPHALTS}
+
+
+def _asphalt_classes(arr: np.ndarray) -> np.ndarray:
+    rgb = arr[..., :3]
+    cls = np.zeros(arr.shape[:2], dtype=np.uint8)
+    for col, kind in _ASPHALT_KIND.items():
+        cls[np.all(rgb == col, axis=-1)] = kind
+    return cls
+
+
+@jit.kernel
+def _pothole_kernel(cls, touched, mt, pos, attempts, resume_x, resume_y, resume_kind,
+                    polys, npts, kinds):
+    """
+    The pothole loop over the asphalt classes, drawing the same random
+    numbers. Polygons are collected, not drawn, and cls is never updated:
+    their (padded) bounding boxes are flagged in touched instead, and an
+    attempt landing there returns early so the caller can draw the batch,
+    read that one pixel, and resume at (x, y) with its class.
+    Returns (attempts done, polygons collected, stop x, stop y).
+    """
+    h, w = cls.shape
+    done = 0
+    n = 0
+    while done < attempts:
+        if n == polys.shape[0]:
+            return done, n, -1, -1
+        if resume_x >= 0:
+            x, y, kind = resume_x, resume_y, resume_kind
+            resume_x = -1
+        else:
+            x = jit.randint(mt, pos, 0, w - 1)
+            y = jit.randint(mt, pos, 0, h - 1)
+            if touched[y, x]:
+                return done, n, x, y
+            kind = cls[y, x]
+        done += 1
+        if kind == 0:
+            continue
+        radius = jit.randint(mt, pos, 2, 4)
+        k = jit.randint(mt, pos, 4, 7)
+        x0, y0, x1, y1 = w, h, -1, -1
+        for j in range(k):
+            ox = x + jit.randint(mt, pos, -radius, radius)
+            oy = y + jit.randint(mt, pos, -radius, radius)
+            polys[n, j, 0] = ox
+            polys[n, j, 1] = oy
+            x0, y0, x1, y1 = min(x0, ox), min(y0, oy), max(x1, ox), max(y1, oy)
+        for ty in range(max(0, y0 - 1), min(h, y1 + 2)):
+            for tx in range(max(0, x0 - 1), min(w, x1 + 2)):
+                touched[ty, tx] = True
+        npts[n] = k
+        kinds[n] = kind
+        n += 1
+    return done, n, -1, -1
+
+
+def _potholes_kernel_loop(road_img, d, num_attempts, rnd):
+    """
+    apply_potholes_noise_jagged through _pothole_kernel: same polygons, in
+    the same order, drawn with PIL; rnd ends in the same state.
+    """
+    cls = _asphalt_classes(np.asarray(road_img))
+    touched = np.zeros(cls.shape, dtype=bool)
+    polys = np.empty((_POLY_BATCH, 7, 2), dtype=np.int64)
+    npts = np.empty(_POLY_BATCH, dtype=np.int64)
+    kinds = np.empty(_POLY_BATCH, dtype=np.uint8)
+    mt, pos, gauss = jit.mt_state(rnd)
+    w, h = road_img.size
+
+    left, resume = num_attempts, (-1, -1, 0)
+    while left > 0 or resume[0] >= 0:
+        done, n, sx, sy = _pothole_kernel(cls, touched, mt, pos, left, *resume, polys, npts, kinds)
+        left -= done
+        for pts, k, kind in zip(polys[:n].tolist(), npts[:n].tolist(), kinds[:n].tolist()):
+            d.polygon([tuple(p) for p in pts[:k]], fill=_POTHOLE_COLORS[kind] + (255,))
+        resume = (-1, -1, 0)
+        if sx >= 0:
+            base = road_img.getpixel((int(sx), int(sy)))[:3]
+            resume = (sx, sy, _ASPHALT_KIND.get(base, 0))
+    jit.set_mt_state(rnd, mt, pos, gauss)
+
+
 def add_parking_lot_rect(lots_img: Image.Image, x, y, w, h, color=(255, 0, 0, 255)):
     d = ImageDraw.Draw(lots_img)
     d.rectangle([x, y, x + w, y + h], fill=color)
@@ -0,0 +1,136 @@
+# zomboid_map_gen/seed_explorer.py
+"""
+Many seeds of the current settings at thumbnail size, for picking one.
+Run with:
+    python -m zomboid_map_gen.seed_explorer --config conf.json --count 64 --out seeds.png
+
+Each seed is rendered with core.render_layers at a coarse LOD step (the
+same path as the GUI's progressive previews) and composed like
+preview.png. The step is chosen so the whole batch costs about one full
+render: a step of s renders 1/s^2 of the pixels, so s^2 >= count, and
+coarser still if that would be larger than THUMB_PX across.
+
+Seeds render in worker processes (one per CPU, started fresh so a GUI's
+threads and module state are left alone) and come back as they finish.
+A thumbnail is exactly the LOD preview of that seed in any process:
+layer seeds come from utils.seeds.derive_seed (a CRC, not the
+per-process str hash) and the noise is normalized by the same
+whole-canvas range estimate as the full render (noise_utils.field_range).
+That estimate is also most of a thumbnail's cost, so the compiled noise
+kernel (utils/jit.py, with numba) matters most here.
+
+Roads follow the global random module, seeded with the map seed per
+thumbnail, so a sheet is reproducible; at full size the road walk differs
+in detail, the layout of land, water and forest is the same.
+"""
+
+import argparse
+import copy
+import math
+import multiprocessing
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from . import config as cfg
+from . import core
+from .export import writer
+from .utils import pan_cache
+
+# thumbnails are at most this many px across
+THUMB_PX = 128
+DEFAULT_COUNT = 64
+
+
+def thumb_step(conf: dict, count: int = DEFAULT_COUNT) -> int:
+    """Power-of-two LOD step for count thumbnails costing about one full render."""
+    canvas = conf.get("canvas", {})
+    size = canvas.get("cell_size", 300) * max(canvas.get("cells_x", 1), canvas.get("cells_y", 1))
+    step = 1
+    while step * step < count or size / step > THUMB_PX:
+        step *= 2
+    return step
+
+
+def pick_seeds(count: int, rnd=None) -> list[int]:
+    rnd = rnd or random
+    return [rnd.randrange(1 << 31) for _ in range(count)]
+
+
+def render_thumb(conf: dict, seed: int, step: int) -> Image.Image:
+    """Composed preview of conf with this seed at LOD step."""
+    conf = copy.deepcopy(conf)
+    conf["seed"] = seed
+    random.seed(seed)
+    terrain_img, veg_img, roads_img, _ = core.render_layers(conf, step)
+    # don't keep windows of seeds nobody will pan
+    pan_cache.clear_all()
+    if terrain_img is None:
+        return Image.new("RGBA", (1, 1), (0, 0, 0, 0))
+    return writer.compose_preview(terrain_img, veg_img, roads_img)
+
+
+def _thumb(conf, seed, step):
+    # worker side
+    return seed, render_thumb(conf, seed, step)
+
+
+def explore(conf: dict, seeds, step: int | None = None, workers: int | None = None):
+    """
+    Yield (seed, thumbnail) as each finishes. Closing the generator early
+    drops the seeds not yet started.
+    """
+    seeds = list(seeds)
+    step = step or thumb_step(conf, len(seeds))
+    workers = max(1, min(workers or os.cpu_count() or 1, len(seeds)))
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+    try:
+        futures = [pool.submit(_thumb, conf, seed, step) for seed in seeds]
+        for f in as_completed(futures):
+            yield f.result()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def contact_sheet(thumbs, columns: int = 8, label: bool = True) -> Image.Image:
+    """Grid of [(seed, image)] in the order given, seeds written underneath."""
+    thumbs = list(thumbs)
+    w = max(img.width for _, img in thumbs)
+    h = max(img.height for _, img in thumbs)
+    cap = 12 if label else 0
+    rows = math.ceil(len(thumbs) / columns)
+    sheet = Image.new("RGBA", (columns * (w + 4), rows * (h + cap + 4)), (18, 18, 18, 255))
+    draw = ImageDraw.Draw(sheet)
+    for i, (seed, img) in enumerate(thumbs):
+        x, y = (i % columns) * (w + 4) + 2, (i // columns) * (h + cap + 4) + 2
+        sheet.alpha_composite(img, (x, y))
+        if label:
+            draw.text((x, y + h), str(seed), fill=(255, 255, 255, 255))
+    return sheet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Render many seeds as a contact sheet")
+    parser.add_argument("--config", type=str, help="Path to config file (JSON).")
+    parser.add_argument("--count", type=int, default=DEFAULT_COUNT, help="Number of seeds.")
+    parser.add_argument("--seeds", type=int, nargs="+", help="Explicit seeds (instead of --count random ones).")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: one per CPU).")
+    parser.add_argument("--out", type=str, default="seeds.png", help="Contact sheet PNG.")
+    args = parser.parse_args()
+
+    conf = cfg.load_config(args.config) if args.config else cfg.default_config()
+    seeds = args.seeds or pick_seeds(args.count)
+    step = thumb_step(conf, len(seeds))
+    print(f"[ZOMBOID-MAP-GEN] Rendering {len(seeds)} seeds at 1:{step}")
+    thumbs = dict(explore(conf, seeds, step, args.workers))
+    sheet = contact_sheet((seed, thumbs[seed]) for seed in seeds)
+    Path(args.out).parent.mkdir(parents=True, exist_ok=True)
+    sheet.save(args.out)
+    print(f"[ZOMBOID-MAP-GEN] Contact sheet: {args.out}")
+
+
+if __name__ == "__main__":
+    main()
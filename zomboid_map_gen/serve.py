@@ -0,0 +1,255 @@
+# zomboid_map_gen/serve.py
+"""
+Local tile server: browse a generated map in the browser as a zoom pyramid.
+Run with:
+    python -m zomboid_map_gen.serve [--config conf.json] [--port 8000]
+
+Routes:
+    /                                   browser viewer (assets/web/viewer.html)
+    /info.json                          canvas size, tile size, zoom levels, layers
+    /tiles/<layer>/<z>/<x>/<y>.png      terrain | vegetation | roads | composite
+
+Tiles are rendered lazily (export.tiles) from the saved layers in the
+output dir, or straight from the generators with --source generator.
+Tiles of a saved layer are sent as cut (the layer's pyramid already is on
+disk); composites and generated tiles are cached on disk under a version
+key (config hash or layer mtimes), and older version dirs are removed
+whenever the version changes. The
+layer files and the config file are stat'ed again at most every RESTAT_S
+seconds; when a regen / extend changed them the source and version are
+rebuilt, so a changed map never serves stale tiles. Responses carry
+ETags; browsers revalidate and get 304s for tiles they already have, and
+the viewer picks up a new version from /info.json.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import shutil
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from . import config as cfg
+from .export import tiles
+
+VIEWER_HTML = Path(__file__).resolve().parent / "assets" / "web" / "viewer.html"
+SAVED_LAYERS = {"terrain": "terrain.png", "vegetation": "vegetation.png", "roads": "roads.png"}
+
+_TILE_RE = re.compile(r"^/tiles/(\w+)/(\d+)/(\d+)/(\d+)\.png$")
+# tile cache version dirs (build_source versions); the cut pyramids live next to them
+_VERSION_RE = re.compile(r"^[0-9a-f]{16}$")
+
+# seconds between checks of the layer / config files for changes
+RESTAT_S = 1.0
+
+
+def file_state(conf: dict, config_path=None) -> tuple:
+    """(path, mtime, size) of every saved layer and the config file; None for missing ones."""
+    out_dir = Path(conf.get("output_dir", "output"))
+    paths = [out_dir / fname for fname in SAVED_LAYERS.values()]
+    if config_path:
+        paths.append(Path(config_path))
+    state = []
+    for p in paths:
+        try:
+            st = p.stat()
+            state.append((str(p), st.st_mtime_ns, st.st_size))
+        except OSError:
+            state.append((str(p), None))
+    return tuple(state)
+
+
+def build_source(conf: dict, source: str = "auto"):
+    """
+    (TileSource, version) for the config. source: "saved" = layer PNGs in
+    output_dir, "generator" = render from the config (roads still come from
+    the saved layers), "auto" = saved if there are any, else generator.
+    """
+    out_dir = Path(conf.get("output_dir", "output"))
+    saved = {name: out_dir / fname for name, fname in SAVED_LAYERS.items()
+             if (out_dir / fname).exists()}
+    saved_tiles = tiles.ImageTiles(saved) if saved else None
+
+    if source == "auto":
+        source = "saved" if saved else "generator"
+    if source == "saved":
+        if saved_tiles is None:
+            raise FileNotFoundError(f"no saved layers in {out_dir}")
+        stamp = [(name, p.stat().st_mtime_ns, p.stat().st_size) for name, p in sorted(saved.items())]
+        tile_source = saved_tiles
+    else:
+        stamp = [json.dumps(conf, sort_keys=True, default=str)]
+        if saved_tiles is not None:
+            stamp += [(name, p.stat().st_mtime_ns) for name, p in sorted(saved.items())]
+        tile_source = tiles.GeneratorTiles(conf, saved=saved_tiles)
+
+    version = hashlib.sha1(repr((source, stamp)).encode()).hexdigest()[:16]
+    return tile_source, version
+
+
+class TileServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, conf: dict, source: str, cache_dir: Path | None, config_path=None):
+        super().__init__(address, TileHandler)
+        self.conf = conf
+        self.source_kind = source
+        self.config_path = config_path
+        self.cache_root = cache_dir
+        self._lock = threading.Lock()
+        self._files = file_state(conf, config_path)
+        self._checked = time.monotonic()
+        self._build()
+
+    def _build(self):
+        self.source, self.version = build_source(self.conf, self.source_kind)
+        self.cache_dir = self.cache_root / self.version if self.cache_root else None
+        if self.cache_root is not None and self.cache_root.is_dir():
+            # tiles of older versions are never asked for again
+            for old in self.cache_root.iterdir():
+                if old.name != self.version and _VERSION_RE.match(old.name) and old.is_dir():
+                    shutil.rmtree(old, ignore_errors=True)
+
+    def current(self):
+        """
+        (source, version, cache dir) for a request. Rebuilt when the layer
+        files or the config changed (checked at most every RESTAT_S); a
+        layer that can't be read yet, e.g. while it is being written, keeps
+        the old source until the next check.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now - self._checked >= RESTAT_S:
+                self._checked = now
+                files = file_state(self.conf, self.config_path)
+                if files != self._files:
+                    old = (self.conf, self.source, self.version, self.cache_dir)
+                    try:
+                        if self.config_path:
+                            self.conf = cfg.load_config(self.config_path)
+                        self._build()
+                        self._files = files
+                    except (OSError, ValueError) as e:
+                        self.conf, self.source, self.version, self.cache_dir = old
+                        print(f"[ZOMBOID-MAP-GEN] Map changed but can't be read yet: {e}")
+            return self.source, self.version, self.cache_dir
+
+    def tile_png(self, current, layer: str, z: int, x: int, y: int) -> bytes | None:
+        """
+        Encoded tile of current(): the cut file of a saved layer, else from
+        the disk cache when possible; None if out of range.
+        """
+        source, _, cache_dir = current
+        if isinstance(source, tiles.ImageTiles):
+            cut = source.tile_file(layer, z, x, y)
+            if cut is not None:
+                return cut.read_bytes()
+        path = None
+        if cache_dir is not None:
+            path = cache_dir / layer / str(z) / str(x) / f"{y}.png"
+            if path.exists():
+                return path.read_bytes()
+
+        img = source.tile(layer, z, x, y)
+        if img is None:
+            return None
+        buf = io.BytesIO()
+        img.save(buf, "PNG")
+        data = buf.getvalue()
+
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)  # atomic, concurrent requests may race here
+        return data
+
+    def info(self) -> dict:
+        src, version, _ = self.current()
+        return {
+            "width": src.width,
+            "height": src.height,
+            "tile_size": src.tile_size,
+            "max_zoom": src.max_zoom,
+            "layers": list(tiles.LAYERS),
+            "version": version,
+        }
+
+
+class TileHandler(BaseHTTPRequestHandler):
+    server: TileServer
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path in ("/", "/index.html"):
+            return self._send(200, VIEWER_HTML.read_bytes(), "text/html; charset=utf-8")
+        if path == "/info.json":
+            return self._send(200, json.dumps(self.server.info()).encode(), "application/json")
+
+        m = _TILE_RE.match(path)
+        if not m or m.group(1) not in tiles.LAYERS:
+            return self._send(404, b"not found", "text/plain")
+        layer = m.group(1)
+        z, x, y = (int(g) for g in m.groups()[1:])
+
+        current = self.server.current()
+        etag = f'"{current[1]}-{layer}-{z}-{x}-{y}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", None, etag)
+        data = self.server.tile_png(current, layer, z, x, y)
+        if data is None:
+            return self._send(404, b"no such tile", "text/plain")
+        self._send(200, data, "image/png", etag)
+
+    def _send(self, code, body: bytes, ctype, etag=None):
+        self.send_response(code)
+        if ctype:
+            self.send_header("Content-Type", ctype)
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if body:
+            self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a generated map as browsable tiles")
+    parser.add_argument("--config", type=str, help="Path to config file (JSON).")
+    parser.add_argument("--source", choices=("auto", "saved", "generator"), default="auto",
+                        help="Tiles from saved layers, the generators, or saved if present.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help="Disk tile cache (default: <output_dir>/tiles).")
+    parser.add_argument("--no-disk-cache", action="store_true")
+    args = parser.parse_args()
+
+    conf = cfg.load_config(args.config) if args.config else cfg.default_config()
+    cache_dir = None
+    if not args.no_disk_cache:
+        cache_dir = Path(args.cache_dir or Path(conf.get("output_dir", "output")) / "tiles")
+
+    server = TileServer((args.host, args.port), conf, args.source, cache_dir, args.config)
+    source = server.source
+    print(f"[ZOMBOID-MAP-GEN] Serving {source.width}x{source.height} map "
+          f"({source.max_zoom + 1} zoom levels) at http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -4,13 +4,41 @@ Terrain post-processing passes:
 - edge ragging: break up perfect outlines between terrain colors
 - speckle: add small patches of other vanilla colors to reduce sameness
 - erosion: push dirt/sand/dirt-grass into transition areas
-
-All passes stay within the user's vanilla color set.
+- apply_edge_ragging / apply_speckle / apply_erosion: pixel jitter, color
+  jitter and darkest-neighbor erosion
+- beach: sand within `width` px of water, from an exact distance field
+  (ragged outer edge)
+- merge_small_regions: fold specks below a minimum area into the
+  surrounding class, by nearest vanilla color so jittered pixels count as
+  the class they came from (tiled with a halo of twice the area,
+  whole-canvas for big areas)
+
+Every pass is registered by name (see register_pass) and can be listed in
+terrain.postprocess.passes, in order, with its parameters:
+
+    "postprocess": {"passes": [
+        {"name": "edge_ragging", "strength": 0.6},
+        {"name": "erosion", "strength": 0.6},
+        {"name": "apply_erosion", "radius": 3},
+    ]}
+
+Without a "passes" list the older edge_ragging/speckle/erosion toggles pick
+the apply_* passes as before. run_passes fuses consecutive local passes
+into one traversal over tiles (each tile read once with enough halo for the
+whole chain), so adding a pass doesn't add another full-canvas copy. A
+random pass ends the chain before the next pass that reads a halo: its
+draws in a tile's halo are not the ones the neighbor tile made there.
+
+Edge ragging and erosion only touch pixels on a border between terrain
+classes, so they work on a boundary band found once in bulk (see
+boundary_band / grow_band) and scale with edge length, not map area.
 """
 
+import numpy as np
 from PIL import Image
-import random
-from ..utils import colors as base_colors
+
+from ..utils import colors as base_colors, seeds as seed_utils, regions, jit, render_context
+from ..utils.distance import edt
 
 # unpack palette
 WATER        = base_colors.VANILLA["water"][:3]
@@ -22,218 +50,625 @@ DIRT_GRASS   = base_colors.VANILLA["dirt_grass"][:3]
 SAND         = base_colors.VANILLA["sand"][:3]
 GRAVEL_DIRT  = base_colors.VANILLA["gravel_dirt"][:3]
 
+# don't speckle water, but we can speckle grass/dirt/sand
+SPECKLE_CANDIDATES = [
+    DARK_GRASS,
+    MED_GRASS,
+    LIGHT_GRASS,
+    DIRT,
+    DIRT_GRASS,
+    SAND,
+    GRAVEL_DIRT,
+]
 
-def _get_neighbors(img, x, y):
-    w, h = img.size
-    neigh = []
-    if x > 0:
-        neigh.append(img.getpixel((x - 1, y))[:3])
-    if x < w - 1:
-        neigh.append(img.getpixel((x + 1, y))[:3])
-    if y > 0:
-        neigh.append(img.getpixel((x, y - 1))[:3])
-    if y < h - 1:
-        neigh.append(img.getpixel((x, y + 1))[:3])
-    return neigh
+# terrain classes, for passes that work on nearest-palette classes
+PALETTE = np.array(list(base_colors.VANILLA.values()), dtype=np.uint8)
 
+# tile edge for the fused executor
+TILE = 512
 
-def _color_dist(c1, c2):
-    return abs(c1[0] - c2[0]) + abs(c1[1] - c2[1]) + abs(c1[2] - c2[2])
+# name -> (fn, halo, uses_band, draws); see register_pass
+PASSES = {}
 
 
-def edge_ragging(img: Image.Image, strength: float = 0.5) -> Image.Image:
+def register_pass(name: str, halo=0, uses_band: bool = False, draws: bool = False):
     """
-    Break up clean edges by letting neighbor colors invade.
+    Register fn(arr, rng, ctx, **params) -> arr as a named pass.
+
+    arr is an RGBA tile (edited in place or replaced); pixels within `halo`
+    of a tile edge may come out wrong and are cropped by the executor, so
+    halo must cover how far the pass reads. halo may be a function of the
+    params, or None for a pass that needs the whole canvas at once (it then
+    runs on its own instead of being fused). ctx is per-tile scratch shared
+    by consecutive passes; uses_band passes keep the boundary band in it.
+    draws marks a pass that uses rng: its output in the halo is not what
+    the neighbor tile computes there, so no later pass may read it.
     """
-    w, h = img.size
-    src = img
-    out = img.copy()
-    px = out.load()
+    def deco(fn):
+        PASSES[name] = (fn, halo, uses_band, draws)
+        return fn
+    return deco
 
-    for y in range(h):
-        for x in range(w):
-            here = src.getpixel((x, y))[:3]
-            neigh = _get_neighbors(src, x, y)
-            # boundary: neighboring pixel is very different
-            boundary_neighbors = [n for n in neigh if _color_dist(here, n) > 25]
-            if not boundary_neighbors:
-                continue
 
-            if random.random() < strength * 0.6:
-                new_col = random.choice(boundary_neighbors)
-                px[x, y] = new_col + (255,)
+# 4-neighborhood offsets (dy, dx)
+_N4 = ((0, -1), (0, 1), (-1, 0), (1, 0))
 
-    return out
 
+def _dist(a, b):
+    # L1 color distance over the last axis (int arrays)
+    return np.abs(a - b).sum(axis=-1)
 
-def speckle(img: Image.Image, density: float = 0.01) -> Image.Image:
+
+def palette_classes(arr: np.ndarray) -> np.ndarray:
+    """Index into PALETTE of the nearest color (L1, first on ties) for every pixel."""
+    rgb = arr[..., :3].astype(np.int16)
+    best = np.full(rgb.shape[:2], np.iinfo(np.int16).max, dtype=np.int16)
+    classes = np.zeros(rgb.shape[:2], dtype=np.uint8)
+    for i, col in enumerate(PALETTE[:, :3].astype(np.int16)):
+        d = np.abs(rgb - col).sum(axis=-1, dtype=np.int16)
+        closer = d < best
+        best[closer] = d[closer]
+        classes[closer] = i
+    return classes
+
+
+def boundary_band(arr: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
     """
-    Sprinkle small patches of nearby vanilla colors.
+    (ys, xs) of every pixel on a border between terrain colors, found in one
+    bulk pass. Only these pixels can change under edge ragging / erosion, so
+    the randomized logic runs over this sparse set instead of the whole map.
+    Also picks up off-palette near-water pixels, which erosion may turn sandy.
     """
-    w, h = img.size
-    out = img.copy()
-    px = out.load()
-
-    # don't speckle water, but we can speckle grass/dirt/sand
-    candidates = [
-        DARK_GRASS,
-        MED_GRASS,
-        LIGHT_GRASS,
-        DIRT,
-        DIRT_GRASS,
-        SAND,
-        GRAVEL_DIRT,
-    ]
-
-    total = w * h
-    target = int(total * density)
-
-    for _ in range(target):
-        x = random.randint(0, w - 1)
-        y = random.randint(0, h - 1)
-        current = px[x, y][:3]
-
-        if current == WATER:
-            continue
+    rgb = arr[..., :3].astype(np.int16)
+    h, w = rgb.shape[:2]
+    mask = np.zeros((h, w), dtype=bool)
 
-        # choose a different but related color
-        choices = [c for c in candidates if c != current]
-        if not choices:
-            continue
-        new_col = random.choice(choices)
-        px[x, y] = new_col + (255,)
+    diff_h = np.any(rgb[:, 1:] != rgb[:, :-1], axis=-1)
+    diff_v = np.any(rgb[1:] != rgb[:-1], axis=-1)
+    mask[:, 1:] |= diff_h
+    mask[:, :-1] |= diff_h
+    mask[1:] |= diff_v
+    mask[:-1] |= diff_v
 
-    return out
+    water = np.array(WATER, dtype=np.int16)
+    mask |= (_dist(rgb, water) < 12) & np.any(rgb != water, axis=-1)
+    return np.nonzero(mask)
 
 
-def erosion(img: Image.Image, strength: float = 0.5) -> Image.Image:
+def grow_band(band, shape, steps: int = 1) -> tuple[np.ndarray, np.ndarray]:
     """
-    Soft erosion:
-    - near water -> more sand
-    - mixed terrain edges -> dirt or dirt grass
+    Band plus its 4-neighbors, `steps` times. A pass only rewrites band
+    pixels with a neighbor's color, so the borders of its output lie inside
+    the grown band: the next pass can reuse it instead of rescanning.
     """
-    w, h = img.size
-    src = img
-    out = img.copy()
-    px = out.load()
+    h, w = shape[:2]
+    ys, xs = band
+    for _ in range(steps):
+        ys = np.concatenate([ys] + [ys + dy for dy, _ in _N4])
+        xs = np.concatenate([xs] + [xs + dx for _, dx in _N4])
+        ok = (ys >= 0) & (xs >= 0) & (ys < h) & (xs < w)
+        flat = np.unique(ys[ok] * w + xs[ok])
+        ys, xs = np.divmod(flat, w)
+    return ys, xs
+
+
+def _band_neighbors(rgb, ys, xs):
+    """
+    Neighbor colors (4, n, 3) and in-bounds flags (4, n) for band pixels.
+    Missing neighbors (map edge) are flagged, like the old per-pixel code
+    that simply skipped them.
+    """
+    h, w = rgb.shape[:2]
+    cols = []
+    valid = []
+    for dy, dx in _N4:
+        ny = ys + dy
+        nx = xs + dx
+        ok = (ny >= 0) & (nx >= 0) & (ny < h) & (nx < w)
+        cols.append(rgb[np.clip(ny, 0, h - 1), np.clip(nx, 0, w - 1)])
+        valid.append(ok)
+    return np.stack(cols), np.stack(valid)
+
+
+def _edge_ragging_arr(arr, band, strength, rng):
+    """In-place edge ragging over band pixels of an RGBA array."""
+    ys, xs = band
+    if ys.size == 0:
+        return arr
+    rgb = arr[..., :3].astype(np.int16)
+    here = rgb[ys, xs]
+    neigh, valid = _band_neighbors(rgb, ys, xs)
+
+    # boundary: neighboring pixel is very different
+    differs = valid & (_dist(neigh, here[None]) > 25)
+    count = differs.sum(axis=0)
+    pick = (count > 0) & (rng.random(ys.size) < strength * 0.6)
+    if not pick.any():
+        return arr
+
+    # random choice among the differing neighbors
+    nth = (rng.random(ys.size) * count).astype(np.int64)
+    choice = np.argmax(np.cumsum(differs, axis=0) > nth[None], axis=0)
+    sel = np.flatnonzero(pick)
+    new_col = neigh[choice[sel], sel]
+
+    arr[ys[sel], xs[sel], :3] = new_col
+    arr[ys[sel], xs[sel], 3] = 255
+    return arr
+
+
+def _erosion_arr(arr, band, strength, rng):
+    """In-place soft erosion over band pixels of an RGBA array."""
+    ys, xs = band
+    if ys.size == 0:
+        return arr
+    if jit.ENABLED:
+        # same draws, in the same order, as below
+        draws = [rng.random(ys.size) for _ in range(3)]
+        _erosion_kernel(arr, ys.astype(np.int64), xs.astype(np.int64), *draws, float(strength),
+                        np.array(WATER, dtype=np.int64), np.array([SAND, DIRT, DIRT_GRASS], dtype=np.uint8))
+        return arr
+    src = arr[..., :3].astype(np.int16)
+    here = src[ys, xs]
+    neigh, valid = _band_neighbors(src, ys, xs)
+    water = np.array(WATER, dtype=np.int16)
+
+    # near water -> sand
+    near_water = np.any(valid & (_dist(neigh, water) < 12), axis=0)
+    is_water = np.all(here == water, axis=-1)
+    sand = near_water & ~is_water & (rng.random(ys.size) < strength * 0.75)
+
+    # mixed edges -> dirt-ish (50/50 dirt vs dirt grass)
+    mixed = np.any(valid & (_dist(neigh, here[None]) > 35), axis=0)
+    dirtish = ~sand & mixed & (rng.random(ys.size) < strength * 0.5)
+    use_dirt = rng.random(ys.size) < 0.5
+
+    for cond, col in (
+        (sand, SAND),
+        (dirtish & use_dirt, DIRT),
+        (dirtish & ~use_dirt, DIRT_GRASS),
+    ):
+        arr[ys[cond], xs[cond]] = col + (255,)
+    return arr
+
+
+@jit.kernel
+def _erosion_kernel(arr, ys, xs, r_sand, r_dirt, r_use, strength, water, cols):
+    """_erosion_arr as one loop: decide every band pixel first, then write."""
+    h, w = arr.shape[:2]
+    n = ys.size
+    pick = np.zeros(n, dtype=np.int8)  # 0 keep, 1 sand, 2 dirt, 3 dirt grass
+    for i in range(n):
+        y, x = ys[i], xs[i]
+        near_water = False
+        mixed = False
+        for k in range(4):
+            ny = y + (0, 0, -1, 1)[k]
+            nx = x + (-1, 1, 0, 0)[k]
+            if ny < 0 or nx < 0 or ny >= h or nx >= w:
+                continue
+            dw = 0
+            dh = 0
+            for c in range(3):
+                v = np.int64(arr[ny, nx, c])
+                dw += abs(v - water[c])
+                dh += abs(v - np.int64(arr[y, x, c]))
+            near_water |= dw < 12
+            mixed |= dh > 35
+        is_water = arr[y, x, 0] == water[0] and arr[y, x, 1] == water[1] and arr[y, x, 2] == water[2]
+        if near_water and not is_water and r_sand[i] < strength * 0.75:
+            pick[i] = 1
+        elif mixed and r_dirt[i] < strength * 0.5:
+            pick[i] = 2 if r_use[i] < 0.5 else 3
+    for i in range(n):
+        if pick[i]:
+            for c in range(3):
+                arr[ys[i], xs[i], c] = cols[pick[i] - 1, c]
+            arr[ys[i], xs[i], 3] = 255
+    return arr
+
+
+def _min_filter_1d(a: np.ndarray, radius: int, axis: int) -> np.ndarray:
+    """
+    Sliding-window min of width 2r+1 along one axis (van Herk / Gil-Werman).
+    The axis is cut into blocks of the window size; a window always spans at
+    most two blocks, so min(suffix-min of one, prefix-min of the next) answers
+    it. About 3 comparisons per element, whatever the radius.
+    """
+    if radius <= 0:
+        return a
+    k = 2 * radius + 1
+    a = np.moveaxis(a, axis, -1)
+    n = a.shape[-1]
+    m = -(-(n + 2 * radius) // k) * k
+
+    # pad with the max value so out-of-range cells never win
+    padded = np.full(a.shape[:-1] + (m,), np.iinfo(a.dtype).max, dtype=a.dtype)
+    padded[..., radius:radius + n] = a
+    blocks = padded.reshape(a.shape[:-1] + (m // k, k))
+    prefix = np.minimum.accumulate(blocks, axis=-1).reshape(padded.shape)
+    suffix = np.minimum.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(padded.shape)
+
+    out = np.minimum(suffix[..., :n], prefix[..., k - 1:k - 1 + n])
+    return np.moveaxis(out, -1, axis)
 
-    for y in range(h):
-        for x in range(w):
-            here = src.getpixel((x, y))[:3]
-            neigh = _get_neighbors(src, x, y)
-
-            # near water -> sand
-            if any(_color_dist(n, WATER) < 12 for n in neigh):
-                if here != WATER and random.random() < strength * 0.75:
-                    px[x, y] = SAND + (255,)
-                    continue
-
-            # mixed edges -> dirt-ish
-            if any(_color_dist(here, n) > 35 for n in neigh):
-                if random.random() < strength * 0.5:
-                    # 50/50 dirt vs dirt grass
-                    if random.random() < 0.5:
-                        px[x, y] = DIRT + (255,)
-                    else:
-                        px[x, y] = DIRT_GRASS + (255,)
 
+def _darkest_arr(arr: np.ndarray, radius: int) -> np.ndarray:
+    """
+    Darkest color (by luminance) in the (2r+1)² window around each pixel.
+    Luminance is precomputed once as the integer r*299 + g*587 + b*114,
+    packed above the RGBA bytes into one uint64 key, so a separable min
+    filter over the keys returns the winning color directly.
+    """
+    if jit.ENABLED:
+        return _darkest_kernel(arr, int(radius))
+    c = arr.astype(np.uint64)
+    lum = c[..., 0] * 299 + c[..., 1] * 587 + c[..., 2] * 114
+    key = (lum << np.uint64(32)) | (c[..., 0] << np.uint64(24)) | (c[..., 1] << np.uint64(16)) \
+        | (c[..., 2] << np.uint64(8)) | c[..., 3]
+
+    key = _min_filter_1d(_min_filter_1d(key, radius, axis=1), radius, axis=0)
+
+    out = np.empty_like(arr)
+    for i, shift in enumerate((24, 16, 8, 0)):
+        out[..., i] = (key >> np.uint64(shift)) & np.uint64(0xFF)
     return out
 
-def apply_edge_ragging(img, amount: int = 1, probability: float = 0.35) -> Image.Image:
-    w, h = img.size
-    src = img.load()
-    out = img.copy()
-    dst = out.load()
 
+@jit.kernel
+def _min_rows_kernel(key, radius):
+    """_min_filter_1d along axis 1, same blocks: suffix / prefix minima per row."""
+    h, w = key.shape
+    k = 2 * radius + 1
+    m = -(-(w + 2 * radius) // k) * k
+    big = np.int64(0x7FFFFFFFFFFFFFFF)
+    pre = np.empty(m, dtype=np.int64)
+    suf = np.empty(m, dtype=np.int64)
+    out = np.empty_like(key)
     for y in range(h):
+        for i in range(m):
+            x = i - radius
+            v = key[y, x] if 0 <= x < w else big
+            pre[i] = v if i % k == 0 else min(pre[i - 1], v)
+        for i in range(m - 1, -1, -1):
+            x = i - radius
+            v = key[y, x] if 0 <= x < w else big
+            suf[i] = v if i % k == k - 1 else min(suf[i + 1], v)
         for x in range(w):
-            if random.random() < probability:
-                jx = x + random.randint(-amount, amount)
-                jy = y + random.randint(-amount, amount)
+            out[y, x] = min(suf[x], pre[x + k - 1])
+    return out
+
 
-                # clamp
-                if jx < 0: jx = 0
-                if jx >= w: jx = w - 1
-                if jy < 0: jy = 0
-                if jy >= h: jy = h - 1
+@jit.kernel
+def _darkest_kernel(arr, radius):
+    """_darkest_arr over int64 keys (same order), O(1) per pixel whatever the radius."""
+    h, w = arr.shape[:2]
+    key = np.empty((h, w), dtype=np.int64)
+    for y in range(h):
+        for x in range(w):
+            r, g, b, a = np.int64(arr[y, x, 0]), np.int64(arr[y, x, 1]), np.int64(arr[y, x, 2]), np.int64(arr[y, x, 3])
+            key[y, x] = ((r * 299 + g * 587 + b * 114) << 32) | (r << 24) | (g << 16) | (b << 8) | a
+    rows = _min_rows_kernel(key, radius)
+    key = _min_rows_kernel(np.ascontiguousarray(rows.T), radius).T
+    out = np.empty_like(arr)
+    for y in range(h):
+        for x in range(w):
+            m = key[y, x]
+            out[y, x, 0] = (m >> 24) & 0xFF
+            out[y, x, 1] = (m >> 16) & 0xFF
+            out[y, x, 2] = (m >> 8) & 0xFF
+            out[y, x, 3] = m & 0xFF
+    return out
 
-                dst[x, y] = src[jx, jy]
-            else:
-                dst[x, y] = src[x, y]
 
+def _tile_band(arr, ctx):
+    band = ctx.get("band")
+    if band is None:
+        band = boundary_band(arr)
+    return band
+
+
+@register_pass("edge_ragging", halo=1, uses_band=True, draws=True)
+def _edge_ragging_pass(arr, rng, ctx, strength=0.5):
+    band = _tile_band(arr, ctx)
+    _edge_ragging_arr(arr, band, strength, rng)
+    # ragging only copies neighbor colors inside the band
+    ctx["band"] = grow_band(band, arr.shape)
+    return arr
+
+
+@register_pass("erosion", halo=1, uses_band=True, draws=True)
+def _erosion_pass(arr, rng, ctx, strength=0.5):
+    band = _tile_band(arr, ctx)
+    _erosion_arr(arr, band, strength, rng)
+    ctx["band"] = grow_band(band, arr.shape)
+    return arr
+
+
+@register_pass("speckle", draws=True)
+def _speckle_pass(arr, rng, ctx, density=0.01):
+    hit = rng.random(arr.shape[:2]) < density
+    ys, xs = np.nonzero(hit)
+    if ys.size == 0:
+        return arr
+    cand = np.array(SPECKLE_CANDIDATES, dtype=np.uint8)
+    current = arr[ys, xs, :3]
+    keep = ~np.all(current == WATER, axis=-1)
+    ys, xs, current = ys[keep], xs[keep], current[keep]
+
+    # choose a different but related color
+    same = np.all(current[:, None] == cand[None], axis=-1)
+    has_cur = same.any(axis=1)
+    cur_idx = np.argmax(same, axis=1)
+    pick = rng.integers(0, len(cand) - has_cur.astype(np.int64))
+    pick += (has_cur & (pick >= cur_idx)).astype(np.int64)
+
+    arr[ys, xs, :3] = cand[pick]
+    arr[ys, xs, 3] = 255
+    return arr
+
+
+@register_pass("beach", halo=lambda p: int(np.ceil(p.get("width", 3))) + 1, draws=True)
+def _beach_pass(arr, rng, ctx, width=3, ragged=0.4):
+    """Land within width px of water turns to sand; the outer 'ragged' share is random."""
+    rgb = arr[..., :3].astype(np.int16)
+    # wide tolerance: speckle-jittered water is still water, not a sand speck
+    water = _dist(rgb, np.array(WATER, dtype=np.int16)) < 60
+    if not water.any():
+        return arr
+    d = edt(water)
+    reach = width * (1.0 - ragged * rng.random(d.shape))
+    sand = ~water & (d <= reach)
+    arr[sand] = SAND + (255,)
+    return arr
+
+
+@register_pass("apply_edge_ragging", halo=lambda p: int(p.get("amount", 1)), draws=True)
+def _apply_edge_ragging_pass(arr, rng, ctx, amount=1, probability=0.35):
+    h, w = arr.shape[:2]
+    hit = rng.random((h, w)) < probability
+    ys, xs = np.nonzero(hit)
+    jy = np.clip(ys + rng.integers(-amount, amount + 1, ys.size), 0, h - 1)
+    jx = np.clip(xs + rng.integers(-amount, amount + 1, xs.size), 0, w - 1)
+    out = arr.copy()
+    out[ys, xs] = arr[jy, jx]
     return out
 
 
-def apply_speckle(img, density: float = 0.01, strength: int = 18) -> Image.Image:
-    w, h = img.size
-    out = img.copy()
-    px = out.load()
+@register_pass("apply_speckle", draws=True)
+def _apply_speckle_pass(arr, rng, ctx, density=0.01, strength=18):
+    hit = rng.random(arr.shape[:2]) < density
+    ys, xs = np.nonzero(hit)
+    jitter = rng.integers(-strength, strength + 1, (ys.size, 3))
+    arr[ys, xs, :3] = np.clip(arr[ys, xs, :3].astype(np.int16) + jitter, 0, 255)
+    return arr
 
-    for y in range(h):
-        for x in range(w):
-            if random.random() < density:
-                r, g, b, *rest = px[x, y]
-                dr = random.randint(-strength, strength)
-                dg = random.randint(-strength, strength)
-                db = random.randint(-strength, strength)
-                r = max(0, min(255, r + dr))
-                g = max(0, min(255, g + dg))
-                b = max(0, min(255, b + db))
-                if rest:
-                    px[x, y] = (r, g, b, rest[0])
-                else:
-                    px[x, y] = (r, g, b)
-    return out
 
+@register_pass("apply_erosion", halo=lambda p: int(p.get("radius", 1)))
+def _apply_erosion_pass(arr, rng, ctx, radius=1):
+    return _darkest_arr(arr, int(radius))
 
-def apply_erosion(img, radius: int = 1) -> Image.Image:
-    w, h = img.size
-    src = img.load()
-    out = img.copy()
-    dst = out.load()
 
-    for y in range(h):
-        for x in range(w):
-            base = src[x, y]
-            darkest = base
-            darkest_lum = _lum(base)
+def _region_halo(params):
+    # a region under min_area pixels spans fewer than min_area pixels, so twice
+    # that around a tile holds every small region touching it and its neighbors
+    halo = 2 * int(params.get("min_area", 16))
+    return halo if halo <= TILE // 2 else None
 
-            for ny in range(max(0, y - radius), min(h, y + radius + 1)):
-                for nx in range(max(0, x - radius), min(w, x + radius + 1)):
-                    c = src[nx, ny]
-                    l = _lum(c)
-                    if l < darkest_lum:
-                        darkest_lum = l
-                        darkest = c
 
-            dst[x, y] = darkest
+@register_pass("merge_small_regions", halo=_region_halo)
+def _merge_small_regions_pass(arr, rng, ctx, min_area=16):
+    # regions of nearest-palette classes: a jittered pixel belongs to the
+    # class it came from instead of being a region of its own color
+    classes = palette_classes(arr)
+    merged = regions.merge_small_regions(classes, int(min_area))
+    # only folded pixels change, to their new class's vanilla color
+    moved = merged != classes
+    arr[moved] = PALETTE[merged[moved]]
+    return arr
 
-    return out
 
+def _resolve(specs):
+    """[(fn, params, halo | None, uses_band, draws)] for a list of pass specs."""
+    steps = []
+    for spec in specs:
+        params = {k: v for k, v in spec.items() if k not in ("name", "enabled")}
+        name = spec.get("name")
+        if name not in PASSES:
+            raise ValueError(f"unknown postprocess pass: {name!r}")
+        fn, halo, uses_band, draws = PASSES[name]
+        if callable(halo):
+            halo = halo(params)
+        steps.append((fn, params, halo, uses_band, draws))
+    return steps
 
-def apply_all(img: Image.Image, conf: dict) -> Image.Image:
+
+def local_specs(specs: list) -> list:
+    """The specs that only read a bounded neighborhood (halo not None)."""
+    return [spec for spec, step in zip(specs, _resolve(specs)) if step[2] is not None]
+
+
+def pipeline_halo(specs: list):
     """
-    Apply whatever the GUI/config says is enabled.
-    Assumes conf["terrain"]["postprocess"] exists, but falls back safely.
+    How far (px) the whole pipeline reads around a pixel, or None if some
+    pass needs the whole canvas. A window rendered with this much margin
+    postprocesses the same way as the full canvas would there.
     """
-    terrain_conf = conf.get("terrain", {})
-    pp_conf = terrain_conf.get("postprocess", {})
+    halos = [step[2] for step in _resolve(specs)]
+    return None if None in halos else sum(halos)
 
-    edge_on = pp_conf.get("edge_ragging", True)
-    speckle_on = pp_conf.get("speckle", True)
-    erosion_on = pp_conf.get("erosion", True)
 
-    out = img
-    if edge_on:
-        out = apply_edge_ragging(out)
-    if speckle_on:
-        out = apply_speckle(out)
-    if erosion_on:
-        out = apply_erosion(out)
+def _run_chain(chain, tile, rng, ctx):
+    for fn, params, _halo, uses_band, _draws in chain:
+        if not uses_band:
+            ctx.pop("band", None)
+        tile = fn(tile, rng, ctx, **params)
+    return tile
+
+
+def _run_fused(src, dst, chain, rng, tile_size, band=None, keep_band=False):
+    """
+    One traversal over tiles of src running the whole chain into dst.
+    band: canvas band of src for a chain starting with a uses_band pass.
+    keep_band: return the canvas band the chain's last pass left (the union
+    of the tiles' bands, halos included), else None.
+    """
+    h, w = src.shape[:2]
+    halo = sum(step[2] for step in chain)
+    if band is not None:
+        # sorted by row (grow_band / boundary_band order): rows slice by searchsorted
+        band_ys, band_xs = band
+    kept = []
+    for ty in range(0, h, tile_size):
+        render_context.check()
+        for tx in range(0, w, tile_size):
+            ty1 = min(h, ty + tile_size)
+            tx1 = min(w, tx + tile_size)
+            y0, x0 = max(0, ty - halo), max(0, tx - halo)
+            y1, x1 = min(h, ty1 + halo), min(w, tx1 + halo)
+            ctx = {}
+            if band is not None:
+                i0, i1 = np.searchsorted(band_ys, (y0, y1))
+                ys, xs = band_ys[i0:i1], band_xs[i0:i1]
+                inside = (xs >= x0) & (xs < x1)
+                ctx["band"] = (ys[inside] - y0, xs[inside] - x0)
+            tile = _run_chain(chain, src[y0:y1, x0:x1].copy(), rng, ctx)
+            dst[ty:ty1, tx:tx1] = tile[ty - y0:ty1 - y0, tx - x0:tx1 - x0]
+            if keep_band and "band" in ctx:
+                ys, xs = ctx["band"]
+                kept.append((ys + y0) * w + xs + x0)
+    if not keep_band or not kept:
+        return None
+    return np.divmod(np.unique(np.concatenate(kept)), w)
+
+
+def run_passes(img: Image.Image, specs: list, tile_size: int = TILE) -> Image.Image:
+    """
+    Run pass specs ({"name": ..., **params}) in order.
+
+    Consecutive local passes are fused: each tile is read once with the
+    summed halo, every pass runs on that small buffer, and only the tile
+    interior is written out. Whole-canvas passes (halo None) split the chain
+    and run in place, and so does a pass with a halo after a random one
+    (see register_pass). Two canvas buffers at most, however many passes.
+    A boundary band left by the pass before a split is handed across it, so
+    edge_ragging then erosion still find the band once.
+    """
+    steps = _resolve(specs)
+    if not steps:
+        return img
+
+    rng = seed_utils.numpy_rng()
+    src = np.array(img.convert("RGBA"))
+    dst = None
+
+    chain = []
+    drawn = False  # a random pass is in the chain
+    band = None    # canvas band of src, left by the previous chain
+    for step in steps + [None]:
+        local = step is not None and step[2] is not None
+        if local and not (drawn and step[2] > 0):
+            chain.append(step)
+            drawn |= step[4]
+            continue
+        keep_band = step is not None and step[3]
+        if chain:
+            if dst is None:
+                dst = np.empty_like(src)
+            band = _run_fused(src, dst, chain, rng, tile_size,
+                              band if chain[0][3] else None, keep_band)
+            src, dst = dst, src
+            chain, drawn = [], False
+        if local:
+            chain, drawn = [step], step[4]
+        elif step is not None:
+            ctx = {"band": band} if band is not None and step[3] else {}
+            src = _run_chain([step], src, rng, ctx)
+            band = ctx.get("band") if keep_band else None
+
+    return Image.fromarray(src, "RGBA")
+
+
+def edge_ragging(img: Image.Image, strength: float = 0.5, band=None) -> Image.Image:
+    """
+    Break up clean edges by letting neighbor colors invade.
+    band: precomputed boundary_band(...) to share between passes.
+    """
+    arr = np.array(img.convert("RGBA"))
+    if band is None:
+        band = boundary_band(arr)
+    _edge_ragging_arr(arr, band, strength, seed_utils.numpy_rng())
+    return Image.fromarray(arr, "RGBA")
+
+
+def speckle(img: Image.Image, density: float = 0.01) -> Image.Image:
+    """
+    Sprinkle small patches of nearby vanilla colors.
+    """
+    return run_passes(img, [{"name": "speckle", "density": density}])
 
-    return out
 
+def erosion(img: Image.Image, strength: float = 0.5, band=None) -> Image.Image:
+    """
+    Soft erosion:
+    - near water -> more sand
+    - mixed terrain edges -> dirt or dirt grass
+    band: precomputed boundary_band(...), e.g. grow_band() of the band the
+    previous edge_ragging used.
+    """
+    arr = np.array(img.convert("RGBA"))
+    if band is None:
+        band = boundary_band(arr)
+    _erosion_arr(arr, band, strength, seed_utils.numpy_rng())
+    return Image.fromarray(arr, "RGBA")
+
+
+def apply_edge_ragging(img, amount: int = 1, probability: float = 0.35) -> Image.Image:
+    return run_passes(img, [{"name": "apply_edge_ragging", "amount": amount, "probability": probability}])
+
+
+def apply_speckle(img, density: float = 0.01, strength: int = 18) -> Image.Image:
+    return run_passes(img, [{"name": "apply_speckle", "density": density, "strength": strength}])
+
+
+def apply_erosion(img, radius: int = 1) -> Image.Image:
+    """
+    Morphological erosion: every pixel takes the darkest color within
+    `radius`. Cost per pixel does not depend on the radius.
+    """
+    return run_passes(img, [{"name": "apply_erosion", "radius": radius}])
+
+
+def pipeline_from_conf(conf: dict) -> list:
+    """
+    Ordered pass specs from terrain.postprocess: the "passes" list if given,
+    otherwise the older edge_ragging/speckle/erosion toggles.
+    """
+    pp_conf = conf.get("terrain", {}).get("postprocess", {})
+
+    if "passes" in pp_conf:
+        return [p for p in pp_conf["passes"] if p.get("enabled", True)]
+
+    specs = []
+    if pp_conf.get("edge_ragging", True):
+        specs.append({"name": "apply_edge_ragging"})
+    if pp_conf.get("speckle", True):
+        specs.append({"name": "apply_speckle"})
+    if pp_conf.get("erosion", True):
+        specs.append({"name": "apply_erosion", "radius": pp_conf.get("erosion_radius", 1)})
+    # last, so the darkest-neighbor erosion doesn't eat into the sand
+    if pp_conf.get("beach_width", 0) > 0:
+        specs.append({"name": "beach", "width": pp_conf["beach_width"]})
+    # after everything that scatters pixels, so no speck under min_area survives
+    if pp_conf.get("min_region_area", 0) > 0:
+        specs.append({"name": "merge_small_regions", "min_area": pp_conf["min_region_area"]})
+    return specs
+
+
+def apply_all(img: Image.Image, conf: dict) -> Image.Image:
+    """
+    Apply whatever the GUI/config says is enabled.
+    Assumes conf["terrain"]["postprocess"] exists, but falls back safely.
+    """
+    return run_passes(img, pipeline_from_conf(conf))
 
-def _lum(color):
-    r, g, b = color[:3]
-    return 0.299 * r + 0.587 * g + 0.114 * b
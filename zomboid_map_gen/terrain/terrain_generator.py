@@ -8,15 +8,56 @@ Features:
   (a) thresholds in config["terrain"]  (simple mode)
   (b) explicit layer list in config["terrain"]["layers"] (layer mode)
 - uses per-layer noise from utils.noise_utils
+- rotation/offset are applied in noise space (panning reveals new terrain)
+- keeps the last window so a pan only synthesizes the newly exposed strips
+- thresholds may be coverage targets (terrain.coverage), resolved from a
+  histogram of the cached field, so changing them never resynthesizes noise;
+  they hold before postprocess and rivers, which shift the final shares
+- noise is normalized over canvas.frame ([w, h], default: the canvas), so a
+  map extended by new cells keeps the old normalization and stays seamless
 - applies postprocess passes at the end
 """
 
-from PIL import Image, ImageChops
+import weakref
 
-from ..utils import noise_utils, colors as base_colors, seeds as seed_utils
+import numpy as np
+from PIL import Image
+
+from ..utils import noise_utils, pan_cache, render_context, colors as base_colors, seeds as seed_utils
 from . import presets, postprocess
 
 
+# rows per band when sampling; bounds the coordinate arrays on big canvases
+# (budget.apply sets it together with noise_utils.BAND_ROWS)
+_BAND_ROWS = 256
+
+# last rendered windows per LOD step, reused when only the pan offset or
+# the thresholds change
+_SIMPLE_CACHE = pan_cache.LevelCaches()
+_LAYER_CACHE = pan_cache.LevelCaches()
+
+# last hydrology height map (rivers rerun on every regen)
+_ELEVATION_CACHE = pan_cache.PanCache()
+
+# step -> (weak ref to the field, histogram) of the last simple-mode field;
+# weak, so a dropped or replaced pan cache window is freed, not kept here
+_HISTOGRAMS = {}
+
+# canvas size (px across) of the field used for coverage outside full renders
+_COVERAGE_PX = 512
+
+# threshold names in classification order (coverage is cumulative in this order)
+_COVERAGE_ORDER = ("water", "dark", "medium")
+
+
+def _rotation(transform: dict) -> int:
+    return int(transform.get("rotation", 0)) % 360
+
+
+def _offset(transform: dict) -> tuple[int, int]:
+    return int(transform.get("offset_x", 0)), int(transform.get("offset_y", 0))
+
+
 def _get_canvas_size(conf: dict) -> tuple[int, int]:
     canvas_conf = conf.get("canvas", {})
     cell_size = canvas_conf.get("cell_size", 300)
@@ -27,79 +68,209 @@ def _get_canvas_size(conf: dict) -> tuple[int, int]:
     return width, height
 
 
-def _generate_simple(conf: dict, width: int, height: int) -> Image.Image:
+def _frame_size(conf: dict) -> tuple[int, int]:
     """
-    Older/simple style: single noise field + thresholds.
-    Good for testing when you don't want to define all layers.
+    Canvas the noise is normalized (and rotated) over: canvas.frame if set,
+    else the canvas itself. Pinned when a map is extended (see extend.py).
+    """
+    frame = conf.get("canvas", {}).get("frame")
+    return (int(frame[0]), int(frame[1])) if frame else _get_canvas_size(conf)
+
+
+def _out_size(width: int, height: int, step: int) -> tuple[int, int]:
+    # one output pixel per step x step block of the canvas
+    return -(-width // step), -(-height // step)
+
+
+def _simple_params(conf: dict) -> tuple[dict, dict]:
+    """
+    Noise params + thresholds for simple mode (config > preset > defaults).
     """
     terrain_conf = conf.get("terrain", {})
-    seed = conf.get("seed", 0)
 
     preset_name = terrain_conf.get("preset", "default")
     preset_vals = presets.get_preset(preset_name)
 
-    scale = terrain_conf.get("scale", preset_vals["scale"])
-    octaves = terrain_conf.get("octaves", 6)
-    persistence = terrain_conf.get("persistence", 0.5)
-    lacunarity = terrain_conf.get("lacunarity", 2.0)
+    params = {
+        "scale": terrain_conf.get("scale", preset_vals["scale"]),
+        "octaves": terrain_conf.get("octaves", 6),
+        "persistence": terrain_conf.get("persistence", 0.5),
+        "lacunarity": terrain_conf.get("lacunarity", 2.0),
+        "seed": conf.get("seed", 0),
+    }
+    thresholds = {
+        "water": terrain_conf.get("water_threshold", preset_vals["water_threshold"]),
+        "dark": terrain_conf.get("dark_threshold", preset_vals["dark_threshold"]),
+        "medium": terrain_conf.get("medium_threshold", preset_vals["medium_threshold"]),
+    }
+    return params, thresholds
+
 
-    water_th = terrain_conf.get("water_threshold", preset_vals["water_threshold"])
-    dark_th = terrain_conf.get("dark_threshold", preset_vals["dark_threshold"])
-    med_th = terrain_conf.get("medium_threshold", preset_vals["medium_threshold"])
+def _field_histogram(v: np.ndarray, step: int) -> np.ndarray:
+    cached = _HISTOGRAMS.get(step)
+    if cached is not None and cached[0]() is v:
+        return cached[1]
+    hist = noise_utils.field_histogram(v)
+    _HISTOGRAMS[step] = (weakref.ref(v), hist)
+    return hist
+
+
+def coverage_thresholds(thresholds: dict, coverage: dict, hist: np.ndarray) -> dict:
+    """
+    Replace thresholds that have a coverage target (fraction of the map,
+    e.g. {"water": 0.2}) with the field value that yields it. Coverage is
+    per class, stacked in _COVERAGE_ORDER; a class without a target keeps its
+    raw threshold and the classes above stack on top of what it covers.
+    """
+    out = dict(thresholds)
+    below = 0.0
+    for name in _COVERAGE_ORDER:
+        target = coverage.get(name)
+        if target is None:
+            below = noise_utils.histogram_cdf(hist, out[name])
+            continue
+        below = min(1.0, below + max(0.0, float(target)))
+        out[name] = noise_utils.histogram_quantile(hist, below)
+    return out
+
+
+def _classify_simple(v: np.ndarray, thresholds: dict) -> np.ndarray:
+    """
+    Normalized field (0..1) -> RGBA array, first matching band wins.
+    """
+    water_th = thresholds["water"]
+    dark_th = thresholds["dark"]
+    med_th = thresholds["medium"]
 
     # grab vanilla-ish colors
-    water = base_colors.VANILLA["water"][:3]
-    dark_grass = base_colors.VANILLA["dark_grass"][:3]
-    med_grass = base_colors.VANILLA["med_grass"][:3]
-    light_grass = base_colors.VANILLA["light_grass"][:3]
-    dirt = base_colors.VANILLA["dirt"][:3]
-    sand = base_colors.VANILLA["sand"][:3]
-
-    img = Image.new("RGB", (width, height))
-
-    # collect noise first so we can normalize to 0..1
-    vals = []
-    for x in range(width):
-        for y in range(height):
-            v = noise_utils.perlin2(
-                x,
-                y,
-                scale=scale,
-                octaves=octaves,
-                persistence=persistence,
-                lacunarity=lacunarity,
-                seed=seed,
-            )
-            vals.append(v)
-    vmin = min(vals)
-    vmax = max(vals)
-    vrange = vmax - vmin if vmax != vmin else 1.0
-
-    i = 0
-    for x in range(width):
-        for y in range(height):
-            v = (vals[i] - vmin) / vrange
-            i += 1
-
-            if v < water_th:
-                c = water
-            elif v < dark_th:
-                c = dark_grass
-            elif v < med_th:
-                c = med_grass
-            elif v < min(1.0, med_th + 0.10):
-                c = light_grass
-            elif v < min(1.0, med_th + 0.18):
-                c = dirt
-            else:
-                c = sand
-
-            img.putpixel((x, y), c)
-
-    return img.convert("RGBA")
-
-
-def _generate_layers(conf: dict, width: int, height: int) -> Image.Image:
+    bands = [
+        (v < water_th, base_colors.VANILLA["water"]),
+        (v < dark_th, base_colors.VANILLA["dark_grass"]),
+        (v < med_th, base_colors.VANILLA["med_grass"]),
+        (v < min(1.0, med_th + 0.10), base_colors.VANILLA["light_grass"]),
+        (v < min(1.0, med_th + 0.18), base_colors.VANILLA["dirt"]),
+    ]
+    lut = np.array([c for _, c in bands] + [base_colors.VANILLA["sand"]], dtype=np.uint8)
+    idx = np.select([cond for cond, _ in bands], list(range(len(bands))), default=len(bands))
+    return lut[idx]
+
+
+def _simple_field(conf: dict, width: int, height: int, step: int = 1) -> np.ndarray:
+    """Normalized simple-mode field for the canvas at `step` (cached per level)."""
+    params, _ = _simple_params(conf)
+    transform = conf.get("terrain", {}).get("transform") or {}
+    frame = _frame_size(conf)
+    vmin, vrange = noise_utils.field_range(*frame, **params)
+    out_w, out_h = _out_size(width, height, step)
+
+    def synth(x0, y0, w, h):
+        return noise_utils.sample_field(x0 * step, y0 * step, w, h, params, vmin, vrange,
+                                        transform, frame, step)
+
+    # thresholds are not part of the key: changing them only reclassifies
+    key = (tuple(sorted(params.items())), _rotation(transform), width, height, frame)
+    return pan_cache.local(_SIMPLE_CACHE).get(key, _offset(transform), (out_h, out_w), synth, step)
+
+
+def _resolved_thresholds(conf: dict, thresholds: dict, v: np.ndarray | None, step: int) -> dict:
+    """
+    Apply terrain.coverage. v is the field of the whole canvas at `step`,
+    or None to resolve on a coarse field of the frame instead (windows, and
+    extended maps, whose coverage stays that of the original frame).
+    """
+    coverage = conf.get("terrain", {}).get("coverage")
+    if not coverage:
+        return thresholds
+    if v is None:
+        # coverage is a whole-map property: resolve it on a coarse frame field
+        fw, fh = _frame_size(conf)
+        step = max(1, -(-max(fw, fh) // _COVERAGE_PX))
+        v = _simple_field(conf, fw, fh, step)
+    return coverage_thresholds(thresholds, coverage, _field_histogram(v, step))
+
+
+def _generate_simple(conf: dict, width: int, height: int, step: int = 1) -> Image.Image:
+    """
+    Older/simple style: single noise field + thresholds.
+    Good for testing when you don't want to define all layers.
+    """
+    _, thresholds = _simple_params(conf)
+    v = _simple_field(conf, width, height, step)
+    framed = _frame_size(conf) == (width, height)
+    thresholds = _resolved_thresholds(conf, thresholds, v if framed else None, step)
+
+    out_h, out_w = v.shape
+    out = np.empty((out_h, out_w, 4), dtype=np.uint8)
+    for y0 in range(0, out_h, _BAND_ROWS):
+        render_context.check()
+        y1 = min(out_h, y0 + _BAND_ROWS)
+        out[y0:y1] = _classify_simple(v[y0:y1], thresholds)
+
+    return Image.fromarray(out, "RGBA")
+
+
+def _layer_params(layer: dict, master_seed: int) -> dict:
+    layer_seed = layer.get("seed")
+    if layer_seed is None:
+        layer_seed = seed_utils.derive_seed(master_seed, layer.get("name", "layer"))
+    return {
+        "scale": layer.get("scale", 60),
+        "octaves": layer.get("octaves", 5),
+        "persistence": layer.get("persistence", 0.5),
+        "lacunarity": layer.get("lacunarity", 2.0),
+        "seed": layer_seed,
+    }
+
+
+def _resolve_layers(x0, y0, w, h, params, thresholds, ranges, transform, canvas,
+                    step: int = 1) -> np.ndarray:
+    """
+    Index of the top-most passing layer per pixel (0 = none) for a window of
+    w x h output pixels whose top-left is canvas pixel (x0, y0), each output
+    pixel covering `step` canvas pixels.
+    Layers are visited top-down and each one only samples noise on pixels
+    nothing above it claimed.
+    """
+    idx = np.zeros((h, w), dtype=np.uint16)
+    # row bands keep the coordinate arrays small on big canvases
+    for by in range(0, h, _BAND_ROWS):
+        render_context.check()
+        bh = min(_BAND_ROWS, h - by)
+        xs, ys = noise_utils.sample_coords(x0, y0 + by * step, w, bh,
+                                           transform, canvas, step)
+        xs = xs.ravel()
+        ys = ys.ravel()
+        band = idx[by:by + bh].reshape(-1)  # view
+        pending = np.arange(ys.size)
+
+        for li in reversed(range(len(params))):
+            vmin, vrange = ranges[li]
+            v = noise_utils.perlin2_array(xs[pending], ys[pending], **params[li])
+            # lattice range can miss the very extremes; clamp back to 0..1
+            hit = np.clip((v - vmin) / vrange, 0.0, 1.0) >= thresholds[li]
+            band[pending[hit]] = li + 1
+            pending = pending[~hit]
+            if pending.size == 0:
+                break
+    return idx
+
+
+def _layer_setup(conf: dict, width: int, height: int):
+    """(params, thresholds, ranges, lut) for the configured layer stack over a frame."""
+    master_seed = conf.get("seed", 0)
+    layers = conf.get("terrain", {}).get("layers", [])
+    params = [_layer_params(layer, master_seed) for layer in layers]
+    thresholds = [float(layer.get("threshold", 0.5)) for layer in layers]
+    ranges = [noise_utils.field_range(width, height, **p) for p in params]
+
+    # palette index 0 = nothing passed (transparent), li + 1 = layers[li]
+    lut = np.zeros((len(layers) + 1, 4), dtype=np.uint8)
+    for li, layer in enumerate(layers):
+        lut[li + 1] = tuple(layer.get("color", (255, 0, 255, 255)))
+    return params, thresholds, ranges, lut
+
+
+def _generate_layers(conf: dict, width: int, height: int, step: int = 1) -> Image.Image:
     """
     Newer/layered style:
     terrain: {
@@ -110,99 +281,107 @@ def _generate_layers(conf: dict, width: int, height: int) -> Image.Image:
         ]
     }
 
-    We paint in order: first layer = lowest priority, last = top.
-    """
-    terrain_conf = conf.get("terrain", {})
-    master_seed = conf.get("seed", 0)
-    layers = terrain_conf.get("layers", [])
+    First layer = lowest priority, last = top.
 
+    Fused compositor: instead of painting every layer over the whole canvas,
+    resolve the top-most passing layer per pixel. Layers are visited top-down
+    and each one only samples noise on pixels nothing above it claimed, so
+    a big layer stack costs roughly the visible coverage, not layers x area.
+    """
     # if no layers provided, fall back to simple
-    if not layers:
-        return _generate_simple(conf, width, height)
-
-    # precompute per-layer noise arrays
-    layer_noises: list[list[float]] = []
-    vmins = []
-    vmaxs = []
-
-    for layer in layers:
-        scale = layer.get("scale", 60)
-        octaves = layer.get("octaves", 5)
-        persistence = layer.get("persistence", 0.5)
-        lacunarity = layer.get("lacunarity", 2.0)
-        layer_seed = layer.get("seed")
-        if layer_seed is None:
-            layer_seed = seed_utils.derive_seed(master_seed, layer.get("name", "layer"))
-
-        vals = []
-        for x in range(width):
-            for y in range(height):
-                v = noise_utils.perlin2(
-                    x,
-                    y,
-                    scale=scale,
-                    octaves=octaves,
-                    persistence=persistence,
-                    lacunarity=lacunarity,
-                    seed=layer_seed,
-                )
-                vals.append(v)
-        vmin = min(vals)
-        vmax = max(vals)
-        layer_noises.append(vals)
-        vmins.append(vmin)
-        vmaxs.append(vmax)
-
-    # now actually paint
-    img = Image.new("RGBA", (width, height), (0, 0, 0, 0))
-
-    # We'll keep a separate coverage mask if later we want "linked thresholds"
-    for li, layer in enumerate(layers):
-        color = tuple(layer.get("color", (255, 0, 255, 255)))
-        threshold = float(layer.get("threshold", 0.5))
-        vals = layer_noises[li]
-        vmin = vmins[li]
-        vmax = vmaxs[li]
-        vrange = vmax - vmin if vmax != vmin else 1.0
-
-        i = 0
-        for x in range(width):
-            for y in range(height):
-                v = (vals[i] - vmin) / vrange
-                i += 1
-                if v >= threshold:
-                    img.putpixel((x, y), color)
+    if not conf.get("terrain", {}).get("layers"):
+        return _generate_simple(conf, width, height, step)
 
-    return img
+    frame = _frame_size(conf)
+    params, thresholds, ranges, lut = _layer_setup(conf, *frame)
+    transform = conf.get("terrain", {}).get("transform") or {}
 
-def _apply_transform(img: Image.Image, conf: dict) -> Image.Image:
-    tr = conf.get("terrain", {}).get("transform", {})
-    rot = int(tr.get("rotation", 0)) % 360
-    offx = int(tr.get("offset_x", 0))
-    offy = int(tr.get("offset_y", 0))
-
-    if rot:
-        # keep canvas size; NEAREST to preserve palette edges
-        img = img.rotate(-rot, resample=Image.NEAREST, expand=False)
-    if offx or offy:
-        img = ImageChops.offset(img, offx, offy)
-    return img
+    def synth(x0, y0, w, h):
+        return _resolve_layers(x0 * step, y0 * step, w, h, params, thresholds, ranges,
+                               transform, frame, step)
 
+    key = (
+        tuple(tuple(sorted(p.items())) for p in params),
+        tuple(thresholds),
+        _rotation(transform), width, height, frame,
+    )
+    out_w, out_h = _out_size(width, height, step)
+    idx = pan_cache.local(_LAYER_CACHE).get(key, _offset(transform), (out_h, out_w), synth, step)
 
-def generate(conf: dict):
+    return Image.fromarray(lut[idx], "RGBA")
 
 
+def elevation(conf: dict, step: int = 1) -> np.ndarray:
+    """
+    The simple-mode noise field (~0..1, water is low) sampled at the center of
+    every step x step block of the canvas. Used as a height map by hydrology.
+    """
+    width, height = _get_canvas_size(conf)
+    params, _ = _simple_params(conf)
+    transform = conf.get("terrain", {}).get("transform") or {}
+    frame = _frame_size(conf)
+    vmin, vrange = noise_utils.field_range(*frame, **params)
+    gw, gh = _out_size(width, height, step)
+
+    def synth(x0, y0, w, h):
+        return noise_utils.sample_field(x0 * step + step // 2, y0 * step + step // 2, w, h,
+                                        params, vmin, vrange, transform, frame, step)
+
+    key = (tuple(sorted(params.items())), _rotation(transform), _offset(transform),
+           width, height, frame, step)
+    return pan_cache.local(_ELEVATION_CACHE).get(key, (0, 0), (gh, gw), synth)
+
+
+def render_window(conf: dict, x0: int, y0: int, w: int, h: int, step: int = 1) -> Image.Image:
+    """
+    Terrain for one window: w x h output pixels whose top-left is canvas pixel
+    (x0, y0), one pixel per step x step block. Costs the window, not the
+    canvas, so map tiles can be rendered on demand, and the window may lie
+    outside the canvas (new cells of an extended map). Local postprocess
+    passes run on the window plus their halo; whole-canvas passes and rivers
+    are not included.
+    """
+    frame = _frame_size(conf)
+    terrain_conf = conf.get("terrain", {})
+    transform = terrain_conf.get("transform") or {}
+    specs = postprocess.local_specs(postprocess.pipeline_from_conf(conf))
+    pad = postprocess.pipeline_halo(specs)
+    px0, py0 = x0 - pad * step, y0 - pad * step
+    pw, ph = w + 2 * pad, h + 2 * pad
+
+    if terrain_conf.get("layers"):
+        params, thresholds, ranges, lut = _layer_setup(conf, *frame)
+        idx = _resolve_layers(px0, py0, pw, ph, params, thresholds, ranges,
+                              transform, frame, step)
+        arr = lut[idx]
+    else:
+        params, thresholds = _simple_params(conf)
+        vmin, vrange = noise_utils.field_range(*frame, **params)
+        v = noise_utils.sample_field(px0, py0, pw, ph, params, vmin, vrange,
+                                     transform, frame, step)
+        thresholds = _resolved_thresholds(conf, thresholds, None, step)
+        arr = _classify_simple(v, thresholds)
+
+    img = postprocess.run_passes(Image.fromarray(arr, "RGBA"), specs)
+    return img.crop((pad, pad, pad + w, pad + h))
+
+
+def generate(conf: dict, step: int = 1):
+    """
+    terrain.transform (rotation / offset_x / offset_y) is applied to the
+    noise sampling coordinates inside both paths, so it costs nothing extra.
+    step > 1 renders a coarse preview: one pixel per step x step canvas block.
+    """
     width, height = _get_canvas_size(conf)
     terrain_conf = conf.get("terrain", {})
 
     # choose path: if user gave layers, use layered version, otherwise simple
     if terrain_conf.get("layers"):
-        img = _generate_layers(conf, width, height)
+        img = _generate_layers(conf, width, height, step)
     else:
-        img = _generate_simple(conf, width, height)
+        img = _generate_simple(conf, width, height, step)
 
     # postprocess (erosion, speckle, edge rag)
     img = postprocess.apply_all(img, conf)
-    img = _apply_transform(img, conf)
     return img
 
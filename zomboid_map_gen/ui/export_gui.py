@@ -38,6 +38,15 @@ class ExportTab(tk.Frame):
             ent.bind("<KeyRelease>", lambda _e, k=key, v=var: self._write_file(k, v))
             self.entries[key] = var
 
+        row = tk.Frame(self, bg="#121212"); row.pack(fill=tk.X, padx=8, pady=(10, 0))
+        self.var_indexed = tk.BooleanVar(value=exp.get("indexed_png", False))
+        tk.Checkbutton(row, text="Indexed PNG (vanilla palette)", variable=self.var_indexed,
+                       command=self._write_palette, bg="#121212", fg="white",
+                       selectcolor="#121212").pack(side=tk.LEFT)
+        self.var_off = tk.StringVar(value=exp.get("off_palette", "snap"))
+        _label(row, "off-palette").pack(side=tk.LEFT, padx=(8, 0))
+        tk.OptionMenu(row, self.var_off, "snap", "reject", command=lambda _v: self._write_palette()).pack(side=tk.LEFT)
+
     def _browse(self):
         d = filedialog.askdirectory()
         if not d: return
@@ -52,9 +61,18 @@ class ExportTab(tk.Frame):
         self.conf.setdefault("export", {})[key] = var.get()
         self.on_change()
 
+    def _write_palette(self):
+        self.on_click()
+        exp = self.conf.setdefault("export", {})
+        exp["indexed_png"] = bool(self.var_indexed.get())
+        exp["off_palette"] = self.var_off.get()
+        self.on_change()
+
     def apply_conf(self, conf):
         self.conf = conf
         self.var_outdir.set(conf.get("output_dir","output"))
         exp = conf.setdefault("export", {})
         for key, var in self.entries.items():
             var.set(exp.get(key,var.get()))
+        self.var_indexed.set(exp.get("indexed_png", False))
+        self.var_off.set(exp.get("off_palette", "snap"))
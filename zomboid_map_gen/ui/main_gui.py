@@ -1,19 +1,29 @@
-import os, sys, json
+import os, sys, json, copy, queue, random, threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from pathlib import Path
 from PIL import Image, ImageTk
 
-from .. import core, config as cfg
+from .. import core, pipeline, config as cfg
+from ..utils import render_context
+from ..export import writer, tiles
 from .sound import SoundPlayer
 from .terrain_gui import TerrainTab
 from .vegetation_gui import VegetationTab
 from .roads_gui import RoadsTab
 from .export_gui import ExportTab
+from .map_viewer import MapViewer
+from .regen_dialog import RegenDialog
+from .seed_explorer import SeedExplorer
 
 
 THUMB_SIZE = (300, 300)   # larger thumbnails, keep aspect via .thumbnail
 
+# progressive rendering: the first preview level is about this many pixels
+# across, each next level halves the step, then the full render writes files
+COARSE_PX = 150
+RESULT_POLL_MS = 30
+
 
 class ZedInfiniMapperApp(tk.Tk):
     def __init__(self):
@@ -29,15 +39,24 @@ class ZedInfiniMapperApp(tk.Tk):
         # config in memory
         self.conf = cfg.default_config()
 
-        # debounce / busy
+        # debounce
         self._regen_after_id = None
         self._regen_delay_ms = 250
-        self._busy = False
+
+        # background renderer: newest request wins, stale levels are dropped
+        self._render_lock = threading.Lock()
+        self._render_token = 0
+        self._render_request = None
+        self._render_thread = None
+        self._render_results = queue.Queue()
+        # the renderer's own pan caches (pan_cache.local), kept across its renders
+        self._render_caches = {}
 
         # thumbnail image refs (prevent GC)
         self._thumb_imgs = {"terrain": None, "vegetation": None, "combo": None, "roads": None}
 
         self._build_ui()
+        self.after(RESULT_POLL_MS, self._poll_render_results)
         self._schedule_regen()
 
     # ---------- UI ----------
@@ -106,10 +125,19 @@ class ZedInfiniMapperApp(tk.Tk):
         filem.add_command(label="Exit", command=self.destroy)
         mb.add_cascade(label="File", menu=filem)
 
+        viewm = tk.Menu(mb, tearoff=0)
+        viewm.add_command(label="Map Viewer…", command=lambda: self._open_viewer("composite"))
+        mb.add_cascade(label="View", menu=viewm)
+
         exportm = tk.Menu(mb, tearoff=0)
         exportm.add_command(label="Open Output Folder", command=self._open_output_folder)
         mb.add_cascade(label="Export", menu=exportm)
 
+        toolsm = tk.Menu(mb, tearoff=0)
+        toolsm.add_command(label="Regenerate Region…", command=self._open_regen)
+        toolsm.add_command(label="Seed Explorer…", command=self._open_seed_explorer)
+        mb.add_cascade(label="Tools", menu=toolsm)
+
         helpm = tk.Menu(mb, tearoff=0)
         helpm.add_command(label="About", command=lambda: messagebox.showinfo("About", "Zed InfiniMapper"))
         mb.add_cascade(label="Help", menu=helpm)
@@ -130,13 +158,28 @@ class ZedInfiniMapperApp(tk.Tk):
         tk.Label(wrap, text=title, bg="#121212", fg="white").pack(anchor="w")
         lbl = tk.Label(wrap, bg="#1b1b1b", width=THUMB_SIZE[0], height=THUMB_SIZE[1])
         lbl.pack()
-        lbl.bind("<Double-Button-1>", lambda e, key=title: self._open_single_image(key))
+        lbl.bind("<Double-Button-1>", lambda e, key=title: self._open_viewer(self.THUMB_LAYERS[key]))
         return lbl
 
     # ---------- Events / sounds ----------
     def _click(self):
         self.sound.click()
 
+    def _open_regen(self):
+        def done(layers):
+            self._show_layers(*layers)
+            self.status_var.set("Region regenerated.")
+            self.sound.tada()
+        RegenDialog(self, self.conf, on_done=done, on_click=self._click)
+
+    def _open_seed_explorer(self):
+        def pick(seed):
+            self.conf["seed"] = seed
+            self.status_var.set(f"Seed {seed}")
+            self._start_render(announce=True)
+        SeedExplorer(self, self.conf, on_pick=pick, on_click=self._click)
+        self._click()
+
     def _menu_save(self):
         path = filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("JSON", "*.json")])
         if not path:
@@ -168,22 +211,24 @@ class ZedInfiniMapperApp(tk.Tk):
         except Exception: pass
         self._click()
 
-    def _open_single_image(self, key_title):
-        # map from display title to actual file path
-        t_path, v_path, r_path, c_path = self._paths()
-        mapping = {
-            "Terrain": t_path,
-            "Vegetation": v_path,
-            "Terrain + Roads": c_path,  # combined
-            "Road Network": r_path,
-        }
-        p = mapping.get(key_title)
-        if not p or not p.exists(): return
-        try:
-            if sys.platform.startswith("win"): os.startfile(str(p))
-            elif sys.platform == "darwin": os.system(f'open "{p}"')
-            else: os.system(f'xdg-open "{p}"')
-        except Exception: pass
+    THUMB_LAYERS = {
+        "Terrain": "terrain",
+        "Vegetation": "vegetation",
+        "Terrain + Roads": "composite",
+        "Road Network": "roads",
+    }
+
+    def _open_viewer(self, layer):
+        # generator tiles (memory ~ screen) + the saved layers, when there are any
+        t_path, v_path, r_path, _ = self._paths()
+        saved = {name: p for name, p in (("terrain", t_path), ("vegetation", v_path), ("roads", r_path))
+                 if p.exists()}
+        saved_tiles = tiles.ImageTiles(saved) if saved else None
+        sources = {"Generator": tiles.GeneratorTiles(self.conf, saved=saved_tiles)}
+        if saved_tiles is not None:
+            sources["Saved layers"] = saved_tiles
+        MapViewer(self, sources, layer=layer)
+        self._click()
 
     # ---------- Change / regen ----------
     def on_params_changed(self, *_):
@@ -198,33 +243,93 @@ class ZedInfiniMapperApp(tk.Tk):
 
     def _do_regen(self):
         self._regen_after_id = None
-        if self._busy: return
-        try:
-            self._busy = True
-            self.status_var.set("Generating…")
-            self.update_idletasks()
-            core.generate_from_config(self.conf)
-            self._update_thumbs()
-            self.status_var.set("Live update complete.")
-        except Exception as e:
-            self.status_var.set("Generation failed.")
-            self.sound.oops()
-            messagebox.showerror("Error", f"{e}")
-        finally:
-            self._busy = False
+        self._start_render()
 
     def _generate_clicked(self):
+        self._start_render(announce=True)
+
+    # ---------- Progressive rendering ----------
+    @staticmethod
+    def _render_steps(conf) -> list[int]:
+        """
+        Coarse-to-fine LOD steps: power-of-two previews from ~COARSE_PX across
+        until they out-resolve the thumbnails, then the full render (step 1).
+        """
+        canvas = conf.get("canvas", {})
+        size = canvas.get("cell_size", 300) * max(canvas.get("cells_x", 1), canvas.get("cells_y", 1))
+        steps = []
+        step = 1
+        while size // (step * 2) >= COARSE_PX:
+            step *= 2
+        while step > 1:
+            steps.append(step)
+            if size // step >= 2 * max(THUMB_SIZE):
+                break
+            step //= 2
+        return steps + [1]
+
+    def _start_render(self, announce=False):
+        self._render_token += 1
+        request = (self._render_token, copy.deepcopy(self.conf), announce)
+        with self._render_lock:
+            self._render_request = request
+            if self._render_thread is None:
+                self._render_thread = threading.Thread(target=self._render_worker, daemon=True)
+                self._render_thread.start()
+        self.status_var.set("Generating…")
+
+    def _render_worker(self):
+        while True:
+            with self._render_lock:
+                request, self._render_request = self._render_request, None
+                if request is None:
+                    self._render_thread = None
+                    return
+            token, conf, announce = request
+            stale = lambda: token != self._render_token
+            try:
+                for step in self._render_steps(conf):
+                    if stale():
+                        break  # params changed, abandon this run
+                    # its own random (seeded alike per level, so every level walks
+                    # the same roads) and caches; stale() stops it at the next band
+                    ctx = render_context.RenderContext(random.Random(conf.get("seed")), stale,
+                                                       self._render_caches)
+                    with render_context.scope(ctx):
+                        if step == 1:
+                            layers = core.generate_from_config(conf)
+                            # a run over max_memory_mb hands back layers spilled to disk
+                            layers = tuple(img.image() if isinstance(img, pipeline.SpilledLayer) else img
+                                           for img in layers)
+                        else:
+                            layers = core.render_layers(conf, step)
+                    self._render_results.put((token, step, layers, announce, None))
+            except render_context.Cancelled:
+                pass  # nothing was written; the newer request is next
+            except Exception as e:
+                self._render_results.put((token, None, None, announce, e))
+
+    def _poll_render_results(self):
         try:
-            self.status_var.set("Generating…")
-            self.update_idletasks()
-            core.generate_from_config(self.conf)
-            self._update_thumbs()
-            self.status_var.set("Generation complete.")
-            self.sound.tada()
-        except Exception as e:
-            self.status_var.set("Generation failed.")
-            self.sound.oops()
-            messagebox.showerror("Error", f"{e}")
+            while True:
+                token, step, layers, announce, error = self._render_results.get_nowait()
+                if token != self._render_token:
+                    continue
+                if error is not None:
+                    self.status_var.set("Generation failed.")
+                    self.sound.oops()
+                    messagebox.showerror("Error", f"{error}")
+                    continue
+                self._show_layers(*layers)
+                if step == 1:
+                    self.status_var.set("Generation complete." if announce else "Live update complete.")
+                    if announce:
+                        self.sound.tada()
+                else:
+                    self.status_var.set(f"Generating… (preview 1:{step})")
+        except queue.Empty:
+            pass
+        self.after(RESULT_POLL_MS, self._poll_render_results)
 
     # ---------- Thumbnails ----------
     def _paths(self):
@@ -243,42 +348,25 @@ class ZedInfiniMapperApp(tk.Tk):
         return t, v, r, c
 
 
-    def _set_thumb(self, key, path: Path):
-        if not path or not path.exists():
+    def _set_thumb_img(self, key, img):
+        if img is None:
             self._thumb_labels[key].configure(image="")
             self._thumb_imgs[key] = None
             return
-        img = self._open_image_fresh(path)
-        img.thumbnail(THUMB_SIZE, Image.LANCZOS)
+        # coarse levels are scaled up blocky, full renders down smoothly
+        scale = min(THUMB_SIZE[0] / img.width, THUMB_SIZE[1] / img.height)
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        img = img.resize(size, Image.NEAREST if scale > 1 else Image.LANCZOS)
         imgtk = ImageTk.PhotoImage(img)
         self._thumb_labels[key].configure(image=imgtk)
         self._thumb_imgs[key] = imgtk
 
-    def _update_thumbs(self):
-        t_path, v_path, r_path, c_path = self._paths()
-
-        self._set_thumb("terrain", t_path)
-        self._set_thumb("vegetation", v_path)
-
-        if c_path and c_path.exists():
-            self._set_thumb("combo", c_path)
-        else:
-            # build combo from terrain+roads if writer didn’t emit combined
-            if t_path.exists():
-                img = self._open_image_fresh(t_path).convert("RGBA")
-                if r_path.exists():
-                    roads = self._open_image_fresh(r_path).convert("RGBA")
-                    img.alpha_composite(roads)
-                img.thumbnail(THUMB_SIZE, Image.LANCZOS)
-                imgtk = ImageTk.PhotoImage(img)
-                self._thumb_labels["combo"].configure(image=imgtk)
-                self._thumb_imgs["combo"] = imgtk
-            else:
-                self._thumb_labels["combo"].configure(image="")
-                self._thumb_imgs["combo"] = None
-
-        self._set_thumb("roads", r_path)
-
+    def _show_layers(self, terrain_img, veg_img, roads_img, lots_img=None):
+        self._set_thumb_img("terrain", terrain_img)
+        self._set_thumb_img("vegetation", veg_img)
+        combo = writer.compose_preview(terrain_img, veg_img, roads_img) if terrain_img else None
+        self._set_thumb_img("combo", combo)
+        self._set_thumb_img("roads", roads_img)
 
     def _open_image_fresh(self, path: Path) -> Image.Image:
         # avoid stale handles/caching
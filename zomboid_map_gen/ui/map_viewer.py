@@ -0,0 +1,233 @@
+import queue
+import threading
+import tkinter as tk
+
+from PIL import Image, ImageTk
+
+from ..export.tiles import LAYERS
+
+
+POLL_MS = 30
+PREFETCH_RING = 1   # tiles around the visible ones rendered ahead of time
+
+
+class MapViewer(tk.Toplevel):
+    """
+    Pan/zoom viewer over a tile pyramid (export.tiles). Only visible tiles
+    are requested, a worker thread renders them (then their neighbors and
+    the level above) into the source's LRU cache, and only on-screen tiles
+    hold PhotoImages, so memory follows the window size, not the map.
+
+    sources: {"label": TileSource}; the first one is shown first.
+    Drag to pan, mouse wheel to zoom around the cursor.
+    """
+
+    def __init__(self, parent, sources: dict, layer: str = "composite", title="Map Viewer"):
+        super().__init__(parent)
+        self.title(title)
+        self.configure(bg="#121212")
+        self.geometry("1000x760")
+
+        self.sources = sources
+        self.var_source = tk.StringVar(value=next(iter(sources)))
+        self.var_layer = tk.StringVar(value=layer)
+        self.source = sources[self.var_source.get()]
+
+        self.z = 0
+        self.vx = 0   # view origin in pixels of zoom level z
+        self.vy = 0
+        self._drag = None
+        self._items = {}   # (layer, z, tx, ty) -> (canvas item, PhotoImage)
+
+        self._cv = threading.Condition()
+        self._wanted = []
+        self._closed = False
+        self._results = queue.Queue()
+        threading.Thread(target=self._worker, daemon=True).start()
+
+        self._build_ui()
+        self.protocol("WM_DELETE_WINDOW", self._close)
+        self.after(POLL_MS, self._poll)
+        self.after_idle(self._fit)
+
+    # ---------- UI ----------
+    def _build_ui(self):
+        top = tk.Frame(self, bg="#121212")
+        top.pack(side=tk.TOP, fill=tk.X)
+        for name in self.sources:
+            tk.Radiobutton(top, text=name, value=name, variable=self.var_source,
+                           command=self._source_changed, bg="#121212", fg="white",
+                           selectcolor="#121212").pack(side=tk.LEFT, padx=6, pady=4)
+        tk.Label(top, text="  Layer", bg="#121212", fg="white").pack(side=tk.LEFT)
+        for name in LAYERS:
+            tk.Radiobutton(top, text=name.capitalize(), value=name, variable=self.var_layer,
+                           command=self._redraw, bg="#121212", fg="white",
+                           selectcolor="#121212").pack(side=tk.LEFT, padx=4, pady=4)
+        tk.Button(top, text="Fit", command=self._fit, bg="#2f2f2f", fg="white").pack(side=tk.RIGHT, padx=6)
+
+        self.canvas = tk.Canvas(self, bg="#1b1b1b", highlightthickness=0)
+        self.canvas.pack(fill=tk.BOTH, expand=True)
+        self.status_var = tk.StringVar(value="")
+        tk.Label(self, textvariable=self.status_var, bg="#121212", fg="white",
+                 anchor="w").pack(side=tk.BOTTOM, fill=tk.X)
+
+        self.canvas.bind("<Configure>", lambda _e: self._redraw())
+        self.canvas.bind("<ButtonPress-1>", self._drag_start)
+        self.canvas.bind("<B1-Motion>", self._drag_move)
+        self.canvas.bind("<MouseWheel>", lambda e: self._zoom(1 if e.delta > 0 else -1, e.x, e.y))
+        self.canvas.bind("<Button-4>", lambda e: self._zoom(1, e.x, e.y))
+        self.canvas.bind("<Button-5>", lambda e: self._zoom(-1, e.x, e.y))
+
+    def _close(self):
+        with self._cv:
+            self._closed = True
+            self._cv.notify()
+        self.destroy()
+
+    # ---------- View ----------
+    def _view_size(self):
+        return max(1, self.canvas.winfo_width()), max(1, self.canvas.winfo_height())
+
+    def _fit(self):
+        cw, ch = self._view_size()
+        src = self.source
+        self.z = 0
+        while self.z < src.max_zoom:
+            lw, lh = src.level_size(self.z + 1)
+            if lw > cw or lh > ch:
+                break
+            self.z += 1
+        lw, lh = src.level_size(self.z)
+        self.vx = (lw - cw) // 2
+        self.vy = (lh - ch) // 2
+        self._redraw()
+
+    def _source_changed(self):
+        self.source = self.sources[self.var_source.get()]
+        self._fit()
+
+    def _drag_start(self, e):
+        self._drag = (e.x, e.y, self.vx, self.vy)
+
+    def _drag_move(self, e):
+        if self._drag is None:
+            return
+        x, y, vx, vy = self._drag
+        self.vx = vx - (e.x - x)
+        self.vy = vy - (e.y - y)
+        self._redraw()
+
+    def _zoom(self, direction, cx, cy):
+        z = self.z + direction
+        if not 0 <= z <= self.source.max_zoom:
+            return
+        # keep the map point under the cursor in place
+        if direction > 0:
+            self.vx, self.vy = (self.vx + cx) * 2 - cx, (self.vy + cy) * 2 - cy
+        else:
+            self.vx, self.vy = (self.vx + cx) // 2 - cx, (self.vy + cy) // 2 - cy
+        self.z = z
+        self._redraw()
+
+    def _tiles_around(self, z, vx, vy, cw, ch, ring=0):
+        t = self.source.tile_size
+        cols, rows = self.source.grid(z)
+        tx0, ty0 = max(0, vx // t - ring), max(0, vy // t - ring)
+        tx1, ty1 = min(cols - 1, (vx + cw) // t + ring), min(rows - 1, (vy + ch) // t + ring)
+        return [(tx, ty) for ty in range(ty0, ty1 + 1) for tx in range(tx0, tx1 + 1)]
+
+    def _redraw(self):
+        layer = self.var_layer.get()
+        src = self.source
+        cw, ch = self._view_size()
+        t = src.tile_size
+        visible = [(layer, self.z, tx, ty) for tx, ty in self._tiles_around(self.z, self.vx, self.vy, cw, ch)]
+
+        # drop canvas images that scrolled away or belong to another layer/zoom
+        keep = set(visible)
+        for key in list(self._items):
+            if key not in keep:
+                self.canvas.delete(self._items.pop(key)[0])
+
+        missing = []
+        for key in visible:
+            _, z, tx, ty = key
+            x, y = tx * t - self.vx, ty * t - self.vy
+            if key in self._items and self._items[key][2]:
+                self.canvas.coords(self._items[key][0], x, y)
+                continue
+            img = src.cached(*key)
+            if img is None:
+                missing.append(key)
+                img = self._placeholder(*key)
+            self._place(key, img, x, y, final=key not in missing)
+
+        # visible tiles first, then the ring around them, then the level above
+        wanted = list(missing)
+        wanted += [(layer, self.z, tx, ty)
+                   for tx, ty in self._tiles_around(self.z, self.vx, self.vy, cw, ch, PREFETCH_RING)
+                   if (layer, self.z, tx, ty) not in keep]
+        if self.z > 0:
+            wanted += [(layer, self.z - 1, tx, ty)
+                       for tx, ty in self._tiles_around(self.z - 1, self.vx // 2, self.vy // 2,
+                                                        cw // 2 + 1, ch // 2 + 1)]
+        with self._cv:
+            self._wanted = [(src, key) for key in wanted if src.cached(*key) is None]
+            self._cv.notify()
+
+        step = src.step(self.z)
+        self.status_var.set(f"Zoom {self.z}/{src.max_zoom}  (1:{step})  ·  "
+                            f"{len(src.cache)} tiles cached  ·  {len(missing)} loading")
+
+    def _placeholder(self, layer, z, tx, ty):
+        # upscaled quarter of the parent tile while the real one renders
+        if z == 0:
+            return None
+        parent = self.source.cached(layer, z - 1, tx // 2, ty // 2)
+        if parent is None:
+            return None
+        half = self.source.tile_size // 2
+        ox, oy = (tx % 2) * half, (ty % 2) * half
+        return parent.crop((ox, oy, ox + half, oy + half)).resize(
+            (self.source.tile_size, self.source.tile_size), Image.NEAREST)
+
+    def _place(self, key, img, x, y, final):
+        if key in self._items:
+            self.canvas.delete(self._items.pop(key)[0])
+        if img is None:
+            return
+        photo = ImageTk.PhotoImage(img)
+        item = self.canvas.create_image(x, y, image=photo, anchor="nw")
+        self._items[key] = (item, photo, final)
+
+    # ---------- Background rendering ----------
+    def _worker(self):
+        while True:
+            with self._cv:
+                while not self._wanted and not self._closed:
+                    self._cv.wait()
+                if self._closed:
+                    return
+                src, key = self._wanted.pop(0)
+            try:
+                src.tile(*key)
+            except Exception:
+                continue
+            self._results.put((src, key))
+
+    def _poll(self):
+        if self._closed:
+            return
+        dirty = False
+        try:
+            while True:
+                src, key = self._results.get_nowait()
+                if src is self.source and key in self._items and not self._items[key][2]:
+                    dirty = True
+                elif src is self.source and key[1] == self.z and key not in self._items:
+                    dirty = True
+        except queue.Empty:
+            pass
+        if dirty:
+            self._redraw()
+        self.after(POLL_MS, self._poll)
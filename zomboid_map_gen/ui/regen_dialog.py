@@ -0,0 +1,159 @@
+import copy
+import queue
+import random
+import threading
+import tkinter as tk
+from tkinter import filedialog, messagebox
+
+from PIL import Image
+
+from .. import regen
+
+
+POLL_MS = 50
+
+
+def _label(p, t): return tk.Label(p, text=t, bg="#121212", fg="white")
+
+
+def _entry(p, var, width=6):
+    return tk.Entry(p, textvariable=var, width=width, bg="#1e1e1e", fg="white", insertbackground="white")
+
+
+class RegenDialog(tk.Toplevel):
+    """
+    Regenerate a cell, rectangle or mask region of the saved map (see
+    regen.py) with a re-rolled seed and/or param overrides. Runs on a worker
+    thread; on_done(layers) gets the updated layers.
+    """
+
+    def __init__(self, parent, conf: dict, on_done, on_click=None):
+        super().__init__(parent)
+        self.title("Regenerate Region")
+        self.configure(bg="#121212")
+        self.resizable(False, False)
+        self.conf = copy.deepcopy(conf)
+        self.on_done = on_done
+        self.on_click = on_click or (lambda: None)
+        self._results = queue.Queue()
+        self._busy = False
+
+        self.var_mode = tk.StringVar(value="cell")
+        self.var_cell = [tk.StringVar(value="0"), tk.StringVar(value="0")]
+        self.var_rect = [tk.StringVar(value=v) for v in ("0", "0", "100", "100")]
+        self.var_mask = tk.StringVar(value="")
+        self.var_reroll = tk.BooleanVar(value=True)
+        self.var_seed = tk.StringVar(value=str(random.randrange(1 << 31)))
+        self.var_set = tk.StringVar(value="")
+        self.var_layers = {name: tk.BooleanVar(value=name in regen.DEFAULT_LAYERS) for name in regen.LAYERS}
+        self.var_blend = tk.IntVar(value=regen.DEFAULT_BLEND)
+        self.status_var = tk.StringVar(value="")
+        self._build_ui()
+
+    def _build_ui(self):
+        pad = dict(anchor="w", padx=8, pady=(6, 0))
+
+        row = tk.Frame(self, bg="#121212"); row.pack(**pad)
+        tk.Radiobutton(row, text="Cell", value="cell", variable=self.var_mode, bg="#121212", fg="white",
+                       selectcolor="#121212").pack(side=tk.LEFT)
+        for var in self.var_cell:
+            _entry(row, var, 4).pack(side=tk.LEFT, padx=2)
+
+        row = tk.Frame(self, bg="#121212"); row.pack(**pad)
+        tk.Radiobutton(row, text="Rect x y w h", value="rect", variable=self.var_mode, bg="#121212", fg="white",
+                       selectcolor="#121212").pack(side=tk.LEFT)
+        for var in self.var_rect:
+            _entry(row, var).pack(side=tk.LEFT, padx=2)
+
+        row = tk.Frame(self, bg="#121212"); row.pack(**pad)
+        tk.Radiobutton(row, text="Mask", value="mask", variable=self.var_mode, bg="#121212", fg="white",
+                       selectcolor="#121212").pack(side=tk.LEFT)
+        _entry(row, self.var_mask, 28).pack(side=tk.LEFT, padx=2)
+        tk.Button(row, text="Browse…", command=self._browse_mask).pack(side=tk.LEFT, padx=4)
+
+        row = tk.Frame(self, bg="#121212"); row.pack(**pad)
+        tk.Checkbutton(row, text="Re-roll seed", variable=self.var_reroll, bg="#121212", fg="white",
+                       selectcolor="#121212").pack(side=tk.LEFT)
+        _entry(row, self.var_seed, 12).pack(side=tk.LEFT, padx=4)
+        tk.Button(row, text="Dice", command=lambda: self.var_seed.set(str(random.randrange(1 << 31)))
+                  ).pack(side=tk.LEFT)
+
+        _label(self, "Overrides (key=value; …), e.g. terrain.scale=80").pack(**pad)
+        _entry(self, self.var_set, 44).pack(anchor="w", padx=8)
+
+        row = tk.Frame(self, bg="#121212"); row.pack(**pad)
+        _label(row, "Layers").pack(side=tk.LEFT)
+        for name, var in self.var_layers.items():
+            tk.Checkbutton(row, text=name.capitalize(), variable=var, bg="#121212", fg="white",
+                           selectcolor="#121212").pack(side=tk.LEFT)
+        _label(self, "Terrain is redrawn without rivers: rivers through the region are cut.").pack(**pad)
+
+        _label(self, "Seam blend (px)").pack(**pad)
+        tk.Scale(self, from_=0, to=64, orient=tk.HORIZONTAL, variable=self.var_blend, length=260,
+                 bg="#121212", fg="white", highlightthickness=0).pack(anchor="w", padx=8)
+
+        row = tk.Frame(self, bg="#121212"); row.pack(fill=tk.X, padx=8, pady=8)
+        tk.Button(row, text="Regenerate", command=self._run, bg="#2f2f2f", fg="white", padx=12).pack(side=tk.RIGHT)
+        tk.Label(row, textvariable=self.status_var, bg="#121212", fg="white").pack(side=tk.LEFT)
+
+    def _browse_mask(self):
+        path = filedialog.askopenfilename(filetypes=[("Images", "*.png"), ("All", "*.*")])
+        if path:
+            self.var_mask.set(path)
+            self.var_mode.set("mask")
+
+    def _request(self) -> dict:
+        """regen.regenerate kwargs from the form (ValueError if malformed)."""
+        mode = self.var_mode.get()
+        kwargs = {"layers": tuple(n for n, v in self.var_layers.items() if v.get()),
+                  "blend": int(self.var_blend.get())}
+        if not kwargs["layers"]:
+            raise ValueError("pick at least one layer")
+        if mode == "cell":
+            kwargs["cell"] = tuple(int(v.get()) for v in self.var_cell)
+        elif mode == "rect":
+            kwargs["rect"] = tuple(int(v.get()) for v in self.var_rect)
+        else:
+            kwargs["mask_img"] = Image.open(self.var_mask.get())
+        overrides = regen._parse_overrides(p.strip() for p in self.var_set.get().split(";") if p.strip())
+        if self.var_reroll.get():
+            overrides["seed"] = int(self.var_seed.get())
+        kwargs["overrides"] = overrides
+        return kwargs
+
+    def _run(self):
+        if self._busy:
+            return
+        self.on_click()
+        try:
+            kwargs = self._request()
+        except (ValueError, OSError) as e:
+            messagebox.showerror("Regenerate", str(e), parent=self)
+            return
+        self._busy = True
+        self.status_var.set("Regenerating…")
+        threading.Thread(target=self._worker, args=(kwargs,), daemon=True).start()
+        self.after(POLL_MS, self._poll)
+
+    def _worker(self, kwargs):
+        try:
+            stats = {}
+            layers = regen.regenerate(self.conf, stats=stats, **kwargs)
+            regen.save(self.conf, layers, roads_changed="roads" in kwargs["layers"], stats=stats)
+            self._results.put((layers, None))
+        except Exception as e:
+            self._results.put((None, e))
+
+    def _poll(self):
+        try:
+            layers, error = self._results.get_nowait()
+        except queue.Empty:
+            self.after(POLL_MS, self._poll)
+            return
+        self._busy = False
+        if error is not None:
+            self.status_var.set("Failed.")
+            messagebox.showerror("Regenerate", str(error), parent=self)
+            return
+        self.status_var.set("Done.")
+        self.on_done(layers)
@@ -0,0 +1,183 @@
+import copy
+import queue
+import random
+import threading
+import tkinter as tk
+from tkinter import messagebox
+
+from PIL import Image, ImageTk
+
+from .. import seed_explorer
+
+
+POLL_MS = 50
+CELL_PX = 112      # grid cell (thumbnails are scaled to fit)
+CAPTION_PX = 16
+COLUMNS = 8
+
+
+def _label(p, t): return tk.Label(p, text=t, bg="#121212", fg="white")
+
+
+class SeedExplorer(tk.Toplevel):
+    """
+    Contact sheet of many seeds with the current settings (see
+    seed_explorer.py). Thumbnails render in worker processes and fill the
+    grid as they finish; click one to select it, double-click (or Use Seed)
+    to hand it to on_pick(seed) for a full render.
+    """
+
+    def __init__(self, parent, conf: dict, on_pick, on_click=None):
+        super().__init__(parent)
+        self.title("Seed Explorer")
+        self.configure(bg="#121212")
+        self.conf = copy.deepcopy(conf)
+        self.on_pick = on_pick
+        self.on_click = on_click or (lambda: None)
+
+        self._results = queue.Queue()
+        self._token = 0
+        self._seeds = []
+        self._photos = {}    # seed -> PhotoImage (keep refs)
+        self._selected = None
+        self._done = 0
+
+        self.var_count = tk.StringVar(value=str(seed_explorer.DEFAULT_COUNT))
+        self.status_var = tk.StringVar(value="")
+        self._build_ui()
+        self.protocol("WM_DELETE_WINDOW", self._close)
+        self._roll()
+        self._poll_id = self.after(POLL_MS, self._poll)
+
+    def _build_ui(self):
+        row = tk.Frame(self, bg="#121212"); row.pack(fill=tk.X, padx=8, pady=6)
+        _label(row, "Seeds").pack(side=tk.LEFT)
+        tk.Entry(row, textvariable=self.var_count, width=5, bg="#1e1e1e", fg="white",
+                 insertbackground="white").pack(side=tk.LEFT, padx=4)
+        tk.Button(row, text="Roll", command=self._roll_clicked, bg="#2f2f2f", fg="white", padx=12
+                  ).pack(side=tk.LEFT, padx=4)
+        tk.Button(row, text="Use Seed", command=self._use_selected, bg="#2f2f2f", fg="white", padx=12
+                  ).pack(side=tk.RIGHT)
+        tk.Label(row, textvariable=self.status_var, bg="#121212", fg="white").pack(side=tk.LEFT, padx=8)
+
+        wrap = tk.Frame(self, bg="#121212"); wrap.pack(fill=tk.BOTH, expand=True)
+        self.canvas = tk.Canvas(wrap, bg="#121212", highlightthickness=0,
+                                width=COLUMNS * CELL_PX, height=4 * (CELL_PX + CAPTION_PX))
+        bar = tk.Scrollbar(wrap, orient=tk.VERTICAL, command=self.canvas.yview)
+        self.canvas.configure(yscrollcommand=bar.set)
+        bar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.canvas.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.canvas.bind("<MouseWheel>", lambda e: self.canvas.yview_scroll(-1 if e.delta > 0 else 1, "units"))
+        self.canvas.bind("<Button-4>", lambda e: self.canvas.yview_scroll(-1, "units"))
+        self.canvas.bind("<Button-5>", lambda e: self.canvas.yview_scroll(1, "units"))
+
+    # ---------- rendering ----------
+    def _roll_clicked(self):
+        self.on_click()
+        self._roll()
+
+    def _roll(self):
+        try:
+            count = max(1, int(self.var_count.get()))
+        except ValueError:
+            messagebox.showerror("Seed Explorer", "Seeds must be a number", parent=self)
+            return
+        self._token += 1
+        self._seeds = seed_explorer.pick_seeds(count, random.Random())
+        self._photos.clear()
+        self._selected = None
+        self._done = 0
+        self._layout()
+        step = seed_explorer.thumb_step(self.conf, count)
+        self.status_var.set(f"Rendering {count} seeds at 1:{step}…")
+        threading.Thread(target=self._worker, args=(self._token, list(self._seeds), step), daemon=True).start()
+
+    def _worker(self, token, seeds, step):
+        thumbs = seed_explorer.explore(self.conf, seeds, step)
+        try:
+            for seed, img in thumbs:
+                if token != self._token:
+                    break  # rolled again or closed: drop the rest
+                self._results.put((token, seed, img, None))
+        except Exception as e:
+            self._results.put((token, None, None, e))
+        finally:
+            thumbs.close()
+
+    def _poll(self):
+        try:
+            while True:
+                token, seed, img, error = self._results.get_nowait()
+                if token != self._token:
+                    continue
+                if error is not None:
+                    self.status_var.set("Failed.")
+                    messagebox.showerror("Seed Explorer", str(error), parent=self)
+                    continue
+                self._show(seed, img)
+        except queue.Empty:
+            pass
+        self._poll_id = self.after(POLL_MS, self._poll)
+
+    # ---------- grid ----------
+    def _cell(self, i):
+        return (i % COLUMNS) * CELL_PX, (i // COLUMNS) * (CELL_PX + CAPTION_PX)
+
+    def _layout(self):
+        self.canvas.delete("all")
+        for i, seed in enumerate(self._seeds):
+            x, y = self._cell(i)
+            tag = f"seed{seed}"
+            self.canvas.create_rectangle(x + 2, y + 2, x + CELL_PX - 2, y + CELL_PX - 2, fill="#1b1b1b",
+                                         outline="", tags=(tag,))
+            # selection frame, drawn over the thumbnail when picked
+            self.canvas.create_rectangle(x + 2, y + 2, x + CELL_PX - 2, y + CELL_PX - 2, outline="",
+                                         width=3, tags=(tag, f"{tag}-sel"))
+            self.canvas.create_text(x + CELL_PX // 2, y + CELL_PX + CAPTION_PX // 2, text=str(seed),
+                                    fill="white", tags=(tag,))
+            self.canvas.tag_bind(tag, "<Button-1>", lambda e, s=seed: self._select(s))
+            self.canvas.tag_bind(tag, "<Double-Button-1>", lambda e, s=seed: self._pick(s))
+        rows = -(-len(self._seeds) // COLUMNS)
+        self.canvas.configure(scrollregion=(0, 0, COLUMNS * CELL_PX, rows * (CELL_PX + CAPTION_PX)))
+
+    def _show(self, seed, img):
+        i = self._seeds.index(seed)
+        x, y = self._cell(i)
+        inner = CELL_PX - 8
+        scale = min(inner / img.width, inner / img.height)
+        size = (max(1, int(img.width * scale)), max(1, int(img.height * scale)))
+        # thumbnails are LOD previews: scale up blocky, down smoothly
+        img = img.resize(size, Image.NEAREST if scale > 1 else Image.LANCZOS)
+        photo = ImageTk.PhotoImage(img)
+        self._photos[seed] = photo
+        tag = f"seed{seed}"
+        self.canvas.create_image(x + CELL_PX // 2, y + CELL_PX // 2, image=photo, tags=(tag,))
+        self.canvas.tag_raise(f"{tag}-sel")
+        self._done += 1
+        if self._done == len(self._seeds):
+            self.status_var.set(f"{self._done} seeds. Double-click one to render it.")
+        else:
+            self.status_var.set(f"Rendering… {self._done}/{len(self._seeds)}")
+
+    def _select(self, seed):
+        if self._selected is not None:
+            self.canvas.itemconfigure(f"seed{self._selected}-sel", outline="")
+        self._selected = seed
+        self.canvas.itemconfigure(f"seed{seed}-sel", outline="#f0c040")
+        self.canvas.tag_raise(f"seed{seed}-sel")
+
+    def _use_selected(self):
+        if self._selected is None:
+            messagebox.showinfo("Seed Explorer", "Click a thumbnail first.", parent=self)
+            return
+        self._pick(self._selected)
+
+    def _pick(self, seed):
+        self.on_click()
+        self._select(seed)
+        self.on_pick(seed)
+
+    def _close(self):
+        self._token += 1  # the worker stops at its next thumbnail
+        self.after_cancel(self._poll_id)
+        self.destroy()
@@ -35,6 +35,16 @@ class TerrainTab(tk.Frame):
         self.var_dth   = tk.DoubleVar(value=ter.get("dark_threshold",0.45));  self._slider("Dark Threshold", 0.0,1.0,0.01,self.var_dth)
         self.var_mth   = tk.DoubleVar(value=ter.get("medium_threshold",0.70));self._slider("Medium Threshold",0.0,1.0,0.01,self.var_mth)
 
+        # Coverage targets (override the thresholds above, reclassify cached noise)
+        cov = ter.get("coverage") or {}
+        self.var_cov = tk.BooleanVar(value=bool(cov))
+        cb = tk.Checkbutton(self, text="Use coverage targets (% of map, before post-processing and rivers)", variable=self.var_cov,
+                            bg="#121212", fg="white", selectcolor="#121212", command=self._write_back)
+        cb.pack(anchor="w", padx=8, pady=(8,0))
+        self.var_wcov = tk.IntVar(value=int(round(cov.get("water",0.20)*100)));  self._slider("Water Coverage %",      0,100,1,self.var_wcov)
+        self.var_dcov = tk.IntVar(value=int(round(cov.get("dark",0.25)*100)));   self._slider("Dark Grass Coverage %", 0,100,1,self.var_dcov)
+        self.var_mcov = tk.IntVar(value=int(round(cov.get("medium",0.30)*100))); self._slider("Medium Grass Coverage %",0,100,1,self.var_mcov)
+
         # Post-processing
         _label(self,"Post-Processing").pack(anchor="w", padx=8, pady=(10,0))
         pp = ter["postprocess"]
@@ -45,6 +55,8 @@ class TerrainTab(tk.Frame):
             cb = tk.Checkbutton(self, text=text, variable=var, bg="#121212", fg="white",
                                 selectcolor="#121212", command=self._write_back)
             cb.pack(anchor="w", padx=14)
+        self.var_erad = tk.IntVar(value=pp.get("erosion_radius",1)); self._slider("Erosion Radius", 1,8,1,self.var_erad)
+        self.var_minreg = tk.IntVar(value=pp.get("min_region_area",16)); self._slider("Min Region Area (px, 0 = off)", 0,400,1,self.var_minreg)
 
         # Transforms
         _label(self,"Transforms").pack(anchor="w", padx=8, pady=(10,0))
@@ -95,10 +107,20 @@ class TerrainTab(tk.Frame):
             "dark_threshold": float(self.var_dth.get()),
             "medium_threshold": float(self.var_mth.get()),
         })
+        if self.var_cov.get():
+            ter["coverage"] = {
+                "water": self.var_wcov.get() / 100.0,
+                "dark": self.var_dcov.get() / 100.0,
+                "medium": self.var_mcov.get() / 100.0,
+            }
+        else:
+            ter.pop("coverage", None)
         ter.setdefault("postprocess", {}).update({
             "edge_ragging": bool(self.var_edge.get()),
             "speckle": bool(self.var_speck.get()),
             "erosion": bool(self.var_eros.get()),
+            "erosion_radius": int(self.var_erad.get()),
+            "min_region_area": int(self.var_minreg.get()),
         })
         ter.setdefault("transform", {}).update({
             "rotation": int(self.var_rot.get()),
@@ -118,10 +140,17 @@ class TerrainTab(tk.Frame):
         self.var_wth.set(ter.get("water_threshold",0.25))
         self.var_dth.set(ter.get("dark_threshold",0.45))
         self.var_mth.set(ter.get("medium_threshold",0.70))
+        cov = ter.get("coverage") or {}
+        self.var_cov.set(bool(cov))
+        self.var_wcov.set(int(round(cov.get("water",0.20)*100)))
+        self.var_dcov.set(int(round(cov.get("dark",0.25)*100)))
+        self.var_mcov.set(int(round(cov.get("medium",0.30)*100)))
         pp = ter.setdefault("postprocess", {})
         self.var_edge.set(pp.get("edge_ragging",True))
         self.var_speck.set(pp.get("speckle",True))
         self.var_eros.set(pp.get("erosion",True))
+        self.var_erad.set(pp.get("erosion_radius",1))
+        self.var_minreg.set(pp.get("min_region_area",16))
         tr = ter.setdefault("transform", {})
         self.var_rot.set(tr.get("rotation",0))
         self.var_offx.set(tr.get("offset_x",0))
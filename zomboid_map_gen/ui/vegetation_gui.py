@@ -36,6 +36,9 @@ class VegetationTab(tk.Frame):
         self.var_lac = tk.DoubleVar(value=veg.get("lacunarity", 2.0))
         self._slider("Lacunarity", 1.0, 6.0, 0.1, self.var_lac)
 
+        self.var_minreg = tk.IntVar(value=veg.get("min_region_area", 16))
+        self._slider("Min Region Area (px, 0 = off)", 0, 400, 1, self.var_minreg)
+
         self.var_respect = tk.BooleanVar(value=veg.get("respect_terrain", True))
         cb = tk.Checkbutton(self, text="Respect terrain (no trees on water/asphalt)",
                             variable=self.var_respect, bg="#121212", fg="white",
@@ -81,6 +84,7 @@ class VegetationTab(tk.Frame):
             "persistence": float(self.var_pers.get()),
             "lacunarity": float(self.var_lac.get()),
             "respect_terrain": bool(self.var_respect.get()),
+            "min_region_area": int(self.var_minreg.get()),
         })
         self.on_change()
 
@@ -93,3 +97,4 @@ class VegetationTab(tk.Frame):
         self.var_pers.set(veg.get("persistence", 0.55))
         self.var_lac.set(veg.get("lacunarity", 2.0))
         self.var_respect.set(veg.get("respect_terrain", True))
+        self.var_minreg.set(veg.get("min_region_area", 16))
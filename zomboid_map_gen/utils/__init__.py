@@ -7,4 +7,7 @@ Contains:
 - image_utils: PIL helpers
 - colors: vanilla-like palette
 - seeds: deterministic seed derivation
+- disjoint_set: union-find for graph connectivity
+- pan_cache: reuse the last rendered window when only the pan offset changes
+- render_context: per-render random, caches and cancel check
 """
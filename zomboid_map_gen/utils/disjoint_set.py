@@ -0,0 +1,40 @@
+# zomboid_map_gen/utils/disjoint_set.py
+"""
+Union-find (disjoint set) with path halving and union by size.
+Near-constant amortized time per operation.
+"""
+
+
+class DisjointSet:
+    def __init__(self, n: int = 0):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def __len__(self):
+        return len(self.parent)
+
+    def add(self) -> int:
+        """Add a new singleton set and return its id."""
+        i = len(self.parent)
+        self.parent.append(i)
+        self.size.append(1)
+        return i
+
+    def find(self, a: int) -> int:
+        parent = self.parent
+        while parent[a] != a:
+            parent[a] = parent[parent[a]]
+            a = parent[a]
+        return a
+
+    def union(self, a: int, b: int) -> bool:
+        """Merge the sets of a and b. False if they were already joined."""
+        ra = self.find(a)
+        rb = self.find(b)
+        if ra == rb:
+            return False
+        if self.size[ra] < self.size[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        self.size[ra] += self.size[rb]
+        return True
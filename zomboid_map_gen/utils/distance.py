@@ -0,0 +1,87 @@
+# zomboid_map_gen/utils/distance.py
+"""
+Exact Euclidean distance transform of a boolean raster.
+
+Two separable passes (Felzenszwalb & Huttenlocher):
+- per column, the distance to the nearest feature pixel in that column,
+  from one downward and one upward sweep
+- per row, the lower envelope of the parabolas (x - q)² + g(q)², built
+  left to right and then read off left to right
+
+Both passes are linear in the pixel count. They run over all columns /
+rows at once: the sweeps step over rows with whole-row numpy ops, and the
+envelope is built for every row in lockstep, one column at a time (rows
+that have to drop parabolas repeat only that step).
+"""
+
+import numpy as np
+
+
+def _column_distance(mask: np.ndarray, big: float) -> np.ndarray:
+    """Distance (px) to the nearest True pixel in the same column, `big` if none."""
+    h, w = mask.shape
+    g = np.empty((h, w), dtype=np.float64)
+    prev = np.full(w, big)
+    for y in range(h):
+        prev = np.where(mask[y], 0.0, np.minimum(prev + 1.0, big))
+        g[y] = prev
+    prev = np.full(w, big)
+    for y in range(h - 1, -1, -1):
+        prev = np.where(mask[y], 0.0, np.minimum(prev + 1.0, big))
+        np.minimum(g[y], prev, out=g[y])
+    return g
+
+
+def _row_envelope(f: np.ndarray) -> np.ndarray:
+    """float32 sqrt of min_q (x - q)² + f[:, q] along every row of f."""
+    rows, n = f.shape
+    r = np.arange(rows)
+    v = np.zeros((rows, n), dtype=np.int32)       # parabola apexes
+    z = np.empty((rows, n + 1), dtype=np.float64)  # envelope breakpoints
+    z[:, 0] = -np.inf
+    z[:, 1] = np.inf
+    k = np.zeros(rows, dtype=np.int64)
+
+    for q in range(1, n):
+        fq = f[:, q] + q * q
+        s = np.empty(rows)
+        act = r
+        while act.size:
+            vk = v[act, k[act]].astype(np.int64)
+            s[act] = (fq[act] - (f[act, vk] + vk * vk)) / (2.0 * (q - vk))
+            # the new parabola hides the top one: drop it and compare again
+            pop = s[act] <= z[act, k[act]]
+            act = act[pop]
+            k[act] -= 1
+        k += 1
+        v[r, k] = q
+        z[r, k] = s
+        z[r, k + 1] = np.inf
+
+    out = np.empty((rows, n), dtype=np.float32)
+    k[:] = 0
+    for q in range(n):
+        act = r
+        while act.size:
+            act = act[z[act, k[act] + 1] < q]
+            k[act] += 1
+        vk = v[r, k].astype(np.int64)
+        out[:, q] = np.sqrt((q - vk) ** 2 + f[r, vk])
+    return out
+
+
+def edt(mask: np.ndarray) -> np.ndarray:
+    """
+    float32 distance (px) from every pixel to the nearest True pixel of
+    `mask`: 0 on the mask, inf everywhere if the mask is empty.
+    """
+    mask = np.asarray(mask, dtype=bool)
+    h, w = mask.shape
+    if not mask.any():
+        return np.full((h, w), np.inf, dtype=np.float32)
+    # finite stand-in for "no feature in this column", beyond any real distance
+    big = float(h + w)
+    g = _column_distance(mask, big)
+    # squared in place: a second float64 canvas would be the peak
+    np.multiply(g, g, out=g)
+    return _row_envelope(g)
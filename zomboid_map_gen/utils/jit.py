@@ -0,0 +1,114 @@
+# zomboid_map_gen/utils/jit.py
+"""
+Optional compiled kernels for loops that do not vectorize well.
+
+With numba installed (pip install numba; CPU only) the kernels are
+compiled on first use and selected automatically; ZOMBOID_MAP_GEN_JIT=0
+turns them off. Without numba the existing numpy / Python code runs; it
+stays the reference the kernels must match byte for byte (see
+python -m zomboid_map_gen.jit_check).
+
+numba itself is only imported once a kernel is defined with the backend
+enabled: with its loaded kernels it adds ~115 MB resident (counted in
+budget.py), which a run with ZOMBOID_MAP_GEN_JIT=0 should not pay.
+
+Kernels are plain loops over numpy arrays, so without numba they still
+run (slowly) as ordinary Python, which is how jit_check can compare them
+on small inputs on machines without a compiler.
+
+Also here: CPython's random.randint, reproduced on the Mersenne Twister
+state from random.getstate(), so a kernel can draw the same numbers as
+the Python loop it replaces and hand the advanced state back.
+"""
+
+import importlib.util
+import os
+
+import numpy as np
+
+# callers check this at call time; jit_check flips it
+ENABLED = (os.environ.get("ZOMBOID_MAP_GEN_JIT", "1") != "0"
+           and importlib.util.find_spec("numba") is not None)
+
+# the numba module once kernel() has imported it (optional: pip install numba)
+numba = None
+
+
+def backend() -> str:
+    return "numba" if ENABLED and numba is not None else ("python" if ENABLED else "off")
+
+
+def _numba():
+    global numba, ENABLED
+    if numba is None and ENABLED:
+        try:
+            import numba as nb
+        except ImportError:  # found but broken: stay on the reference code
+            ENABLED = False
+        else:
+            numba = nb
+    return numba
+
+
+def kernel(fn=None, cache: bool = True):
+    """
+    numba.njit(fn) if numba is installed and enabled (compiled on first
+    call), else fn.
+    @kernel(cache=False) for kernels calling C through ctypes, which numba
+    cannot cache on disk (they compile once per process instead).
+    """
+    if fn is None:
+        return lambda f: kernel(f, cache)
+    nb = _numba()
+    if nb is None:
+        return fn
+    return nb.njit(cache=cache, nogil=True)(fn)
+
+
+# ---- CPython's Mersenne Twister ----
+
+_N = 624
+_M = 397
+
+
+def mt_state(rnd):
+    """(words int64[624], pos int64[1], gauss_next) from a random.Random (or the module)."""
+    version, internal, gauss = rnd.getstate()
+    return np.array(internal[:_N], dtype=np.int64), np.array([internal[_N]], dtype=np.int64), gauss
+
+
+def set_mt_state(rnd, words, pos, gauss):
+    """Write a state from mt_state (advanced by a kernel) back into rnd."""
+    rnd.setstate((3, tuple(int(v) for v in words) + (int(pos[0]),), gauss))
+
+
+@kernel
+def genrand_uint32(mt, pos):
+    if pos[0] >= _N:
+        for kk in range(_N):
+            y = (mt[kk] & 0x80000000) | (mt[(kk + 1) % _N] & 0x7FFFFFFF)
+            v = mt[(kk + _M) % _N] ^ (y >> 1)
+            if y & 1:
+                v ^= 0x9908B0DF
+            mt[kk] = v
+        pos[0] = 0
+    y = mt[pos[0]]
+    pos[0] += 1
+    y ^= y >> 11
+    y ^= (y << 7) & 0x9D2C5680
+    y ^= (y << 15) & 0xEFC60000
+    y ^= y >> 18
+    return y & 0xFFFFFFFF
+
+
+@kernel
+def randint(mt, pos, a, b):
+    """random.randint(a, b) for spans below 2**32 (_randbelow_with_getrandbits)."""
+    n = b - a + 1
+    k = 0
+    while (n >> k) > 0:
+        k += 1
+    r = genrand_uint32(mt, pos) >> (32 - k)
+    while r >= n:
+        r = genrand_uint32(mt, pos) >> (32 - k)
+    return a + r
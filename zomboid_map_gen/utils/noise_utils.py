@@ -1,5 +1,11 @@
 # zomboid_map_gen/utils/noise_utils.py
-import random
+import ctypes
+import math
+import threading
+
+import numpy as np
+
+from . import jit, render_context
 
 try:
     import noise  # optional: pip install noise
@@ -7,6 +13,49 @@ except ImportError:
     noise = None
 
 
+def _c_noise2():
+    """The noise library's own C noise2, for the kernel below (None if not exported)."""
+    if noise is None:
+        return None
+    try:
+        from noise import _perlin
+        fn = ctypes.CDLL(_perlin.__file__).noise2
+    except (ImportError, OSError, AttributeError):
+        return None
+    fn.argtypes = (ctypes.c_float,) * 4 + (ctypes.c_int,)
+    fn.restype = ctypes.c_float
+    return fn
+
+
+_noise2 = _c_noise2()
+
+
+_MASK64 = 0xFFFFFFFFFFFFFFFF
+
+
+def _fallback_key(ix, iy, seed):
+    return (ix * 928371 + iy * 1237 + int(seed) * 19349663) & 0xFFFFFFFF
+
+
+def _fallback_hash(key: int) -> float:
+    # splitmix64 finalizer -> [0, 1)
+    z = (key + 0x9E3779B97F4A7C15) & _MASK64
+    z = ((z ^ (z >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    z = ((z ^ (z >> 27)) * 0x94D049BB133111EB) & _MASK64
+    z ^= z >> 31
+    return (z >> 11) * (1.0 / (1 << 53))
+
+
+def _fallback_hash_array(key: np.ndarray) -> np.ndarray:
+    # same as _fallback_hash, uint64 arithmetic wraps for us
+    with np.errstate(over="ignore"):
+        z = key.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+    return (z >> np.uint64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
 def perlin2(
     x: float,
     y: float,
@@ -19,13 +68,12 @@ def perlin2(
     """
     Returns a value in roughly [-1, 1].
     If the 'noise' library is available, we use real Perlin.
-    Otherwise we use a deterministic PRNG-based fallback so generation still runs.
+    Otherwise we use a deterministic hash-based fallback so generation still runs.
     """
     if noise is None:
         # deterministic pseudo-noise
-        key = (int(x) * 928371 + int(y) * 1237 + int(seed) * 19349663) & 0xFFFFFFFF
-        rnd = random.Random(key)
-        return rnd.random() * 2 - 1
+        key = _fallback_key(math.floor(x), math.floor(y), seed)
+        return _fallback_hash(key) * 2 - 1
 
     return noise.pnoise2(
         x / scale,
@@ -35,3 +83,232 @@ def perlin2(
         lacunarity=lacunarity,
         base=seed % 1024,
     )
+
+
+def perlin2_array(
+    xs,
+    ys,
+    scale: float = 60.0,
+    octaves: int = 4,
+    persistence: float = 0.5,
+    lacunarity: float = 2.0,
+    seed: int = 0,
+) -> np.ndarray:
+    """
+    perlin2 over whole coordinate arrays (any matching shape).
+    Same values as calling perlin2 per point; returns float32.
+    """
+    xs = np.asarray(xs, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    if xs.size == 0:
+        return np.zeros(xs.shape, dtype=np.float32)
+
+    if noise is None:
+        ix = np.floor(xs).astype(np.int64)
+        iy = np.floor(ys).astype(np.int64)
+        key = (ix * 928371 + iy * 1237 + int(seed) * 19349663) & 0xFFFFFFFF
+        return (_fallback_hash_array(key) * 2 - 1).astype(np.float32)
+
+    base = seed % 1024
+    if jit.ENABLED and _noise2 is not None and octaves >= 1:
+        out = np.empty(xs.size, dtype=np.float32)
+        _pnoise2_kernel(np.ravel(xs / scale), np.ravel(ys / scale), out,
+                        int(octaves), persistence, lacunarity, base)
+        return out.reshape(xs.shape)
+
+    pnoise2 = noise.pnoise2
+    f = np.frompyfunc(
+        lambda x, y: pnoise2(x, y, octaves=octaves, persistence=persistence,
+                             lacunarity=lacunarity, base=base),
+        2, 1,
+    )
+    return f(xs / scale, ys / scale).astype(np.float32)
+
+
+_F32 = np.float32
+
+
+@jit.kernel(cache=False)
+def _pnoise2_kernel(xs, ys, out, octaves, persistence, lacunarity, base):
+    # noise.pnoise2 per point: the library's noise2 for each octave, summed
+    # in float32 exactly as its C wrapper does (repeat 1024, arguments
+    # rounded to float), so the values are bit-identical
+    pers, lac = _F32(persistence), _F32(lacunarity)
+    for i in range(xs.size):
+        x, y = _F32(xs[i]), _F32(ys[i])
+        if octaves == 1:
+            out[i] = _noise2(x, y, _F32(1024.0), _F32(1024.0), base)
+            continue
+        freq, amp, total, norm = _F32(1.0), _F32(1.0), _F32(0.0), _F32(0.0)
+        for _ in range(octaves):
+            total += _noise2(x * freq, y * freq, _F32(1024.0) * freq, _F32(1024.0) * freq, base) * amp
+            norm += amp
+            freq *= lac
+            amp *= pers
+        out[i] = total / norm
+
+
+# range lattice spacing = scale // this (a fraction of the feature size)
+_RANGE_LATTICE_DIV = 8
+
+# (width, height, scale, octaves, persistence, lacunarity, seed) -> (vmin, vrange):
+# every range computed so far plus the ones remembered from a saved config;
+# renders in other threads share it, so it is only touched under the lock
+_RANGES = {}
+_RANGES_LOCK = threading.Lock()
+
+
+def remember_ranges(rows) -> None:
+    """Preload field_range with [w, h, scale, octaves, persistence, lacunarity, seed, vmin, vrange] rows."""
+    with _RANGES_LOCK:
+        for row in rows:
+            _RANGES[tuple(row[:7])] = (float(row[7]), float(row[8]))
+
+
+def known_ranges(width: int, height: int) -> list:
+    """Rows (as for remember_ranges) of every range known for a width x height canvas."""
+    with _RANGES_LOCK:
+        return [list(key) + list(val) for key, val in _RANGES.items()
+                if key[:2] == (width, height)]
+
+
+def field_range(
+    width: int,
+    height: int,
+    scale: float = 60.0,
+    octaves: int = 4,
+    persistence: float = 0.5,
+    lacunarity: float = 2.0,
+    seed: int = 0,
+) -> tuple[float, float]:
+    """
+    Estimate (vmin, vrange) of a noise field over a width x height canvas from
+    a lattice of samples instead of the whole field. The lattice is a fraction
+    of the feature size, so the extremes of each blob are still hit closely.
+    Always taken over the untransformed canvas, so panning/rotating a view
+    never changes how values are normalized. Memoized, and can be preloaded
+    (remember_ranges) so an extended map doesn't resample its whole frame.
+    """
+    key = (width, height, scale, octaves, persistence, lacunarity, seed)
+    with _RANGES_LOCK:
+        known = _RANGES.get(key)
+    if known is not None:
+        return known
+    stride = max(1, int(scale) // _RANGE_LATTICE_DIV)
+    ys, xs = np.mgrid[0:height:stride, 0:width:stride]
+    vals = perlin2_array(xs, ys, scale=scale, octaves=octaves, persistence=persistence,
+                         lacunarity=lacunarity, seed=seed)
+    vmin = float(vals.min())
+    vmax = float(vals.max())
+    vrange = vmax - vmin if vmax != vmin else 1.0
+    with _RANGES_LOCK:
+        _RANGES[key] = (vmin, vrange)
+    return vmin, vrange
+
+
+def sample_coords(x0: int, y0: int, width: int, height: int,
+                  transform: dict | None = None, canvas: tuple[int, int] = (0, 0),
+                  step: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Noise-space (xs, ys) for a width x height window of output pixels whose
+    top-left is canvas pixel (x0, y0); each output pixel covers `step` canvas
+    pixels. transform = {"rotation", "offset_x", "offset_y"} is applied here
+    instead of to the finished raster: rotation turns the view clockwise
+    around the canvas center, offsets move the content right/down, so
+    panning reveals new terrain rather than wrapping.
+    """
+    ys, xs = np.mgrid[0:height, 0:width]
+    xs = x0 + xs * float(step)
+    ys = y0 + ys * float(step)
+
+    tr = transform or {}
+    rot = int(tr.get("rotation", 0)) % 360
+    xs -= int(tr.get("offset_x", 0))
+    ys -= int(tr.get("offset_y", 0))
+
+    if rot:
+        cx, cy = canvas[0] / 2.0, canvas[1] / 2.0
+        rad = math.radians(rot)
+        c, s = math.cos(rad), math.sin(rad)
+        dx = xs - cx
+        dy = ys - cy
+        xs = cx + dx * c + dy * s
+        ys = cy - dx * s + dy * c
+    return xs, ys
+
+
+# rows per band in sample_field (budget.apply lowers it under a memory cap)
+BAND_ROWS = 256
+# worker processes for sample_field (budget.applied sets the plan's count)
+WORKERS = 1
+
+
+def _sample_band(arrays, window, x0, y0, width, params, vmin, vrange, transform, canvas, step):
+    by, bh = window
+    xs, ys = sample_coords(x0, y0 + by * step, width, bh, transform, canvas, step)
+    arrays["out"][by:by + bh] = (perlin2_array(xs, ys, **params) - vmin) / vrange
+
+
+def sample_field(x0: int, y0: int, width: int, height: int, params: dict,
+                 vmin: float, vrange: float, transform: dict | None = None,
+                 canvas: tuple[int, int] = (0, 0), step: int = 1,
+                 band_rows: int | None = None, workers: int | None = None) -> np.ndarray:
+    """
+    Normalized (~0..1) float32 field for a window, sampled in row bands so the
+    coordinate arrays stay small on big canvases. Args as in sample_coords;
+    band_rows defaults to BAND_ROWS.
+
+    With workers > 1 (default WORKERS) the bands are sampled in worker
+    processes straight into a shared-memory raster (see shared_raster);
+    only the finished field is copied out. Same values either way.
+    """
+    band_rows = band_rows or BAND_ROWS
+    workers = workers or WORKERS
+    windows = [(by, min(band_rows, height - by)) for by in range(0, height, band_rows)]
+    args = (x0, y0, width, params, vmin, vrange, transform, canvas, step)
+    if workers > 1 and len(windows) > 1:
+        from .shared_raster import SharedRaster, pool
+
+        render_context.check()
+        with SharedRaster.create((height, width), np.float32) as out:
+            pool(workers).map(_sample_band, {"out": out}, windows, *args)
+            return out.array.copy()
+    out = np.empty((height, width), dtype=np.float32)
+    for window in windows:
+        render_context.check()
+        _sample_band({"out": out}, window, *args)
+    return out
+
+
+# resolution of field histograms (coverage targets)
+HIST_BINS = 1024
+
+
+def field_histogram(v: np.ndarray, bins: int = HIST_BINS) -> np.ndarray:
+    """Counts of a normalized (~0..1) field over `bins` equal bins."""
+    idx = np.clip((v * bins).astype(np.int64), 0, bins - 1)
+    return np.bincount(idx.ravel(), minlength=bins)
+
+
+def histogram_cdf(hist: np.ndarray, value: float) -> float:
+    """Fraction of the field below `value` (linear inside a bin)."""
+    bins = hist.size
+    total = max(1, int(hist.sum()))
+    pos = min(max(value, 0.0), 1.0) * bins
+    b = min(int(pos), bins - 1)
+    below = int(hist[:b].sum()) + hist[b] * (pos - b)
+    return float(below) / total
+
+
+def histogram_quantile(hist: np.ndarray, fraction: float) -> float:
+    """Field value with `fraction` of the field below it (inverse of histogram_cdf)."""
+    bins = hist.size
+    cum = np.cumsum(hist)
+    total = cum[-1] if cum[-1] else 1
+    target = min(max(fraction, 0.0), 1.0) * total
+    b = int(np.searchsorted(cum, target, side="left"))
+    if b >= bins:
+        return 1.0
+    before = cum[b - 1] if b else 0
+    inside = (target - before) / hist[b] if hist[b] else 0.0
+    return (b + inside) / bins
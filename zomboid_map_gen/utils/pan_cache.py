@@ -0,0 +1,128 @@
+# zomboid_map_gen/utils/pan_cache.py
+"""
+Keeps the last rendered window of a field so panning can reuse it.
+
+When only the pan offset changed, the overlapping part is shifted over and
+only the newly exposed strips are synthesized, so dragging the Offset
+sliders costs O(perimeter) instead of O(area) per step.
+
+Renders in their own render_context.scope get their own twin of every
+module-level cache (local()), so side-by-side renders never share one.
+"""
+
+import weakref
+
+import numpy as np
+
+from . import render_context
+
+# don't pin more than this many cached pixels per field (GUI-sized canvases);
+# read on every store, so budget.apply can turn caching off for a run
+MAX_PIXELS = 4096 * 4096
+
+_ALL = weakref.WeakSet()
+
+
+def clear_all():
+    """Drop every cached window (frees the full-canvas fields they pin)."""
+    for cache in list(_ALL):
+        cache.clear()
+
+
+def local(cache):
+    """cache, or the current render's twin of it (see render_context)."""
+    ctx = render_context.current()
+    if ctx is None:
+        return cache
+    twin = ctx.caches.get(cache)
+    if twin is None:
+        twin = ctx.caches[cache] = type(cache)(cache.max_pixels)
+    return twin
+
+
+class PanCache:
+    def __init__(self, max_pixels: int | None = None):
+        # None: follow the module-level MAX_PIXELS
+        self.max_pixels = max_pixels
+        self.key = None
+        self.offset = None
+        self.data = None
+        _ALL.add(self)
+
+    def clear(self):
+        self.key = None
+        self.offset = None
+        self.data = None
+
+    def get(self, key, offset: tuple[int, int], shape: tuple[int, int], synth):
+        """
+        Return the field for the window at `offset`.
+
+        key:    everything except the offset that the field depends on
+        offset: (offset_x, offset_y); content moves right/down as it grows
+        synth:  synth(x0, y0, w, h) -> array for that sub-window of the output
+        """
+        h, w = shape
+        data = self._reuse(key, offset, h, w, synth)
+        if data is None:
+            data = synth(0, 0, w, h)
+
+        limit = MAX_PIXELS if self.max_pixels is None else self.max_pixels
+        if w * h <= limit:
+            self.key, self.offset, self.data = key, tuple(offset), data
+        else:
+            self.clear()
+        return data
+
+    def _reuse(self, key, offset, h, w, synth):
+        old = self.data
+        if old is None or self.key != key or old.shape[:2] != (h, w):
+            return None
+
+        dx = offset[0] - self.offset[0]
+        dy = offset[1] - self.offset[1]
+        if dx == 0 and dy == 0:
+            return old
+        if abs(dx) >= w or abs(dy) >= h:
+            return None
+
+        # new[y, x] = old[y - dy, x - dx] on the overlap
+        data = np.empty_like(old)
+        x0, x1 = max(0, dx), min(w, w + dx)
+        y0, y1 = max(0, dy), min(h, h + dy)
+        data[y0:y1, x0:x1] = old[y0 - dy:y1 - dy, x0 - dx:x1 - dx]
+
+        # exposed rows (full width), then exposed columns beside the overlap
+        if dy > 0:
+            data[:dy] = synth(0, 0, w, dy)
+        elif dy < 0:
+            data[h + dy:] = synth(0, h + dy, w, -dy)
+        if dx > 0:
+            data[y0:y1, :dx] = synth(0, y0, dx, y1 - y0)
+        elif dx < 0:
+            data[y0:y1, w + dx:] = synth(w + dx, y0, -dx, y1 - y0)
+        return data
+
+
+class LevelCaches:
+    """
+    One PanCache per LOD step (see the progressive GUI previews). Step 1 pans
+    incrementally; coarser levels are small, so they are simply keyed on the
+    exact offset. Either way a repeat render with the same noise settings
+    (e.g. only thresholds changed) synthesizes nothing.
+    """
+
+    def __init__(self, max_pixels: int | None = None):
+        self.max_pixels = max_pixels
+        self.levels = {}
+
+    def clear(self):
+        self.levels.clear()
+
+    def get(self, key, offset: tuple[int, int], shape: tuple[int, int], synth, step: int = 1):
+        cache = self.levels.get(step)
+        if cache is None:
+            cache = self.levels[step] = PanCache(self.max_pixels)
+        if step == 1:
+            return cache.get(key, offset, shape, synth)
+        return cache.get((key, tuple(offset)), (0, 0), shape, synth)
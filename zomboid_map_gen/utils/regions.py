@@ -0,0 +1,105 @@
+# zomboid_map_gen/utils/regions.py
+"""
+Connected regions of a class raster (4-connected, equal values).
+
+Labeling works on horizontal runs instead of pixels: runs come from one
+diff + cumsum, vertically touching runs of the same class become edges
+(only where an overlap starts, so edges ~ runs, not pixels), and the run
+graph is resolved with vectorized hooking + pointer jumping. Everything is
+whole-array numpy work proportional to the raster.
+"""
+
+import numpy as np
+
+
+def _components(n: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Root (smallest id) of every node 0..n-1 given undirected edges a-b."""
+    parent = np.arange(n, dtype=a.dtype)
+    while a.size:
+        pa = parent[a]
+        pb = parent[b]
+        live = pa != pb
+        if not live.any():
+            break
+        a, b, pa, pb = a[live], b[live], pa[live], pb[live]
+        # hook the larger root under the smaller one
+        np.minimum.at(parent, np.maximum(pa, pb), np.minimum(pa, pb))
+        # pointer jumping until every node points at its root
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+    return parent
+
+
+def label_regions(classes: np.ndarray) -> tuple[np.ndarray, int]:
+    """
+    (labels, count): labels[y, x] in 0..count-1 numbers the 4-connected
+    region of equal class values the pixel belongs to.
+    """
+    h, w = classes.shape
+    start = np.ones((h, w), dtype=bool)
+    start[:, 1:] = classes[:, 1:] != classes[:, :-1]
+    # int32 ids unless the raster could have more runs than that holds
+    run = np.cumsum(start.ravel(), dtype=np.int32 if start.size < np.iinfo(np.int32).max else np.int64)
+    del start
+    run = (run - 1).reshape(h, w)
+    n_runs = int(run[-1, -1]) + 1 if run.size else 0
+
+    # vertical joins, one edge per start of an overlap between two runs
+    same = classes[1:] == classes[:-1]
+    below, above = run[1:], run[:-1]
+    first = same.copy()
+    first[:, 1:] &= ~(same[:, :-1] & (below[:, 1:] == below[:, :-1]) & (above[:, 1:] == above[:, :-1]))
+
+    root = _components(n_runs, below[first], above[first])
+    roots, run_label = np.unique(root, return_inverse=True)
+    return run_label.reshape(-1).astype(run.dtype)[run], int(roots.size)
+
+
+def merge_small_regions(classes: np.ndarray, min_area: int, max_rounds: int = 4) -> np.ndarray:
+    """
+    Reassign every region smaller than min_area pixels to the class of its
+    dominant neighbor: the one sharing the longest border, preferring
+    regions that are not small themselves. Small regions only merge into
+    bigger small regions, so there are no swap cycles; what is still small
+    after a round (islands of islands) is picked up by the next one.
+    """
+    out = classes
+    for _ in range(max_rounds):
+        labels, n = label_regions(out)
+        area = np.bincount(labels.ravel(), minlength=n)
+        small = area < min_area
+        if not small.any() or n < 2:
+            break
+
+        # directed label pairs across every horizontal / vertical border
+        # (borders are cut out per direction: they are a sliver of the raster)
+        us, vs = [], []
+        for a, b in ((labels[:, :-1], labels[:, 1:]), (labels[:-1], labels[1:])):
+            border = a != b
+            us.append(a[border])
+            vs.append(b[border])
+        u, v = np.concatenate(us + vs), np.concatenate(vs + us)
+        del us, vs, border
+
+        ok = small[u] & (~small[v] | (area[v] > area[u]) | ((area[v] == area[u]) & (v < u)))
+        u, v = u[ok].astype(np.int64), v[ok].astype(np.int64)
+        if not u.size:
+            break
+        pairs, border_len = np.unique(u * n + v, return_counts=True)
+        pu, pv = pairs // n, pairs % n
+        score = border_len + np.where(small[pv], 0, labels.size)
+
+        # best-scoring neighbor per small region (last after sorting by score)
+        order = np.lexsort((score, pu))
+        pu, pv = pu[order], pv[order]
+        last = np.r_[pu[1:] != pu[:-1], True]
+
+        label_class = np.empty(n, dtype=classes.dtype)
+        label_class[labels.ravel()] = out.ravel()
+        new_class = label_class.copy()
+        new_class[pu[last]] = label_class[pv[last]]
+        out = new_class[labels]
+    return out
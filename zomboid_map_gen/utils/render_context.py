@@ -0,0 +1,60 @@
+# zomboid_map_gen/utils/render_context.py
+"""
+State of one render, for renders running side by side (the GUI's
+background renderer next to the map viewer and the regen dialog).
+
+Inside scope(ctx) a render draws from ctx.rnd (rng()), keeps its pan
+caches in ctx.caches (pan_cache.local) and stops at the next band once
+ctx.cancelled() is true (check() raises Cancelled). Outside any scope
+everything falls back to the module-level state, so the CLI, and seeding
+the global random module, work as before.
+"""
+
+import contextvars
+import random
+from contextlib import contextmanager
+
+
+class Cancelled(Exception):
+    """The render was abandoned; raised by check()."""
+
+
+class RenderContext:
+    def __init__(self, rnd=None, cancelled=None, caches: dict | None = None):
+        # random.Random of this render (None: a freshly seeded one)
+        self.rnd = rnd or random.Random()
+        # cancelled() -> True once nobody wants this render any more
+        self.cancelled = cancelled
+        # module-level cache -> this render's twin (pan_cache.local); pass
+        # the same dict to consecutive renders to keep panning incremental
+        self.caches = {} if caches is None else caches
+
+
+_CURRENT = contextvars.ContextVar("render_context", default=None)
+
+
+def current() -> RenderContext | None:
+    return _CURRENT.get()
+
+
+@contextmanager
+def scope(ctx: RenderContext):
+    """Render with ctx in this thread inside the block."""
+    token = _CURRENT.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _CURRENT.reset(token)
+
+
+def rng():
+    """The current render's random.Random, else the global random module."""
+    ctx = _CURRENT.get()
+    return ctx.rnd if ctx is not None else random
+
+
+def check():
+    """Raise Cancelled if the current render was abandoned (call once per band)."""
+    ctx = _CURRENT.get()
+    if ctx is not None and ctx.cancelled is not None and ctx.cancelled():
+        raise Cancelled()
@@ -3,8 +3,27 @@
 Seed helpers: derive deterministic per-layer seeds from a master seed.
 """
 
+import zlib
+
+import numpy as np
+
+from . import render_context
+
+
 def derive_seed(master: int, name: str) -> int:
     """
-    Create a stable integer seed from a master seed + name.
+    Create a stable integer seed from a master seed + name. A CRC of the
+    text, not hash(): str hashes are randomized per interpreter, and a map
+    extended or previewed in another process must get the same seeds.
+    """
+    return zlib.crc32(f"{master}:{name}".encode("utf-8")) & 0xFFFFFFFF
+
+
+def numpy_rng(rnd=None) -> np.random.Generator:
+    """
+    numpy Generator seeded from `rnd` (default: the current render's
+    random, else the global random module), so seeding `random` also pins
+    the vectorized passes.
     """
-    return (hash((master, name)) & 0xFFFFFFFF)
+    rnd = rnd or render_context.rng()
+    return np.random.default_rng(rnd.getrandbits(64))
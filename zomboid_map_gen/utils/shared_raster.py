@@ -0,0 +1,148 @@
+# zomboid_map_gen/utils/shared_raster.py
+"""
+Rasters in named shared memory, and a worker pool that tiles over them.
+
+A SharedRaster is a numpy array whose buffer is a multiprocessing
+SharedMemory block. Its spec (name, shape, dtype) is a few dozen bytes, so
+handing a raster to another process costs the same for any canvas size:
+the worker maps the block by name and reads / writes it in place, nothing
+is pickled or copied.
+
+TilePool runs fn(rasters, window, *args) over windows in worker
+processes. A job message is the function, the raster specs and a run of
+windows (a few jobs per worker, so dispatch is amortized over many tiles);
+the worker maps each raster by name for the job and unmaps it after, so a
+worker never keeps a freed raster alive. Workers are spawned, not forked:
+the pool is started from the GUI's render thread, and forking a process
+that runs Tk and other threads can deadlock the child.
+
+Scope: only noise sampling (noise_utils.sample_field) runs here, and it
+copies the finished field out of the block, so one copy per field is
+still paid. Finished layers are ordinary PIL images, not shared blocks;
+vegetation and the postprocess tile passes write them in-process, and
+the writer reads those images, never the blocks. The creating process
+owns a block: close() unmaps it and unlink() removes the name; the
+context manager does both. Pools started by pool() are shut down at
+interpreter exit.
+"""
+
+import atexit
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+
+class SharedRaster:
+    def __init__(self, shm, shape, dtype, owner: bool):
+        self.shm = shm
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+        self.owner = owner
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=shm.buf)
+
+    @classmethod
+    def create(cls, shape, dtype=np.uint8, fill=None):
+        nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        raster = cls(shared_memory.SharedMemory(create=True, size=nbytes), shape, dtype, owner=True)
+        if fill is not None:
+            raster.array[...] = fill
+        return raster
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype = spec
+        return cls(shared_memory.SharedMemory(name=name), shape, dtype, owner=False)
+
+    @property
+    def spec(self) -> tuple:
+        """(name, shape, dtype str): all another process needs to attach."""
+        return self.shm.name, self.shape, self.dtype.str
+
+    def close(self):
+        # views must go first, or the mapping cannot be released
+        self.array = None
+        self.shm.close()
+
+    def unlink(self):
+        if self.owner:
+            self.shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+        self.unlink()
+
+
+# jobs per worker and map() call
+_JOBS_PER_WORKER = 4
+
+
+def _run(fn, specs, windows, args):
+    # worker side: map, run, unmap
+    rasters = {key: SharedRaster.attach(spec) for key, spec in specs.items()}
+    arrays = {key: r.array for key, r in rasters.items()}
+    try:
+        for window in windows:
+            fn(arrays, window, *args)
+    finally:
+        arrays.clear()
+        for r in rasters.values():
+            r.close()
+
+
+class TilePool:
+    """
+    Worker processes for tiled jobs over shared rasters. fn must be a
+    module-level function fn(arrays: {key: ndarray}, window, *args) that
+    writes its results into the arrays.
+    """
+
+    def __init__(self, workers: int):
+        self.workers = max(1, int(workers))
+        self._pool = None
+
+    def map(self, fn, rasters: dict, windows, *args):
+        """Run fn over every window; returns when all are done."""
+        specs = {key: r.spec for key, r in rasters.items()}
+        windows = list(windows)
+        if self.workers == 1 or len(windows) < 2:
+            arrays = {key: r.array for key, r in rasters.items()}
+            for window in windows:
+                fn(arrays, window, *args)
+            return
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"))
+        n = -(-len(windows) // (self.workers * _JOBS_PER_WORKER))
+        futures = [self._pool.submit(_run, fn, specs, windows[i:i + n], args)
+                   for i in range(0, len(windows), n)]
+        for f in futures:
+            f.result()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+
+_pools = {}
+
+
+def pool(workers: int) -> TilePool:
+    """The shared TilePool for this worker count (started on first use)."""
+    workers = max(1, min(int(workers), os.cpu_count() or 1))
+    p = _pools.get(workers)
+    if p is None:
+        p = _pools[workers] = TilePool(workers)
+    return p
+
+
+@atexit.register
+def _shutdown_pools():
+    for p in _pools.values():
+        p.shutdown()
+    _pools.clear()
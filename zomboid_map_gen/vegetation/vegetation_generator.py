@@ -5,10 +5,14 @@ Vegetation renderer.
 - generates a vegetation.png-style mask using the user's veg color scheme
 - uses noise to decide which vegetation band to use
 - can optionally respect terrain (no trees on water or asphalt)
+- folds bands smaller than vegetation.min_region_area into their neighbors
+- noise is normalized over canvas.frame, like the terrain
 """
 
+import numpy as np
 from PIL import Image
-from ..utils import noise_utils, colors as base_colors
+
+from ..utils import noise_utils, pan_cache, regions, colors as base_colors
 from . import presets
 
 
@@ -26,6 +30,10 @@ VEG_BANDS = [
 ]
 
 
+# last rendered noise window per LOD step (see utils.pan_cache)
+_FIELD_CACHE = pan_cache.LevelCaches()
+
+
 # terrain colors we SHOULD NOT overwrite with vegetation if respect_terrain=True
 TERRAIN_BLOCKLIST = {
     base_colors.VANILLA["water"][:3],
@@ -45,69 +53,103 @@ def _get_canvas_size(conf: dict) -> tuple[int, int]:
     return width, height
 
 
-def _terrain_pixel_blocked(terrain_img, x, y, respect: bool) -> bool:
-    if not respect:
-        return False
-    if terrain_img is None:
-        return False
-    rgb = terrain_img.getpixel((x, y))[:3]
-    return rgb in TERRAIN_BLOCKLIST
+def _terrain_blocked_mask(terrain_img, respect: bool, shape) -> np.ndarray:
+    """
+    True where vegetation must stay "none" because of the terrain below.
+    """
+    if not respect or terrain_img is None:
+        return np.zeros(shape, dtype=bool)
+    arr = np.ascontiguousarray(np.asarray(terrain_img if terrain_img.mode == "RGBA" else terrain_img.convert("RGBA")))
+    # one uint32 per pixel, compared on its RGB bytes
+    rgb = arr.view("<u4")[..., 0] & 0xFFFFFF
+    blocked = np.zeros(shape, dtype=bool)
+    for r, g, b in TERRAIN_BLOCKLIST:
+        blocked |= rgb == (r | (g << 8) | (b << 16))
+    return blocked
 
 
-def generate(conf: dict, terrain_img=None):
+def _field_params(conf: dict) -> dict:
     veg_conf = conf.get("vegetation", {})
     preset_vals = presets.get_preset(veg_conf.get("preset", "overgrown"))
+    return {
+        "scale": veg_conf.get("scale", preset_vals["scale"]),
+        "octaves": veg_conf.get("octaves", preset_vals["octaves"]),
+        "persistence": veg_conf.get("persistence", preset_vals["persistence"]),
+        "lacunarity": veg_conf.get("lacunarity", preset_vals["lacunarity"]),
+        "seed": conf.get("seed", 0) + 999,  # shift so veg != terrain
+    }
 
-    width, height = _get_canvas_size(conf)
 
-    seed = conf.get("seed", 0) + 999  # shift so veg != terrain
-    scale = veg_conf.get("scale", preset_vals["scale"])
-    octaves = veg_conf.get("octaves", preset_vals["octaves"])
-    persistence = veg_conf.get("persistence", preset_vals["persistence"])
-    lacunarity = veg_conf.get("lacunarity", preset_vals["lacunarity"])
-    respect_terrain = veg_conf.get("respect_terrain", True)
-
-    img = Image.new("RGBA", (width, height))
-    px = img.load()
-
-    # we can normalize as we go — don't need to store whole array, since noise fallback already ~[-1,1]
-    # but to make it consistent, we'll gather first
-    vals = []
-    for x in range(width):
-        for y in range(height):
-            v = noise_utils.perlin2(
-                x,
-                y,
-                scale=scale,
-                octaves=octaves,
-                persistence=persistence,
-                lacunarity=lacunarity,
-                seed=seed,
-            )
-            vals.append(v)
-
-    vmin = min(vals)
-    vmax = max(vals)
-    vrange = vmax - vmin if vmax != vmin else 1.0
-    bands_count = len(VEG_BANDS)
+def _frame_size(conf: dict) -> tuple[int, int]:
+    # noise normalization frame, as in terrain_generator
+    frame = conf.get("canvas", {}).get("frame")
+    return (int(frame[0]), int(frame[1])) if frame else _get_canvas_size(conf)
+
 
-    i = 0
-    for x in range(width):
-        for y in range(height):
-            # optional terrain-aware rule
-            if _terrain_pixel_blocked(terrain_img, x, y, respect_terrain):
-                # keep terrain as-is, but vegetation map wants "none" (black)
-                px[x, y] = base_colors.VEG["none"]
-                i += 1
-                continue
-
-            v = (vals[i] - vmin) / vrange  # 0..1
-            i += 1
-            idx = int(v * bands_count)
-            if idx >= bands_count:
-                idx = bands_count - 1
-
-            col = VEG_BANDS[idx]
-            px[x, y] = col + (255,)
-
-    return img
+def _band_index(v: np.ndarray, min_region_area: int = 0) -> np.ndarray:
+    bands_count = len(VEG_BANDS)
+    # clipped in float32 first: same bins without an int64 copy of the field
+    idx = np.clip(v * bands_count, 0, bands_count - 1).astype(np.uint8)
+    if min_region_area > 0:
+        idx = regions.merge_small_regions(idx, min_region_area)
+    return idx
+
+
+def _classify(idx: np.ndarray, conf: dict, terrain_img) -> Image.Image:
+    lut = np.array([col + (255,) for col in VEG_BANDS], dtype=np.uint8)
+    out = lut[idx]
+
+    # optional terrain-aware rule:
+    # keep terrain as-is, but vegetation map wants "none" (black)
+    respect_terrain = conf.get("vegetation", {}).get("respect_terrain", True)
+    out[_terrain_blocked_mask(terrain_img, respect_terrain, idx.shape)] = base_colors.VEG["none"]
+
+    return Image.fromarray(out, "RGBA")
+
+
+def render_window(conf: dict, x0: int, y0: int, w: int, h: int, step: int = 1,
+                  terrain_img=None) -> Image.Image:
+    """
+    Vegetation for one window: w x h output pixels whose top-left is canvas
+    pixel (x0, y0), one pixel per step x step block; it may lie outside the
+    canvas. terrain_img, if given, is the terrain for the same window.
+    Small regions are merged as in generate(), with twice the minimum area
+    of margin so every small region touching the window is seen whole.
+    """
+    frame = _frame_size(conf)
+    params = _field_params(conf)
+    transform = conf.get("terrain", {}).get("transform") or {}
+    min_area = conf.get("vegetation", {}).get("min_region_area", 0) // (step * step)
+    pad = 2 * min_area if min_area > 0 else 0
+    vmin, vrange = noise_utils.field_range(*frame, **params)
+    v = noise_utils.sample_field(x0 - pad * step, y0 - pad * step, w + 2 * pad, h + 2 * pad,
+                                 params, vmin, vrange, transform, frame, step)
+    idx = _band_index(v, min_area)[pad:pad + h, pad:pad + w]
+    return _classify(idx, conf, terrain_img)
+
+
+def generate(conf: dict, terrain_img=None, step: int = 1):
+    """
+    step > 1 renders a coarse preview: one pixel per step x step canvas block.
+    """
+    width, height = _get_canvas_size(conf)
+    out_w, out_h = -(-width // step), -(-height // step)
+
+    params = _field_params(conf)
+    # sample in the same (panned/rotated) space as the terrain so they line up
+    transform = conf.get("terrain", {}).get("transform") or {}
+    frame = _frame_size(conf)
+    vmin, vrange = noise_utils.field_range(*frame, **params)
+
+    def synth(x0, y0, w, h):
+        return noise_utils.sample_field(x0 * step, y0 * step, w, h, params, vmin, vrange,
+                                        transform, frame, step)
+
+    # reuse the last window when only the pan offset moved
+    key = (tuple(sorted(params.items())), int(transform.get("rotation", 0)) % 360,
+           width, height, frame)
+    offset = (int(transform.get("offset_x", 0)), int(transform.get("offset_y", 0)))
+    v = pan_cache.local(_FIELD_CACHE).get(key, offset, (out_h, out_w), synth, step)  # ~0..1
+
+    idx = _band_index(v, conf.get("vegetation", {}).get("min_region_area", 0) // (step * step))
+    return _classify(idx, conf, terrain_img)